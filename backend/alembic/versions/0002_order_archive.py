@@ -0,0 +1,58 @@
+"""order indexes and archive tables
+
+Revision ID: 0002_order_archive
+Revises: 0001_initial
+Create Date: 2026-10-19
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0002_order_archive"
+down_revision = "0001_initial"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_index("ix_orders_restaurant_created", "orders", ["restaurant_id", "created_at"])
+    op.create_index("ix_orders_restaurant_status", "orders", ["restaurant_id", "status"])
+    op.create_index("ix_order_items_order_id", "order_items", ["order_id"])
+    op.create_index("ix_order_items_menu_item_id", "order_items", ["menu_item_id"])
+
+    op.create_table(
+        "orders_archive",
+        sa.Column("id", sa.Integer(), primary_key=True, autoincrement=False),
+        sa.Column("restaurant_id", sa.Integer(), sa.ForeignKey("restaurants.id")),
+        sa.Column("table_id", sa.Integer(), nullable=True),
+        sa.Column("status", sa.String(length=32), nullable=True),
+        sa.Column("notes", sa.Text(), nullable=True),
+        sa.Column("created_at", sa.DateTime(), nullable=True),
+        sa.Column("updated_at", sa.DateTime(), nullable=True),
+        sa.Column("archived_at", sa.DateTime(), nullable=True),
+    )
+    op.create_index("ix_orders_archive_restaurant_created", "orders_archive", ["restaurant_id", "created_at"])
+
+    op.create_table(
+        "order_items_archive",
+        sa.Column("id", sa.Integer(), primary_key=True, autoincrement=False),
+        sa.Column("order_id", sa.Integer(), nullable=False),
+        sa.Column("menu_item_id", sa.Integer(), nullable=True),
+        sa.Column("quantity", sa.Integer(), nullable=False),
+        sa.Column("unit_price", sa.Numeric(10, 2), nullable=False),
+        sa.Column("special_instructions", sa.Text(), nullable=True),
+    )
+    op.create_index("ix_order_items_archive_order_id", "order_items_archive", ["order_id"])
+    op.create_index("ix_order_items_archive_menu_item_id", "order_items_archive", ["menu_item_id"])
+
+
+def downgrade() -> None:
+    op.drop_index("ix_order_items_archive_menu_item_id", table_name="order_items_archive")
+    op.drop_index("ix_order_items_archive_order_id", table_name="order_items_archive")
+    op.drop_table("order_items_archive")
+    op.drop_index("ix_orders_archive_restaurant_created", table_name="orders_archive")
+    op.drop_table("orders_archive")
+    op.drop_index("ix_order_items_menu_item_id", table_name="order_items")
+    op.drop_index("ix_order_items_order_id", table_name="order_items")
+    op.drop_index("ix_orders_restaurant_status", table_name="orders")
+    op.drop_index("ix_orders_restaurant_created", table_name="orders")
@@ -0,0 +1,46 @@
+"""stored order totals
+
+Revision ID: 0003_order_totals
+Revises: 0002_order_archive
+Create Date: 2026-10-19
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0003_order_totals"
+down_revision = "0002_order_archive"
+branch_labels = None
+depends_on = None
+
+TOTALS = (
+    ("orders", "order_items"),
+    ("orders_archive", "order_items_archive"),
+)
+
+
+def upgrade() -> None:
+    for orders, items in TOTALS:
+        op.add_column(orders, sa.Column("subtotal", sa.Numeric(10, 2), nullable=False, server_default="0"))
+        op.add_column(orders, sa.Column("item_count", sa.Integer(), nullable=False, server_default="0"))
+        op.add_column(orders, sa.Column("line_count", sa.Integer(), nullable=False, server_default="0"))
+        op.execute(
+            f"""
+            UPDATE {orders} SET
+                subtotal = COALESCE((
+                    SELECT SUM(quantity * unit_price) FROM {items} WHERE {items}.order_id = {orders}.id
+                ), 0),
+                item_count = COALESCE((
+                    SELECT SUM(quantity) FROM {items} WHERE {items}.order_id = {orders}.id
+                ), 0),
+                line_count = (SELECT COUNT(*) FROM {items} WHERE {items}.order_id = {orders}.id)
+            """
+        )
+
+
+def downgrade() -> None:
+    for orders, _ in TOTALS:
+        with op.batch_alter_table(orders) as batch:
+            batch.drop_column("line_count")
+            batch.drop_column("item_count")
+            batch.drop_column("subtotal")
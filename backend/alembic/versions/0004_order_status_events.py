@@ -0,0 +1,46 @@
+"""order status events and stage histograms
+
+Revision ID: 0004_order_status_events
+Revises: 0003_order_totals
+Create Date: 2026-10-19
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0004_order_status_events"
+down_revision = "0003_order_totals"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "order_status_events",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("order_id", sa.Integer(), nullable=False),
+        sa.Column("restaurant_id", sa.Integer(), sa.ForeignKey("restaurants.id"), nullable=False),
+        sa.Column("from_status", sa.String(length=32), nullable=True),
+        sa.Column("to_status", sa.String(length=32), nullable=False),
+        sa.Column("created_at", sa.DateTime(), nullable=True),
+    )
+    op.create_index("ix_order_status_events_order_id", "order_status_events", ["order_id"])
+    op.create_index(
+        "ix_order_status_events_restaurant_created", "order_status_events", ["restaurant_id", "created_at"]
+    )
+
+    op.create_table(
+        "order_stage_histograms",
+        sa.Column("restaurant_id", sa.Integer(), sa.ForeignKey("restaurants.id"), primary_key=True),
+        sa.Column("stage", sa.String(length=40), primary_key=True),
+        sa.Column("bucket", sa.Integer(), primary_key=True, autoincrement=False),
+        sa.Column("count", sa.BigInteger(), nullable=False),
+        sa.Column("sum_seconds", sa.Float(), nullable=False),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("order_stage_histograms")
+    op.drop_index("ix_order_status_events_restaurant_created", table_name="order_status_events")
+    op.drop_index("ix_order_status_events_order_id", table_name="order_status_events")
+    op.drop_table("order_status_events")
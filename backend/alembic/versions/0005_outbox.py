@@ -0,0 +1,34 @@
+"""transactional outbox
+
+Revision ID: 0005_outbox
+Revises: 0004_order_status_events
+Create Date: 2026-10-19
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0005_outbox"
+down_revision = "0004_order_status_events"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "outbox_events",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("topic", sa.String(length=64), nullable=False),
+        sa.Column("payload", sa.JSON(), nullable=False),
+        sa.Column("status", sa.String(length=16), nullable=False, server_default="pending"),
+        sa.Column("attempts", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("available_at", sa.DateTime(), nullable=False),
+        sa.Column("last_error", sa.Text(), nullable=True),
+        sa.Column("created_at", sa.DateTime(), nullable=True),
+    )
+    op.create_index("ix_outbox_events_status_available", "outbox_events", ["status", "available_at"])
+
+
+def downgrade() -> None:
+    op.drop_index("ix_outbox_events_status_available", table_name="outbox_events")
+    op.drop_table("outbox_events")
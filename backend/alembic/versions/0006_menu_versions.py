@@ -0,0 +1,45 @@
+"""menu versions and tombstones
+
+Revision ID: 0006_menu_versions
+Revises: 0005_outbox
+Create Date: 2026-10-19
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0006_menu_versions"
+down_revision = "0005_outbox"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column("restaurants", sa.Column("menu_version", sa.BigInteger(), nullable=False, server_default="0"))
+    op.add_column("menu_categories", sa.Column("version", sa.BigInteger(), nullable=False, server_default="0"))
+    op.add_column("menu_items", sa.Column("version", sa.BigInteger(), nullable=False, server_default="0"))
+    op.create_index("ix_menu_categories_restaurant_version", "menu_categories", ["restaurant_id", "version"])
+    op.create_index("ix_menu_items_restaurant_version", "menu_items", ["restaurant_id", "version"])
+
+    op.create_table(
+        "menu_tombstones",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("restaurant_id", sa.Integer(), sa.ForeignKey("restaurants.id"), nullable=False),
+        sa.Column("kind", sa.String(length=16), nullable=False),
+        sa.Column("entity_id", sa.Integer(), nullable=False),
+        sa.Column("version", sa.BigInteger(), nullable=False),
+    )
+    op.create_index("ix_menu_tombstones_restaurant_version", "menu_tombstones", ["restaurant_id", "version"])
+
+
+def downgrade() -> None:
+    op.drop_index("ix_menu_tombstones_restaurant_version", table_name="menu_tombstones")
+    op.drop_table("menu_tombstones")
+    op.drop_index("ix_menu_items_restaurant_version", table_name="menu_items")
+    op.drop_index("ix_menu_categories_restaurant_version", table_name="menu_categories")
+    with op.batch_alter_table("menu_items") as batch:
+        batch.drop_column("version")
+    with op.batch_alter_table("menu_categories") as batch:
+        batch.drop_column("version")
+    with op.batch_alter_table("restaurants") as batch:
+        batch.drop_column("menu_version")
@@ -0,0 +1,28 @@
+"""demand forecasts
+
+Revision ID: 0007_demand_forecasts
+Revises: 0006_menu_versions
+Create Date: 2026-10-19
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0007_demand_forecasts"
+down_revision = "0006_menu_versions"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "demand_forecasts",
+        sa.Column("restaurant_id", sa.Integer(), sa.ForeignKey("restaurants.id"), primary_key=True, autoincrement=False),
+        sa.Column("profile", sa.JSON(), nullable=False),
+        sa.Column("history_weeks", sa.Integer(), nullable=False),
+        sa.Column("generated_at", sa.DateTime(), nullable=False),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("demand_forecasts")
@@ -0,0 +1,43 @@
+"""integer cents for money columns
+
+Revision ID: 0008_money_cents
+Revises: 0007_demand_forecasts
+Create Date: 2026-10-19
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0008_money_cents"
+down_revision = "0007_demand_forecasts"
+branch_labels = None
+depends_on = None
+
+# (table, old Numeric column, new cents column, keeps a server default)
+MONEY_COLUMNS = (
+    ("menu_items", "price", "price_cents", False),
+    ("order_items", "unit_price", "unit_price_cents", False),
+    ("order_items_archive", "unit_price", "unit_price_cents", False),
+    ("orders", "subtotal", "subtotal_cents", True),
+    ("orders_archive", "subtotal", "subtotal_cents", True),
+)
+
+
+def upgrade() -> None:
+    for table, old, new, keeps_default in MONEY_COLUMNS:
+        op.add_column(table, sa.Column(new, sa.Integer(), nullable=False, server_default="0"))
+        op.execute(f"UPDATE {table} SET {new} = CAST(ROUND({old} * 100) AS INTEGER)")
+        with op.batch_alter_table(table) as batch:
+            batch.drop_column(old)
+            if not keeps_default:
+                batch.alter_column(new, existing_type=sa.Integer(), server_default=None)
+
+
+def downgrade() -> None:
+    for table, old, new, keeps_default in MONEY_COLUMNS:
+        op.add_column(table, sa.Column(old, sa.Numeric(10, 2), nullable=False, server_default="0"))
+        op.execute(f"UPDATE {table} SET {old} = {new} / 100.0")
+        with op.batch_alter_table(table) as batch:
+            batch.drop_column(new)
+            if not keeps_default:
+                batch.alter_column(old, existing_type=sa.Numeric(10, 2), server_default=None)
@@ -0,0 +1,55 @@
+"""table tabs
+
+Revision ID: 0009_table_tabs
+Revises: 0008_money_cents
+Create Date: 2026-10-19
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0009_table_tabs"
+down_revision = "0008_money_cents"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "table_tabs",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("restaurant_id", sa.Integer(), sa.ForeignKey("restaurants.id"), nullable=False),
+        sa.Column("table_id", sa.Integer(), sa.ForeignKey("tables.id"), nullable=False),
+        sa.Column("status", sa.String(length=16), nullable=False),
+        sa.Column("total_cents", sa.Integer(), nullable=False),
+        sa.Column("item_count", sa.Integer(), nullable=False),
+        sa.Column("order_ids", sa.JSON(), nullable=False),
+        sa.Column("items", sa.JSON(), nullable=False),
+        sa.Column("opened_at", sa.DateTime(), nullable=True),
+        sa.Column("updated_at", sa.DateTime(), nullable=True),
+        sa.Column("closed_at", sa.DateTime(), nullable=True),
+    )
+    op.create_index(
+        "ix_table_tabs_open_table",
+        "table_tabs",
+        ["table_id"],
+        unique=True,
+        postgresql_where=sa.text("status = 'open'"),
+        sqlite_where=sa.text("status = 'open'"),
+    )
+    op.create_index("ix_table_tabs_restaurant_status", "table_tabs", ["restaurant_id", "status"])
+    with op.batch_alter_table("orders") as batch:
+        batch.add_column(sa.Column("tab_id", sa.Integer(), nullable=True))
+        batch.create_foreign_key("fk_orders_tab_id", "table_tabs", ["tab_id"], ["id"])
+    op.add_column("orders_archive", sa.Column("tab_id", sa.Integer(), nullable=True))
+
+
+def downgrade() -> None:
+    with op.batch_alter_table("orders_archive") as batch:
+        batch.drop_column("tab_id")
+    with op.batch_alter_table("orders") as batch:
+        batch.drop_constraint("fk_orders_tab_id", type_="foreignkey")
+        batch.drop_column("tab_id")
+    op.drop_index("ix_table_tabs_restaurant_status", table_name="table_tabs")
+    op.drop_index("ix_table_tabs_open_table", table_name="table_tabs")
+    op.drop_table("table_tabs")
@@ -0,0 +1,146 @@
+"""Move finished orders older than ``ARCHIVE_AFTER_DAYS`` into archive tables.
+
+Also drops ``idempotency_keys`` rows older than ``IDEMPOTENCY_TTL_SECONDS``.
+
+Runs in the app when ``ARCHIVE_INTERVAL_SECONDS`` > 0, or from cron::
+
+    python archive.py
+"""
+import asyncio
+import logging
+import os
+from datetime import datetime, timedelta
+
+from sqlalchemy import delete, insert, select
+from sqlalchemy.orm import Session
+
+from cache import cache
+from database import SessionLocal
+from idempotency import IDEMPOTENCY_TTL_SECONDS, expire_keys
+from metrics import Counter, registry
+from models import ArchivedOrder, ArchivedOrderItem, Order, OrderItem
+
+logger = logging.getLogger(__name__)
+
+ARCHIVE_AFTER_DAYS = int(os.getenv("ARCHIVE_AFTER_DAYS", "90"))
+ARCHIVE_BATCH_SIZE = int(os.getenv("ARCHIVE_BATCH_SIZE", "1000"))
+ARCHIVE_INTERVAL_SECONDS = float(os.getenv("ARCHIVE_INTERVAL_SECONDS", "0"))
+ARCHIVABLE_STATUSES = ("completed", "cancelled")
+
+ORDER_COPY_COLUMNS = (
+    "id", "restaurant_id", "table_id", "tab_id", "status", "notes", "subtotal_cents", "item_count", "line_count",
+    "created_at", "updated_at",
+)
+ITEM_COPY_COLUMNS = ("id", "order_id", "menu_item_id", "quantity", "unit_price_cents", "special_instructions")
+
+archived_orders = registry.register(Counter("orders_archived_total", "Orders moved into orders_archive."))
+
+
+def archive_cutoff(days: int = ARCHIVE_AFTER_DAYS) -> datetime:
+    return datetime.utcnow() - timedelta(days=days)
+
+
+def archive_batch(db: Session, cutoff: datetime, batch_size: int = ARCHIVE_BATCH_SIZE) -> int:
+    """Copy and delete one batch in a single transaction; returns orders moved."""
+    rows = db.execute(
+        select(Order.id, Order.restaurant_id)
+        .where(Order.status.in_(ARCHIVABLE_STATUSES))
+        .where(Order.created_at < cutoff)
+        .order_by(Order.id)
+        .limit(batch_size)
+        .with_for_update(skip_locked=True)
+    ).all()
+    if not rows:
+        return 0
+    order_ids = [row.id for row in rows]
+    db.execute(
+        insert(ArchivedOrder).from_select(
+            ORDER_COPY_COLUMNS,
+            select(*(getattr(Order, column) for column in ORDER_COPY_COLUMNS)).where(Order.id.in_(order_ids)),
+        )
+    )
+    db.execute(
+        insert(ArchivedOrderItem).from_select(
+            ITEM_COPY_COLUMNS,
+            select(*(getattr(OrderItem, column) for column in ITEM_COPY_COLUMNS)).where(
+                OrderItem.order_id.in_(order_ids)
+            ),
+        )
+    )
+    db.execute(delete(OrderItem).where(OrderItem.order_id.in_(order_ids)))
+    db.execute(delete(Order).where(Order.id.in_(order_ids)))
+    db.commit()
+    for restaurant_id in {row.restaurant_id for row in rows}:
+        cache.invalidate(restaurant_id, "analytics")
+    archived_orders.inc(len(order_ids))
+    return len(order_ids)
+
+
+def archive_orders(days: int = ARCHIVE_AFTER_DAYS, batch_size: int = ARCHIVE_BATCH_SIZE) -> int:
+    """Archive in batches until nothing old enough is left."""
+    cutoff = archive_cutoff(days)
+    moved = 0
+    db = SessionLocal()
+    try:
+        while True:
+            count = archive_batch(db, cutoff, batch_size)
+            moved += count
+            if count < batch_size:
+                break
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+    if moved:
+        logger.info("archived %s orders created before %s", moved, cutoff.isoformat())
+    return moved
+
+
+def expire_idempotency_keys(ttl: float = IDEMPOTENCY_TTL_SECONDS) -> int:
+    db = SessionLocal()
+    try:
+        expired = expire_keys(db, datetime.utcnow() - timedelta(seconds=ttl))
+    finally:
+        db.close()
+    if expired:
+        logger.info("dropped %s expired idempotency keys", expired)
+    return expired
+
+
+def run_retention() -> None:
+    archive_orders()
+    expire_idempotency_keys()
+
+
+class ArchiveJob:
+    def __init__(self, interval: float = ARCHIVE_INTERVAL_SECONDS) -> None:
+        self.interval = interval
+        self._task: asyncio.Task | None = None
+
+    def start(self) -> None:
+        if self.interval <= 0 or self._task is not None:
+            return
+
+        async def loop() -> None:
+            while True:
+                try:
+                    await asyncio.to_thread(run_retention)
+                except Exception:
+                    logger.exception("order archive run failed")
+                await asyncio.sleep(self.interval)
+
+        self._task = asyncio.create_task(loop())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+
+archive_job = ArchiveJob()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    print(f"archived {archive_orders()} orders, dropped {expire_idempotency_keys()} idempotency keys")
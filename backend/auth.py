@@ -4,9 +4,9 @@ from datetime import datetime, timedelta
 from fastapi import Depends, Header, HTTPException
 from jose import JWTError, jwt
 from passlib.context import CryptContext
-from sqlalchemy.orm import Session
 
-from database import get_db
+from database import SessionLocal
+from metrics import bcrypt_latency, timed
 from models import User
 
 SECRET_KEY = os.getenv("APP_SECRET", "dev-secret-change")
@@ -17,11 +17,13 @@ pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
 
 def get_password_hash(password: str) -> str:
-    return pwd_context.hash(password)
+    with timed(bcrypt_latency, operation="hash"):
+        return pwd_context.hash(password)
 
 
 def verify_password(plain: str, hashed: str) -> bool:
-    return pwd_context.verify(plain, hashed)
+    with timed(bcrypt_latency, operation="verify"):
+        return pwd_context.verify(plain, hashed)
 
 
 def create_access_token(data: dict, expires_delta: timedelta | None = None) -> str:
@@ -33,10 +35,17 @@ def create_access_token(data: dict, expires_delta: timedelta | None = None) -> s
     return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
 
 
-def get_current_user(
-    authorization: str | None = Header(default=None),
-    db: Session = Depends(get_db),
-) -> User:
+def _load_user(user_id: int | None) -> User | None:
+    # Its own short session, closed before the route runs: routes reading from
+    # the public or analytics pool must not hold a transactional connection.
+    db = SessionLocal()
+    try:
+        return db.query(User).filter(User.id == user_id).first()
+    finally:
+        db.close()
+
+
+def get_current_user(authorization: str | None = Header(default=None)) -> User:
     if not authorization or not authorization.startswith("Bearer "):
         raise HTTPException(status_code=401, detail="Missing token")
     token = authorization.split(" ", 1)[1]
@@ -49,16 +58,13 @@ def get_current_user(
         user_id = int(user_id) if user_id is not None else None
     except JWTError as exc:
         raise HTTPException(status_code=401, detail="Invalid token") from exc
-    user = db.query(User).filter(User.id == user_id).first()
+    user = _load_user(user_id)
     if not user:
         raise HTTPException(status_code=401, detail="User not found")
     return user
 
 
-def get_optional_user(
-    authorization: str | None = Header(default=None),
-    db: Session = Depends(get_db),
-) -> User | None:
+def get_optional_user(authorization: str | None = Header(default=None)) -> User | None:
     if not authorization or not authorization.startswith("Bearer "):
         return None
     token = authorization.split(" ", 1)[1]
@@ -71,10 +77,10 @@ def get_optional_user(
         user_id = int(user_id) if user_id is not None else None
     except JWTError:
         return None
-    return db.query(User).filter(User.id == user_id).first()
+    return _load_user(user_id)
 
 
 def require_owner(user: User = Depends(get_current_user)) -> User:
     if user.role != "owner":
         raise HTTPException(status_code=403, detail="Not allowed")
-    return user
+    return user
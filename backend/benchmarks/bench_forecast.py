@@ -0,0 +1,102 @@
+"""Fit time for hourly demand forecasts across a large fleet.
+
+Run from ``backend/``::
+
+    python benchmarks/bench_forecast.py --restaurants 10000 --weeks 52 --workers 4
+
+Builds one chunk of synthetic sparse hourly counts (the shape
+``forecast.run_forecasts`` hands to ``fit_chunk``) and fits it repeatedly to
+cover ``--restaurants``: sequentially, then in a process pool. A per-restaurant
+pure-Python smoothing loop is timed on ``--sample`` restaurants and
+extrapolated for comparison. The database query is not included; the pool only
+pays off with more than one core.
+"""
+import argparse
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from forecast import SLOTS, fit_chunk  # noqa: E402
+
+# Lunch and dinner peaks, busier weekends.
+HOURS = np.exp(-((np.arange(24) - 13) ** 2) / 4) + 1.3 * np.exp(-((np.arange(24) - 20) ** 2) / 5)
+WEEK_SHAPE = np.concatenate([HOURS * (1.4 if day >= 5 else 1.0) for day in range(7)])
+
+
+def synthetic_chunk(rng: np.random.Generator, size: int, weeks: int) -> tuple[np.ndarray, np.ndarray]:
+    scale = rng.gamma(2.0, 2.0, size)[:, None, None]
+    drift = 1 + 0.1 * rng.standard_normal((size, weeks, 1))
+    dense = rng.poisson(scale * drift * WEEK_SHAPE[None, None, :])
+    positions = np.flatnonzero(dense)
+    return positions, dense.ravel()[positions].astype(np.float64)
+
+
+def python_fit(dense: np.ndarray, alpha: float) -> list[list[float]]:
+    profiles = []
+    for restaurant in dense.tolist():
+        level = list(restaurant[0])
+        for week in restaurant[1:]:
+            level = [alpha * count + (1 - alpha) * current for count, current in zip(week, level)]
+        profiles.append(level)
+    return profiles
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--restaurants", type=int, default=10000)
+    parser.add_argument("--weeks", type=int, default=52)
+    parser.add_argument("--chunk-size", type=int, default=1000)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--sample", type=int, default=100, help="restaurants timed with the Python loop")
+    parser.add_argument("--alpha", type=float, default=0.3)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(42)
+    size = min(args.chunk_size, args.restaurants)
+    chunks = -(-args.restaurants // size)
+    positions, counts = synthetic_chunk(rng, size, args.weeks)
+    print(
+        f"{args.restaurants} restaurants x {args.weeks} weeks: {chunks} chunks of {size}, "
+        f"{len(positions) * chunks / 1e6:.1f}M non-zero hourly counts"
+    )
+
+    dense = np.bincount(positions, weights=counts, minlength=size * args.weeks * SLOTS).reshape(
+        size, args.weeks, SLOTS
+    )
+    sample = min(args.sample, size)
+    started = time.perf_counter()
+    expected = python_fit(dense[:sample], args.alpha)
+    python_seconds = (time.perf_counter() - started) * args.restaurants / sample
+    fitted = fit_chunk(size, positions, counts, args.weeks, args.alpha)
+    assert np.allclose(fitted[:sample], np.array(expected), atol=1e-3)
+    print(f"{'python loop (extrapolated)':<28}{python_seconds:>10.2f}s")
+
+    started = time.perf_counter()
+    for _ in range(chunks):
+        fit_chunk(size, positions, counts, args.weeks, args.alpha)
+    numpy_seconds = time.perf_counter() - started
+    print(f"{'numpy, 1 process':<28}{numpy_seconds:>10.2f}s  ({python_seconds / numpy_seconds:.0f}x)")
+
+    if args.workers > 1:
+        with ProcessPoolExecutor(args.workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+            # Warm the workers so start-up and imports are not timed.
+            list(pool.map(fit_chunk, *zip(*[(1, positions[:0], counts[:0], args.weeks, args.alpha)] * args.workers)))
+            started = time.perf_counter()
+            futures = [
+                pool.submit(fit_chunk, size, positions, counts, args.weeks, args.alpha) for _ in range(chunks)
+            ]
+            for future in futures:
+                future.result()
+            pool_seconds = time.perf_counter() - started
+        label = f"numpy, {args.workers} processes"
+        print(f"{label:<28}{pool_seconds:>10.2f}s  ({python_seconds / pool_seconds:.0f}x)")
+
+
+if __name__ == "__main__":
+    main()
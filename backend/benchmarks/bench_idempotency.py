@@ -0,0 +1,126 @@
+"""Cost of ``Idempotency-Key`` on POST /api/orders, and what retries cost with it.
+
+Run from ``backend/``::
+
+    python benchmarks/bench_idempotency.py --orders 1000 --retries 2 --concurrency 8
+
+Times orders without a key, with a fresh key each, and replays of keys that
+were already used, then again with this worker's store emptied (read from
+Redis or ``idempotency_keys``). The last run sends every order ``--retries``
++ 1 times at once with the same key, as a double tap plus client retries
+would; the orders column shows one order per key. Uses ``DATABASE_URL`` when
+set, otherwise a throwaway SQLite file; ``IDEMPOTENCY_BACKEND=fake`` runs the
+Redis code path.
+Rate limiting and admission control are off for the run.
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+import uuid
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault(
+    "DATABASE_URL", f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bench_idempotency.db')}"
+)
+os.environ.setdefault("RATE_LIMIT_ENABLED", "false")
+os.environ.setdefault("DB_CONCURRENCY_LIMIT", "0")
+
+import httpx  # noqa: E402
+from sqlalchemy import func, select  # noqa: E402
+
+from database import Base, SessionLocal, engine  # noqa: E402
+from idempotency import idempotency  # noqa: E402
+from main import app  # noqa: E402
+from models import MenuItem, Order, Restaurant  # noqa: E402
+
+
+def seed() -> tuple[int, list[int]]:
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    try:
+        restaurant = Restaurant(name="Bench Bistro", city="Benchville")
+        db.add(restaurant)
+        db.flush()
+        items = [
+            MenuItem(restaurant_id=restaurant.id, name=f"Dish {i}", price_cents=500 + i * 100)
+            for i in range(20)
+        ]
+        db.add_all(items)
+        db.commit()
+        return restaurant.id, [item.id for item in items]
+    finally:
+        db.close()
+
+
+def order_count() -> int:
+    db = SessionLocal()
+    try:
+        return db.execute(select(func.count()).select_from(Order)).scalar_one()
+    finally:
+        db.close()
+
+
+async def run(label: str, requests: list[tuple[dict, str | None]], concurrency: int) -> None:
+    transport = httpx.ASGITransport(app=app)
+    semaphore = asyncio.Semaphore(concurrency)
+    before = order_count()
+
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        async def place(body: dict, key: str | None) -> None:
+            async with semaphore:
+                response = await client.post(
+                    "/api/orders/", json=body, headers={"Idempotency-Key": key} if key else {}
+                )
+                response.raise_for_status()
+
+        started = time.perf_counter()
+        await asyncio.gather(*(place(body, key) for body, key in requests))
+        elapsed = time.perf_counter() - started
+
+    created = order_count() - before
+    print(
+        f"{label:<22}{len(requests):>9}{elapsed / len(requests) * 1e6:>14,.0f}{len(requests) / elapsed:>10,.0f}"
+        f"{created:>9}"
+    )
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--orders", type=int, default=1000)
+    parser.add_argument("--retries", type=int, default=2)
+    parser.add_argument("--concurrency", type=int, default=8)
+    args = parser.parse_args()
+
+    restaurant_id, item_ids = seed()
+    bodies = [
+        {
+            "restaurant_id": restaurant_id,
+            "items": [
+                {"menu_item_id": item_ids[n % len(item_ids)], "quantity": 1},
+                {"menu_item_id": item_ids[(n * 7) % len(item_ids)], "quantity": 2},
+            ],
+        }
+        for n in range(args.orders)
+    ]
+    keyed = [(body, uuid.uuid4().hex) for body in bodies]
+    storm = [(body, uuid.uuid4().hex) for body in bodies]
+
+    print(f"{'case':<22}{'requests':>9}{'us/request':>14}{'req/s':>10}{'orders':>9}")
+    await run("no key", [(body, None) for body in bodies], args.concurrency)
+    await run("fresh key", keyed, args.concurrency)
+    await run("replay (memory)", keyed, args.concurrency)
+    idempotency._entries.clear()
+    await run("replay (cold worker)", keyed, args.concurrency)
+    # Copies of one order are adjacent, so they overlap in flight.
+    await run(
+        f"{args.retries + 1} sends per key",
+        [entry for entry in storm for _ in range(args.retries + 1)],
+        args.concurrency,
+    )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,191 @@
+"""Numeric(10, 2) money vs integer cents on the analytics and order paths.
+
+Run from ``backend/``::
+
+    python benchmarks/bench_money.py --orders 50000 --menu-items 200
+
+Builds the same synthetic orders twice in a temporary SQLite database: once
+with the old ``Numeric`` columns and once with ``*_cents`` integers. The
+"numeric" rows reproduce the old code (Decimal results, ``float(...)`` per
+value, Decimal subtotals in ``apply_totals``); the "cents" rows run the
+current helpers. Set ``DATABASE_URL`` to a scratch Postgres database to time
+the SQL side there instead.
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from decimal import Decimal
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import Column, Integer, MetaData, Numeric, Table, create_engine, func, insert, select  # noqa: E402
+
+from money import format_cents  # noqa: E402
+from routes.analytics import merge_totals  # noqa: E402
+
+metadata = MetaData()
+numeric_orders = Table(
+    "bench_numeric_orders", metadata, Column("id", Integer, primary_key=True), Column("subtotal", Numeric(10, 2))
+)
+numeric_items = Table(
+    "bench_numeric_items",
+    metadata,
+    Column("id", Integer, primary_key=True),
+    Column("order_id", Integer, index=True),
+    Column("menu_item_id", Integer),
+    Column("quantity", Integer),
+    Column("unit_price", Numeric(10, 2)),
+)
+cents_orders = Table(
+    "bench_cents_orders", metadata, Column("id", Integer, primary_key=True), Column("subtotal_cents", Integer)
+)
+cents_items = Table(
+    "bench_cents_items",
+    metadata,
+    Column("id", Integer, primary_key=True),
+    Column("order_id", Integer, index=True),
+    Column("menu_item_id", Integer),
+    Column("quantity", Integer),
+    Column("unit_price_cents", Integer),
+)
+
+
+def build_orders(rng: random.Random, orders: int, menu_items: int) -> list[list[tuple[int, int, int]]]:
+    """``[(menu_item_id, quantity, unit_price_cents), ...]`` per order."""
+    prices = [rng.randint(200, 2500) for _ in range(menu_items)]
+    result = []
+    for _ in range(orders):
+        lines = []
+        for item_id in rng.sample(range(menu_items), rng.randint(1, 5)):
+            lines.append((item_id, rng.choices((1, 2, 3, 4), weights=(70, 20, 7, 3))[0], prices[item_id]))
+        result.append(lines)
+    return result
+
+
+def decimal_subtotal(lines: list[tuple[int, int, Decimal]]) -> Decimal:
+    return sum((Decimal(str(price)) * quantity for _, quantity, price in lines), Decimal("0")).quantize(
+        Decimal("0.01")
+    )
+
+
+def cents_subtotal(lines: list[tuple[int, int, int]]) -> int:
+    return sum(price * quantity for _, quantity, price in lines)
+
+
+def seed(engine, orders: list[list[tuple[int, int, int]]]) -> None:
+    numeric_order_rows, numeric_item_rows, cents_order_rows, cents_item_rows = [], [], [], []
+    for order_id, lines in enumerate(orders, start=1):
+        subtotal = cents_subtotal(lines)
+        numeric_order_rows.append({"id": order_id, "subtotal": Decimal(subtotal) / 100})
+        cents_order_rows.append({"id": order_id, "subtotal_cents": subtotal})
+        for item_id, quantity, price in lines:
+            line = {"order_id": order_id, "menu_item_id": item_id, "quantity": quantity}
+            numeric_item_rows.append({**line, "unit_price": Decimal(price) / 100})
+            cents_item_rows.append({**line, "unit_price_cents": price})
+    with engine.begin() as conn:
+        conn.execute(insert(numeric_orders), numeric_order_rows)
+        conn.execute(insert(numeric_items), numeric_item_rows)
+        conn.execute(insert(cents_orders), cents_order_rows)
+        conn.execute(insert(cents_items), cents_item_rows)
+
+
+def timeit(fn, repeat: int) -> float:
+    fn()
+    started = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - started) / repeat * 1000
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--orders", type=int, default=50000)
+    parser.add_argument("--menu-items", type=int, default=200)
+    parser.add_argument("--repeat", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    url = os.getenv("DATABASE_URL") or f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bench_money.db')}"
+    engine = create_engine(url)
+    metadata.drop_all(engine)
+    metadata.create_all(engine)
+    orders = build_orders(random.Random(args.seed), args.orders, args.menu_items)
+    seed(engine, orders)
+    decimal_orders = [[(item, quantity, Decimal(price) / 100) for item, quantity, price in lines] for lines in orders]
+
+    def numeric_revenue_by_item(conn) -> list[dict]:
+        rows = conn.execute(
+            select(
+                numeric_items.c.menu_item_id,
+                func.sum(numeric_items.c.quantity),
+                func.sum(numeric_items.c.quantity * numeric_items.c.unit_price),
+            ).group_by(numeric_items.c.menu_item_id)
+        ).all()
+        totals = merge_totals(rows)
+        return [
+            {"id": key, "orders": int(count), "revenue": float(revenue)} for key, (count, revenue) in totals.items()
+        ]
+
+    def cents_revenue_by_item(conn) -> list[dict]:
+        rows = conn.execute(
+            select(
+                cents_items.c.menu_item_id,
+                func.sum(cents_items.c.quantity),
+                func.sum(cents_items.c.quantity * cents_items.c.unit_price_cents),
+            ).group_by(cents_items.c.menu_item_id)
+        ).all()
+        totals = merge_totals(rows)
+        return [
+            {"id": key, "orders": int(count), "revenue_cents": revenue, "revenue": format_cents(revenue)}
+            for key, (count, revenue) in totals.items()
+        ]
+
+    def numeric_order_list(conn) -> list[dict]:
+        return [
+            {"id": order_id, "subtotal": float(subtotal)}
+            for order_id, subtotal in conn.execute(select(numeric_orders.c.id, numeric_orders.c.subtotal))
+        ]
+
+    def cents_order_list(conn) -> list[dict]:
+        return [
+            {"id": order_id, "subtotal_cents": subtotal, "subtotal": format_cents(subtotal)}
+            for order_id, subtotal in conn.execute(select(cents_orders.c.id, cents_orders.c.subtotal_cents))
+        ]
+
+    with engine.connect() as conn:
+        numeric_top = {row["id"]: row["revenue"] for row in numeric_revenue_by_item(conn)}
+        cents_top = {row["id"]: row["revenue"] for row in cents_revenue_by_item(conn)}
+        drift = sum(1 for key, revenue in cents_top.items() if abs(numeric_top[key] - revenue) >= 0.005)
+
+        rows = [
+            (
+                f"subtotals, {args.orders} orders",
+                lambda: [decimal_subtotal(lines) for lines in decimal_orders],
+                lambda: [cents_subtotal(lines) for lines in orders],
+            ),
+            (
+                f"order list, {args.orders} orders",
+                lambda: numeric_order_list(conn),
+                lambda: cents_order_list(conn),
+            ),
+            (
+                f"revenue by item, {args.menu_items}",
+                lambda: numeric_revenue_by_item(conn),
+                lambda: cents_revenue_by_item(conn),
+            ),
+        ]
+        print(f"{engine.dialect.name}: {sum(len(lines) for lines in orders)} order lines")
+        print(f"{'path':<32} {'numeric ms':>11} {'cents ms':>9} {'speedup':>8}")
+        for label, slow, fast in rows:
+            slow_ms = timeit(slow, args.repeat)
+            fast_ms = timeit(fast, args.repeat)
+            print(f"{label:<32} {slow_ms:>11.2f} {fast_ms:>9.2f} {slow_ms / fast_ms:>7.1f}x")
+        print(f"items whose numeric revenue differs from cents by >= 0.005: {drift}")
+    metadata.drop_all(engine)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+"""Orders/sec for POST /api/orders, direct commits vs. the group-commit queue.
+
+Run from ``backend/``::
+
+    python benchmarks/bench_order_ingest.py --orders 2000 --concurrency 8
+
+    python benchmarks/bench_order_ingest.py --commit-latency-ms 5
+
+Uses ``DATABASE_URL`` when set, otherwise a throwaway SQLite file. A local
+SQLite commit costs next to nothing, so the queue only adds its batching delay
+there. ``--commit-latency-ms`` sleeps in every commit to stand in for a durable
+commit (WAL flush, synchronous replica) on a real server; that per-commit cost
+is what group commit amortizes. Keep the concurrency below the transactional
+pool capacity (12 by default). Rate limiting and admission control are off for
+the run.
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault(
+    "DATABASE_URL", f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bench_orders.db')}"
+)
+os.environ.setdefault("RATE_LIMIT_ENABLED", "false")
+os.environ.setdefault("DB_CONCURRENCY_LIMIT", "0")
+
+import httpx  # noqa: E402
+from sqlalchemy import event  # noqa: E402
+
+from database import Base, SessionLocal, engine  # noqa: E402
+from ingest import order_ingest  # noqa: E402
+from main import app  # noqa: E402
+from models import MenuItem, Restaurant  # noqa: E402
+
+
+def seed() -> tuple[int, list[int]]:
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    try:
+        restaurant = Restaurant(name="Bench Bistro", city="Benchville")
+        db.add(restaurant)
+        db.flush()
+        items = [
+            MenuItem(restaurant_id=restaurant.id, name=f"Dish {i}", price_cents=500 + i * 100)
+            for i in range(20)
+        ]
+        db.add_all(items)
+        db.commit()
+        return restaurant.id, [item.id for item in items]
+    finally:
+        db.close()
+
+
+async def run(label: str, restaurant_id: int, item_ids: list[int], orders: int, concurrency: int) -> float:
+    transport = httpx.ASGITransport(app=app)
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        async def place(n: int) -> None:
+            body = {
+                "restaurant_id": restaurant_id,
+                "items": [
+                    {"menu_item_id": item_ids[n % len(item_ids)], "quantity": 1},
+                    {"menu_item_id": item_ids[(n * 7) % len(item_ids)], "quantity": 2},
+                ],
+            }
+            async with semaphore:
+                response = await client.post("/api/orders/", json=body)
+                response.raise_for_status()
+
+        started = time.perf_counter()
+        await asyncio.gather(*(place(n) for n in range(orders)))
+        elapsed = time.perf_counter() - started
+
+    rate = orders / elapsed
+    print(f"{label:<14} {orders} orders in {elapsed:.2f}s -> {rate:,.0f} orders/sec")
+    return rate
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--orders", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--batch-size", type=int, default=order_ingest.batch_size)
+    parser.add_argument("--max-delay-ms", type=float, default=order_ingest.max_delay * 1000)
+    parser.add_argument("--commit-latency-ms", type=float, default=0)
+    args = parser.parse_args()
+
+    if args.commit_latency_ms > 0:
+        @event.listens_for(engine, "commit")
+        def durable_commit(conn) -> None:
+            time.sleep(args.commit_latency_ms / 1000)
+
+    restaurant_id, item_ids = seed()
+    direct = await run("direct", restaurant_id, item_ids, args.orders, args.concurrency)
+
+    order_ingest.batch_size = args.batch_size
+    order_ingest.max_delay = args.max_delay_ms / 1000
+    order_ingest.start()
+    try:
+        queued = await run("group-commit", restaurant_id, item_ids, args.orders, args.concurrency)
+    finally:
+        await order_ingest.stop()
+    print(
+        f"batches={order_ingest.batches} avg_batch={order_ingest.committed / max(order_ingest.batches, 1):.1f} "
+        f"speedup={queued / direct:.2f}x"
+    )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,91 @@
+"""Per-request cost of ``ProfilerMiddleware``.
+
+Run from ``backend/``::
+
+    python benchmarks/bench_profiler.py --requests 20000 --work-ms 5
+
+Calls the middleware directly around a minimal ASGI app, so only the
+middleware is measured: with profiling off, on but not triggered (token set,
+no header), and profiling every request. The last rows run a CPU-bound
+handler of ``--work-ms`` with and without profiling to show the sampler's
+effect on the request it is profiling.
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from profiler import Profiler, ProfilerMiddleware  # noqa: E402
+
+SCOPE = {"type": "http", "method": "GET", "path": "/api/menu/", "query_string": b"restaurant_id=1", "headers": []}
+PROFILED_SCOPE = {**SCOPE, "headers": [(b"x-profile", b"secret")]}
+
+
+async def receive() -> dict:
+    return {"type": "http.request", "body": b"", "more_body": False}
+
+
+async def send(message) -> None:
+    pass
+
+
+def busy(seconds: float) -> None:
+    deadline = time.perf_counter() + seconds
+    total = 0
+    while time.perf_counter() < deadline:
+        total += sum(range(100))
+
+
+def make_app(work_seconds: float):
+    async def app(scope, receive, send) -> None:
+        if work_seconds:
+            busy(work_seconds)
+        await send({"type": "http.response.start", "status": 200, "headers": [(b"content-type", b"text/plain")]})
+        await send({"type": "http.response.body", "body": b"ok"})
+
+    return app
+
+
+async def run(app, scope: dict, requests: int) -> float:
+    started = time.perf_counter()
+    for _ in range(requests):
+        await app(scope, receive, send)
+    return (time.perf_counter() - started) / requests * 1e6
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=20000)
+    parser.add_argument("--work-ms", type=float, default=5)
+    parser.add_argument("--work-requests", type=int, default=200)
+    parser.add_argument("--interval-ms", type=float, default=2)
+    args = parser.parse_args()
+
+    bare = make_app(0)
+    off = ProfilerMiddleware(bare, Profiler(token=None, sample_rate=0))
+    on = ProfilerMiddleware(bare, Profiler(token="secret", sample_rate=0, interval_ms=args.interval_ms))
+    work = make_app(args.work_ms / 1000)
+    work_on = ProfilerMiddleware(work, Profiler(token="secret", sample_rate=0, interval_ms=args.interval_ms))
+
+    rows = [
+        ("no middleware", bare, SCOPE, args.requests),
+        ("profiling off", off, SCOPE, args.requests),
+        ("enabled, not triggered", on, SCOPE, args.requests),
+        ("profiled", on, PROFILED_SCOPE, args.requests),
+        (f"{args.work_ms:g} ms handler", work, SCOPE, args.work_requests),
+        (f"{args.work_ms:g} ms handler, profiled", work_on, PROFILED_SCOPE, args.work_requests),
+    ]
+    print(f"{'case':<32}{'us/request':>12}")
+    for label, app, scope, requests in rows:
+        asyncio.run(run(app, scope, min(requests, 100)))
+        print(f"{label:<32}{asyncio.run(run(app, scope, requests)):>12.1f}")
+    profiles = work_on.profiler.recent(1)
+    if profiles:
+        print(f"samples in last profiled {args.work_ms:g} ms request: {profiles[0]['samples']}")
+
+
+if __name__ == "__main__":
+    main()
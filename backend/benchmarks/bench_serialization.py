@@ -0,0 +1,160 @@
+"""Encode cost of ORM + ``response_model`` validation vs. column projections.
+
+Run from ``backend/``::
+
+    python benchmarks/bench_serialization.py --orders 1000 --menu-items 500
+
+Times two things per payload: the full read (query + shaping + encoding) and
+encoding alone with the data already in memory. The "orm" rows reproduce what
+FastAPI did before: validate ORM objects through the ``*Out`` models, dump to
+JSON-compatible Python, then ``json.dumps``. The cache is off for the run so
+the fast menu read queries the database every time instead of hitting the L1.
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault(
+    "DATABASE_URL", f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bench_serialization.db')}"
+)
+os.environ["CACHE_BACKEND"] = "off"
+
+from pydantic import TypeAdapter  # noqa: E402
+from sqlalchemy.orm import selectinload  # noqa: E402
+
+from database import Base, SessionLocal, engine  # noqa: E402
+from models import MenuCategory, MenuItem, Order, OrderItem, Restaurant  # noqa: E402
+from routes.menu import MenuCategoryOut, list_menu  # noqa: E402
+from routes.orders import OrderOut, order_rows  # noqa: E402
+from serializers import dumps  # noqa: E402
+from totals import apply_totals  # noqa: E402
+
+orders_adapter = TypeAdapter(list[OrderOut])
+menu_adapter = TypeAdapter(list[MenuCategoryOut])
+
+
+def seed(db, orders: int, menu_items: int) -> int:
+    restaurant = Restaurant(name="Bench")
+    db.add(restaurant)
+    db.flush()
+    categories = [MenuCategory(restaurant_id=restaurant.id, name=f"Cat {i}", sort_order=i) for i in range(10)]
+    db.add_all(categories)
+    db.flush()
+    items = [
+        MenuItem(
+            restaurant_id=restaurant.id,
+            category_id=categories[i % len(categories)].id,
+            name=f"Dish {i}",
+            description=f"Description for dish {i}",
+            price_cents=550 + (i % 20) * 100,
+            diet_tag="veg" if i % 3 else None,
+        )
+        for i in range(menu_items)
+    ]
+    db.add_all(items)
+    db.flush()
+    for n in range(orders):
+        order = Order(restaurant_id=restaurant.id, status="pending", notes=None)
+        for k in range(3):
+            item = items[(n * 3 + k) % len(items)]
+            order.items.append(OrderItem(menu_item_id=item.id, quantity=1 + k, unit_price_cents=item.price_cents))
+        apply_totals(order)
+        db.add(order)
+    db.commit()
+    return restaurant.id
+
+
+def orm_menu(db, restaurant_id: int) -> list[MenuCategoryOut]:
+    categories = (
+        db.query(MenuCategory)
+        .filter(MenuCategory.restaurant_id == restaurant_id)
+        .order_by(MenuCategory.sort_order, MenuCategory.id)
+        .all()
+    )
+    menu = []
+    for category in categories:
+        items = sorted(category.items, key=lambda item: item.id)
+        if items:
+            menu.append(
+                MenuCategoryOut(id=category.id, name=category.name, sort_order=category.sort_order, items=items)
+            )
+    return menu
+
+
+def orm_encode(adapter: TypeAdapter, data) -> bytes:
+    validated = adapter.validate_python(data, from_attributes=True)
+    return json.dumps(adapter.dump_python(validated, mode="json")).encode("utf-8")
+
+
+def timeit(fn, repeat: int) -> float:
+    fn()
+    started = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - started) / repeat * 1000
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--orders", type=int, default=1000)
+    parser.add_argument("--menu-items", type=int, default=500)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    restaurant_id = seed(db, args.orders, args.menu_items)
+    orders_query = db.query(Order).filter(Order.restaurant_id == restaurant_id).order_by(Order.id.desc())
+
+    def orm_orders_full() -> bytes:
+        db.expire_all()
+        return orm_encode(orders_adapter, orders_query.all())
+
+    def fast_orders_full() -> bytes:
+        return dumps(order_rows(db, orders_query))
+
+    def orm_menu_full() -> bytes:
+        db.expire_all()
+        return orm_encode(menu_adapter, orm_menu(db, restaurant_id))
+
+    def fast_menu_full() -> bytes:
+        return list_menu(restaurant_id=restaurant_id, diet=None, search=None, db=db, user=None).body
+
+    loaded_orders = (
+        db.query(Order)
+        .options(selectinload(Order.items).selectinload(OrderItem.menu_item))
+        .filter(Order.restaurant_id == restaurant_id)
+        .all()
+    )
+    order_dicts = order_rows(db, orders_query)
+    loaded_menu = orm_menu(db, restaurant_id)
+    menu_dicts = json.loads(fast_menu_full())
+
+    rows = [
+        (f"{args.orders} orders, full read", orm_orders_full, fast_orders_full),
+        (
+            f"{args.orders} orders, encode only",
+            lambda: orm_encode(orders_adapter, loaded_orders),
+            lambda: dumps(order_dicts),
+        ),
+        (f"{args.menu_items}-item menu, full read", orm_menu_full, fast_menu_full),
+        (
+            f"{args.menu_items}-item menu, encode only",
+            lambda: orm_encode(menu_adapter, loaded_menu),
+            lambda: dumps(menu_dicts),
+        ),
+    ]
+    print(f"{'payload':<32} {'orm ms':>9} {'fast ms':>9} {'speedup':>8}")
+    for label, slow, fast in rows:
+        slow_ms = timeit(slow, args.repeat)
+        fast_ms = timeit(fast, args.repeat)
+        print(f"{label:<32} {slow_ms:>9.2f} {fast_ms:>9.2f} {slow_ms / fast_ms:>7.1f}x")
+    db.close()
+
+
+if __name__ == "__main__":
+    main()
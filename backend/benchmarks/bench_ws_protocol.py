@@ -0,0 +1,127 @@
+"""CPU and bytes per delivered /ws/orders event for each wire protocol.
+
+Run from ``backend/``::
+
+    python benchmarks/bench_ws_protocol.py --sockets 50 --events 300 --rate 100
+
+Drives ``ws.ConnectionManager.broadcast`` against in-memory sockets at
+``--rate`` events per second. ``legacy`` reproduces the old broadcast:
+``send_json`` on every socket, re-encoding the event each time. Bytes are
+counted per socket before and after a per-socket permessage-deflate stream
+(raw deflate, sync flush, shared context), which is what uvicorn negotiates
+by default; compression time is reported separately from the send path.
+CPU includes some idle event-loop overhead, which is equal across protocols.
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+import zlib
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ws import ORDER_PROTOCOLS, ConnectionManager  # noqa: E402
+
+
+class MemorySocket:
+    def __init__(self) -> None:
+        self.raw_bytes = 0
+        self.deflated_bytes = 0
+        self.frames: list[bytes] = []
+        self.deflater = zlib.compressobj(wbits=-15)
+
+    async def _write(self, data: bytes) -> None:
+        self.raw_bytes += len(data)
+        self.frames.append(data)
+
+    async def send_text(self, data: str) -> None:
+        await self._write(data.encode("utf-8"))
+
+    async def send_bytes(self, data: bytes) -> None:
+        await self._write(data)
+
+    async def send_json(self, data) -> None:
+        # Starlette's WebSocket.send_json.
+        await self.send_text(json.dumps(data, separators=(",", ":"), ensure_ascii=False))
+
+    def deflate(self) -> float:
+        started = time.perf_counter()
+        for frame in self.frames:
+            self.deflated_bytes += len(self.deflater.compress(frame) + self.deflater.flush(zlib.Z_SYNC_FLUSH)) - 4
+        self.frames.clear()
+        return time.perf_counter() - started
+
+
+def events(count: int) -> list[dict]:
+    messages = []
+    for n in range(count):
+        if n % 3:
+            status = ("in_progress", "ready", "completed")[n % 3]
+            messages.append({"type": "order_status", "order_id": 100000 + n // 3, "status": status})
+        else:
+            messages.append({"type": "order_created", "order_id": 100000 + n // 3})
+    return messages
+
+
+async def run(protocol: str, args) -> dict:
+    manager = ConnectionManager(ping_interval=0, batch_window_ms=args.window_ms)
+    sockets = [MemorySocket() for _ in range(args.sockets)]
+    manager.active_connections = list(sockets)
+    fmt, batched = ORDER_PROTOCOLS.get(protocol, ("json", False))
+    manager.protocols = {socket: (fmt, batched) for socket in sockets}
+    if protocol == "legacy":
+        async def broadcast(message: dict) -> None:
+            for socket in sockets:
+                await socket.send_json(message)
+    else:
+        broadcast = manager.broadcast
+
+    manager.start()
+    interval = 1 / args.rate
+    # Batches are encoded and sent by the flush task, so CPU is measured over
+    # the whole run; the loop is idle while sleeping.
+    started = time.process_time()
+    for message in events(args.events):
+        await broadcast(message)
+        await asyncio.sleep(interval)
+    await asyncio.sleep(args.window_ms / 1000 * 2)
+    cpu = time.process_time() - started
+    await manager.stop()
+
+    deflate = 0.0
+    for socket in sockets:
+        deflate += socket.deflate()
+    deliveries = args.events * args.sockets
+    raw = sum(socket.raw_bytes for socket in sockets)
+    deflated = sum(socket.deflated_bytes for socket in sockets)
+    return {
+        "protocol": protocol,
+        "cpu_us_per_delivery": round(cpu / deliveries * 1e6, 3),
+        "deflate_us_per_delivery": round(deflate / deliveries * 1e6, 3),
+        "bytes_per_delivery": round(raw / deliveries, 1),
+        "deflated_bytes_per_delivery": round(deflated / deliveries, 1),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sockets", type=int, default=50)
+    parser.add_argument("--events", type=int, default=300)
+    parser.add_argument("--rate", type=float, default=100, help="events per second")
+    parser.add_argument("--window-ms", type=float, default=50)
+    args = parser.parse_args()
+
+    print(f"{args.events} events to {args.sockets} sockets at {args.rate:g}/s, batch window {args.window_ms:g} ms")
+    print(f"{'protocol':<22}{'cpu us':>10}{'deflate us':>12}{'bytes':>10}{'deflated':>10}")
+    for protocol in ("legacy", *ORDER_PROTOCOLS):
+        row = asyncio.run(run(protocol, args))
+        print(
+            f"{row['protocol']:<22}{row['cpu_us_per_delivery']:>10}{row['deflate_us_per_delivery']:>12}"
+            f"{row['bytes_per_delivery']:>10}{row['deflated_bytes_per_delivery']:>10}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,290 @@
+"""Scripted end-to-end load test against a running (or spawned) uvicorn.
+
+Seed first, then run from ``backend/``::
+
+    python benchmarks/seed.py --restaurants 10
+    python benchmarks/loadtest.py --spawn --duration 20 --concurrency 16 --ws-listeners 50
+
+Scenarios: ``guest_scan`` (table lookup, menu, trending), ``order_burst``
+(POST /api/orders), ``kitchen_updates`` (status transitions),
+``dashboard_polling`` (analytics + kitchen board) and ``ws_fanout``
+(N listeners on /ws/orders, latency from order commit to delivery).
+Each run prints p50/p95/p99 latency and throughput per scenario and is saved
+to ``benchmarks/results/``; pass ``--compare <file>`` to diff against an
+earlier run. Start the server with ``RATE_LIMIT_ENABLED=false`` (``--spawn``
+does this) so the limiter does not skew the numbers.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+from datetime import datetime
+
+import httpx
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DASHBOARD_PATHS = (
+    "/api/analytics/summary",
+    "/api/analytics/status",
+    "/api/analytics/top-items",
+    "/api/analytics/by-category",
+)
+SCENARIOS = ("guest_scan", "order_burst", "kitchen_updates", "dashboard_polling", "ws_fanout")
+
+
+def percentile(samples: list[float], pct: float) -> float:
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+class Recorder:
+    def __init__(self) -> None:
+        self.latencies: list[float] = []
+        self.errors = 0
+        self.started = time.perf_counter()
+        self.finished = self.started
+
+    async def call(self, coro) -> httpx.Response | None:
+        started = time.perf_counter()
+        try:
+            response = await coro
+        except httpx.HTTPError:
+            self.errors += 1
+            return None
+        self.latencies.append(time.perf_counter() - started)
+        if response.status_code >= 400:
+            self.errors += 1
+        return response
+
+    def summary(self) -> dict:
+        elapsed = max(self.finished - self.started, 1e-9)
+        return {
+            "requests": len(self.latencies),
+            "errors": self.errors,
+            "throughput_rps": round(len(self.latencies) / elapsed, 1),
+            "p50_ms": round(percentile(self.latencies, 50) * 1000, 2),
+            "p95_ms": round(percentile(self.latencies, 95) * 1000, 2),
+            "p99_ms": round(percentile(self.latencies, 99) * 1000, 2),
+        }
+
+
+class LoadTest:
+    def __init__(self, args, manifest: dict) -> None:
+        self.args = args
+        self.restaurants = manifest["restaurants"]
+        self.password = manifest.get("password", "password")
+        self.tokens: dict[int, str] = {}
+        self.rng = random.Random(args.seed)
+
+    def restaurant(self) -> dict:
+        return self.rng.choice(self.restaurants)
+
+    async def login_all(self, client: httpx.AsyncClient) -> None:
+        for restaurant in self.restaurants:
+            response = await client.post(
+                "/api/auth/login", json={"email": restaurant["owner_email"], "password": self.password}
+            )
+            response.raise_for_status()
+            self.tokens[restaurant["id"]] = response.json()["token"]
+
+    def owner_headers(self, restaurant: dict) -> dict:
+        return {"Authorization": f"Bearer {self.tokens[restaurant['id']]}"}
+
+    def order_body(self, restaurant: dict) -> dict:
+        items = self.rng.sample(restaurant["item_ids"], k=min(3, len(restaurant["item_ids"])))
+        body = {"restaurant_id": restaurant["id"], "items": [{"menu_item_id": item, "quantity": 1} for item in items]}
+        if restaurant["table_ids"]:
+            body["table_id"] = self.rng.choice(restaurant["table_ids"])
+        return body
+
+    async def guest_scan(self, client, recorder: Recorder) -> None:
+        restaurant = self.restaurant()
+        if restaurant["table_codes"]:
+            code = self.rng.choice(restaurant["table_codes"])
+            await recorder.call(client.get("/api/tables/lookup", params={"code": code}))
+        await recorder.call(client.get("/api/menu/", params={"restaurant_id": restaurant["id"]}))
+        await recorder.call(client.get("/api/recommendations/trending", params={"restaurant_id": restaurant["id"]}))
+
+    async def order_burst(self, client, recorder: Recorder) -> None:
+        restaurant = self.restaurant()
+        await recorder.call(client.post("/api/orders/", json=self.order_body(restaurant)))
+
+    async def kitchen_updates(self, client, recorder: Recorder) -> None:
+        restaurant = self.restaurant()
+        headers = self.owner_headers(restaurant)
+        created = await recorder.call(client.post("/api/orders/", json=self.order_body(restaurant)))
+        if created is None or created.status_code >= 400:
+            return
+        order_id = created.json()["id"]
+        for status in ("in_progress", "ready", "completed"):
+            await recorder.call(
+                client.patch(f"/api/orders/{order_id}/status", json={"status": status}, headers=headers)
+            )
+
+    async def dashboard_polling(self, client, recorder: Recorder) -> None:
+        restaurant = self.restaurant()
+        headers = self.owner_headers(restaurant)
+        for path in DASHBOARD_PATHS:
+            await recorder.call(client.get(path, headers=headers))
+        await recorder.call(client.get("/api/orders/active", headers=headers))
+
+    async def run_scenario(self, name: str, client: httpx.AsyncClient) -> dict:
+        recorder = Recorder()
+        step = getattr(self, name)
+        deadline = time.perf_counter() + self.args.duration
+
+        async def worker() -> None:
+            while time.perf_counter() < deadline:
+                await step(client, recorder)
+
+        await asyncio.gather(*(worker() for _ in range(self.args.concurrency)))
+        recorder.finished = time.perf_counter()
+        return recorder.summary()
+
+    async def ws_fanout(self, client: httpx.AsyncClient) -> dict:
+        import websockets
+
+        ws_url = self.args.base_url.replace("http", "ws", 1) + "/ws/orders"
+        sockets = [await websockets.connect(ws_url) for _ in range(self.args.ws_listeners)]
+        delivery: list[float] = []
+        recorder = Recorder()
+        try:
+            for _ in range(self.args.ws_events):
+                sent = time.perf_counter()
+                response = await recorder.call(client.post("/api/orders/", json=self.order_body(self.restaurant())))
+                if response is None or response.status_code >= 400:
+                    continue
+                order_id = response.json()["id"]
+
+                async def receive(socket) -> None:
+                    while True:
+                        message = json.loads(await socket.recv())
+                        if message.get("type") == "ping":
+                            await socket.send(json.dumps({"type": "pong"}))
+                        elif message.get("type") == "order_created" and message.get("order_id") == order_id:
+                            delivery.append(time.perf_counter() - sent)
+                            return
+
+                try:
+                    await asyncio.wait_for(asyncio.gather(*(receive(socket) for socket in sockets)), timeout=10)
+                except asyncio.TimeoutError:
+                    recorder.errors += 1
+        finally:
+            for socket in sockets:
+                await socket.close()
+        recorder.finished = time.perf_counter()
+        summary = recorder.summary()
+        summary.update({
+            "listeners": self.args.ws_listeners,
+            "deliveries": len(delivery),
+            "delivery_p50_ms": round(percentile(delivery, 50) * 1000, 2),
+            "delivery_p95_ms": round(percentile(delivery, 95) * 1000, 2),
+            "delivery_p99_ms": round(percentile(delivery, 99) * 1000, 2),
+        })
+        return summary
+
+    async def run(self) -> dict:
+        results = {}
+        limits = httpx.Limits(max_connections=self.args.concurrency * 2)
+        async with httpx.AsyncClient(base_url=self.args.base_url, timeout=30, limits=limits) as client:
+            await self.login_all(client)
+            for name in self.args.scenarios:
+                print(f"running {name} ...", flush=True)
+                if name == "ws_fanout":
+                    results[name] = await self.ws_fanout(client)
+                else:
+                    results[name] = await self.run_scenario(name, client)
+        return results
+
+
+def print_report(results: dict, baseline: dict | None) -> None:
+    print(f"\n{'scenario':<18} {'req':>7} {'err':>5} {'rps':>8} {'p50':>8} {'p95':>8} {'p99':>8}")
+    for name, row in results.items():
+        line = (
+            f"{name:<18} {row['requests']:>7} {row['errors']:>5} {row['throughput_rps']:>8} "
+            f"{row['p50_ms']:>8} {row['p95_ms']:>8} {row['p99_ms']:>8}"
+        )
+        previous = (baseline or {}).get(name)
+        if previous and previous.get("p95_ms"):
+            change = (row["p95_ms"] - previous["p95_ms"]) / previous["p95_ms"] * 100
+            line += f"   p95 {change:+.1f}% vs baseline"
+        print(line)
+        if "delivery_p50_ms" in row:
+            print(
+                f"{'':<18} ws delivery to {row['listeners']} listeners: p50 {row['delivery_p50_ms']}ms "
+                f"p95 {row['delivery_p95_ms']}ms p99 {row['delivery_p99_ms']}ms"
+            )
+
+
+def spawn_server(args) -> subprocess.Popen:
+    env = dict(os.environ, RATE_LIMIT_ENABLED="false", DB_CONCURRENCY_LIMIT="0")
+    port = args.base_url.rsplit(":", 1)[-1].strip("/")
+    process = subprocess.Popen(
+        [
+            sys.executable, "-m", "uvicorn", "main:app",
+            "--port", port, "--workers", str(args.workers), "--log-level", "warning",
+        ],
+        cwd=BACKEND_DIR,
+        env=env,
+    )
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        try:
+            httpx.get(args.base_url + "/", timeout=1)
+            return process
+        except httpx.HTTPError:
+            time.sleep(0.3)
+    process.terminate()
+    raise SystemExit("server did not start within 30s")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--base-url", default="http://127.0.0.1:8000")
+    parser.add_argument("--manifest", default=os.path.join(RESULTS_DIR, "seed_manifest.json"))
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=list(SCENARIOS))
+    parser.add_argument("--duration", type=float, default=15, help="seconds per scenario")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--ws-listeners", type=int, default=25)
+    parser.add_argument("--ws-events", type=int, default=50)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--spawn", action="store_true", help="start uvicorn from backend/ for the run")
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--label", default="run")
+    parser.add_argument("--compare", help="earlier results file to compare against")
+    args = parser.parse_args()
+
+    with open(args.manifest) as handle:
+        manifest = json.load(handle)
+    process = spawn_server(args) if args.spawn else None
+    try:
+        results = asyncio.run(LoadTest(args, manifest).run())
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait()
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as handle:
+            baseline = json.load(handle)["results"]
+    print_report(results, baseline)
+
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    stamp = datetime.utcnow().strftime("%Y%m%dT%H%M%S")
+    path = os.path.join(RESULTS_DIR, f"loadtest-{args.label}-{stamp}.json")
+    with open(path, "w") as handle:
+        json.dump({"label": args.label, "at": stamp, "args": vars(args), "results": results}, handle, indent=2)
+    print(f"\nsaved {path}")
+
+
+if __name__ == "__main__":
+    main()
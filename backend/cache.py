@@ -0,0 +1,317 @@
+import logging
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Callable, Iterable
+
+from metrics import Counter, registry
+from serializers import dumps, loads
+
+logger = logging.getLogger(__name__)
+
+# memory: per-worker L1 only; redis: L1 in front of a shared Redis L2;
+# fake: L2 backed by FakeRedis (single process, for tests and benchmarks);
+# off: every call computes.
+CACHE_BACKEND = os.getenv("CACHE_BACKEND", "memory").lower()
+CACHE_PREFIX = os.getenv("CACHE_PREFIX", "cache")
+CACHE_DEFAULT_TTL_SECONDS = float(os.getenv("CACHE_DEFAULT_TTL_SECONDS", "60"))
+# Bounds how long another worker's invalidation can go unseen in this L1.
+CACHE_L1_TTL_SECONDS = float(os.getenv("CACHE_L1_TTL_SECONDS", "2"))
+CACHE_L1_MAX_ENTRIES = int(os.getenv("CACHE_L1_MAX_ENTRIES", "5000"))
+CACHE_LOCK_TIMEOUT_MS = float(os.getenv("CACHE_LOCK_TIMEOUT_MS", "5000"))
+CACHE_LOCK_POLL_MS = float(os.getenv("CACHE_LOCK_POLL_MS", "20"))
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+
+cache_requests = registry.register(
+    Counter("cache_requests_total", "Cache lookups by layer and outcome.", ["layer", "result"])
+)
+
+
+class FakeRedis:
+    """In-process stand-in for the handful of Redis commands ``Cache`` uses."""
+
+    def __init__(self) -> None:
+        self._data: dict[str, tuple[bytes, float | None]] = {}
+        self._lock = threading.Lock()
+
+    def _live(self, key: str):
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        value, expires = entry
+        if expires is not None and expires <= time.monotonic():
+            del self._data[key]
+            return None
+        return value
+
+    def get(self, key: str):
+        with self._lock:
+            return self._live(key)
+
+    def mget(self, keys: Iterable[str]) -> list:
+        with self._lock:
+            return [self._live(key) for key in keys]
+
+    def set(self, key: str, value, px: int | None = None, nx: bool = False):
+        if isinstance(value, str):
+            value = value.encode("utf-8")
+        with self._lock:
+            if nx and self._live(key) is not None:
+                return None
+            self._data[key] = (value, time.monotonic() + px / 1000 if px else None)
+            return True
+
+    def incr(self, key: str) -> int:
+        with self._lock:
+            value = int(self._live(key) or 0) + 1
+            expires = self._data.get(key, (None, None))[1]
+            self._data[key] = (str(value).encode("utf-8"), expires)
+            return value
+
+    def delete(self, *keys: str) -> int:
+        with self._lock:
+            return sum(self._data.pop(key, None) is not None for key in keys)
+
+    def flushall(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+
+class _Flight:
+    __slots__ = ("lock", "waiters")
+
+    def __init__(self) -> None:
+        self.lock = threading.Lock()
+        self.waiters = 0
+
+
+class Cache:
+    """Two-level cache: a per-worker LRU (L1) in front of optional Redis (L2).
+
+    Keys live in a namespace (usually a restaurant id). ``invalidate``
+    bumps a per-namespace tag version; entries remember the versions they
+    were computed under and are treated as misses once any has moved. A cold
+    key is computed once per worker (per-key lock) and once per cluster
+    (Redis ``SET NX`` lock; other workers poll L2 for the result). Redis
+    errors degrade to computing locally.
+    """
+
+    def __init__(
+        self,
+        client=None,
+        prefix: str = CACHE_PREFIX,
+        default_ttl: float = CACHE_DEFAULT_TTL_SECONDS,
+        l1_ttl: float = CACHE_L1_TTL_SECONDS,
+        l1_max_entries: int = CACHE_L1_MAX_ENTRIES,
+        lock_timeout_ms: float = CACHE_LOCK_TIMEOUT_MS,
+        lock_poll_ms: float = CACHE_LOCK_POLL_MS,
+        enabled: bool = True,
+    ) -> None:
+        self.client = client
+        self.prefix = prefix
+        self.default_ttl = default_ttl
+        self.l1_ttl = l1_ttl
+        self.l1_max_entries = l1_max_entries
+        self.lock_timeout = lock_timeout_ms / 1000
+        self.lock_poll = lock_poll_ms / 1000
+        self.enabled = enabled
+        self._l1: OrderedDict[str, tuple[object, dict, float]] = OrderedDict()
+        self._versions: dict[str, int] = {}
+        self._flights: dict[str, _Flight] = {}
+        self._lock = threading.Lock()
+
+    def _key(self, namespace, name: str) -> str:
+        return f"{self.prefix}:{namespace}:{name}"
+
+    def _tag_key(self, namespace, tag: str) -> str:
+        return f"{self.prefix}:{namespace}:tag:{tag}"
+
+    # L1
+
+    def _l1_get(self, key: str):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._l1.get(key)
+            if entry is None:
+                return None
+            value, versions, expires = entry
+            if expires <= now or any(self._versions.get(tag, 0) != version for tag, version in versions.items()):
+                del self._l1[key]
+                return None
+            self._l1.move_to_end(key)
+            return entry
+
+    def _l1_set(self, key: str, value, versions: dict, ttl: float) -> None:
+        with self._lock:
+            self._l1[key] = (value, versions, time.monotonic() + min(ttl, self.l1_ttl))
+            self._l1.move_to_end(key)
+            while len(self._l1) > self.l1_max_entries:
+                self._l1.popitem(last=False)
+
+    # L2
+
+    def _local_versions(self, tag_keys: list[str]) -> dict[str, int]:
+        with self._lock:
+            return {tag: self._versions.get(tag, 0) for tag in tag_keys}
+
+    def _tag_versions(self, tag_keys: list[str]) -> dict[str, int]:
+        if self.client is None or not tag_keys:
+            return self._local_versions(tag_keys)
+        raw = self.client.mget(tag_keys)
+        versions = {tag: int(value or 0) for tag, value in zip(tag_keys, raw)}
+        with self._lock:
+            self._versions.update(versions)
+        return versions
+
+    def _l2_get(self, key: str, tag_keys: list[str]):
+        raw, *tag_raw = self.client.mget([key, *tag_keys])
+        versions = {tag: int(value or 0) for tag, value in zip(tag_keys, tag_raw)}
+        with self._lock:
+            self._versions.update(versions)
+        if raw is None:
+            return None
+        envelope = loads(raw)
+        if envelope["t"] != versions:
+            return None
+        return envelope["v"], versions
+
+    def _l2_set(self, key: str, value, versions: dict, ttl: float) -> None:
+        self.client.set(key, dumps({"t": versions, "v": value}), px=max(1, int(ttl * 1000)))
+
+    def _acquire(self, key: str) -> str | None:
+        token = uuid.uuid4().hex
+        if self.client.set(f"{key}:lock", token, px=int(self.lock_timeout * 1000), nx=True):
+            return token
+        return None
+
+    def _release(self, key: str, token: str) -> None:
+        # Not atomic; at worst a lock that already expired and was re-taken is
+        # dropped early, which costs one extra computation.
+        current = self.client.get(f"{key}:lock")
+        if current is not None and (current.decode("utf-8") if isinstance(current, bytes) else current) == token:
+            self.client.delete(f"{key}:lock")
+
+    def _wait_for_l2(self, key: str, tag_keys: list[str]):
+        deadline = time.monotonic() + self.lock_timeout
+        while time.monotonic() < deadline:
+            time.sleep(self.lock_poll)
+            found = self._l2_get(key, tag_keys)
+            if found is not None:
+                return found
+        return None
+
+    # public API
+
+    def get_or_set(
+        self, namespace, name: str, compute: Callable[[], object], ttl: float | None = None, tags: Iterable[str] = ()
+    ):
+        """Return the cached JSON-able value for ``name``, computing it on a miss."""
+        if not self.enabled:
+            return compute()
+        ttl = self.default_ttl if ttl is None else ttl
+        key = self._key(namespace, name)
+        tag_keys = [self._tag_key(namespace, tag) for tag in tags]
+
+        entry = self._l1_get(key)
+        if entry is not None:
+            cache_requests.inc(layer="l1", result="hit")
+            return entry[0]
+
+        with self._lock:
+            flight = self._flights.setdefault(key, _Flight())
+            flight.waiters += 1
+        try:
+            with flight.lock:
+                entry = self._l1_get(key)
+                if entry is not None:
+                    cache_requests.inc(layer="l1", result="hit")
+                    return entry[0]
+                cache_requests.inc(layer="l1", result="miss")
+                return self._fill(key, tag_keys, compute, ttl)
+        finally:
+            with self._lock:
+                flight.waiters -= 1
+                if not flight.waiters:
+                    self._flights.pop(key, None)
+
+    def _fill(self, key: str, tag_keys: list[str], compute: Callable[[], object], ttl: float):
+        if self.client is None:
+            versions = self._tag_versions(tag_keys)
+            value = compute()
+            self._l1_set(key, value, versions, ttl)
+            return value
+
+        token = None
+        try:
+            found = self._l2_get(key, tag_keys)
+            if found is None:
+                token = self._acquire(key)
+                if token is None:
+                    found = self._wait_for_l2(key, tag_keys)
+        except Exception:
+            logger.warning("cache backend unavailable, computing locally", exc_info=True)
+            cache_requests.inc(layer="l2", result="error")
+            return compute()
+        if found is not None:
+            cache_requests.inc(layer="l2", result="hit")
+            value, versions = found
+            self._l1_set(key, value, versions, ttl)
+            return value
+
+        cache_requests.inc(layer="l2", result="miss")
+        try:
+            # Versions are read before computing so an invalidation that lands
+            # mid-computation leaves this entry already stale.
+            try:
+                versions = self._tag_versions(tag_keys)
+            except Exception:
+                logger.warning("could not read cache tag versions, using this worker's", exc_info=True)
+                cache_requests.inc(layer="l2", result="error")
+                versions = self._local_versions(tag_keys)
+            value = compute()
+            try:
+                self._l2_set(key, value, versions, ttl)
+            except Exception:
+                logger.warning("could not store %s in the cache backend", key, exc_info=True)
+                cache_requests.inc(layer="l2", result="error")
+            self._l1_set(key, value, versions, ttl)
+            return value
+        finally:
+            if token is not None:
+                try:
+                    self._release(key, token)
+                except Exception:
+                    logger.warning("could not release cache lock %s", key, exc_info=True)
+
+    def invalidate(self, namespace, *tags: str) -> None:
+        """Expire every entry in ``namespace`` cached under any of ``tags``."""
+        for tag in tags:
+            tag_key = self._tag_key(namespace, tag)
+            with self._lock:
+                self._versions[tag_key] = self._versions.get(tag_key, 0) + 1
+            if self.client is not None:
+                try:
+                    version = self.client.incr(tag_key)
+                    with self._lock:
+                        self._versions[tag_key] = max(self._versions[tag_key], int(version))
+                except Exception:
+                    logger.warning("could not invalidate cache tag %s", tag_key, exc_info=True)
+
+    def clear_local(self) -> None:
+        with self._lock:
+            self._l1.clear()
+
+
+def _build_client():
+    if CACHE_BACKEND == "redis":
+        import redis
+
+        return redis.Redis.from_url(REDIS_URL, socket_timeout=0.1)
+    if CACHE_BACKEND == "fake":
+        return FakeRedis()
+    return None
+
+
+cache = Cache(client=_build_client(), enabled=CACHE_BACKEND != "off")
@@ -0,0 +1,265 @@
+"""Response compression, CDN cache headers and surrogate-key purges.
+
+Public GETs listed in ``EDGE_POLICIES`` get ``Cache-Control`` (with
+``stale-while-revalidate``), a ``Surrogate-Key`` header naming the
+restaurant's keys and a content-hash ``ETag``. Mutations call
+``queue_purge`` inside their transaction; the outbox hands the keys to
+``purger`` once the change commits.
+"""
+import asyncio
+import gzip
+import hashlib
+import logging
+import os
+import re
+import threading
+import urllib.request
+from collections import OrderedDict, deque
+from urllib.parse import parse_qs
+
+from sqlalchemy.orm import Session
+
+from metrics import Counter, registry
+from outbox import enqueue, outbox
+
+try:
+    import brotli
+except Exception:
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+EDGE_COMPRESS_MIN_BYTES = int(os.getenv("EDGE_COMPRESS_MIN_BYTES", "512"))
+EDGE_COMPRESS_CACHE_ENTRIES = int(os.getenv("EDGE_COMPRESS_CACHE_ENTRIES", "512"))
+EDGE_GZIP_LEVEL = int(os.getenv("EDGE_GZIP_LEVEL", "6"))
+EDGE_BROTLI_QUALITY = int(os.getenv("EDGE_BROTLI_QUALITY", "5"))
+EDGE_MENU_CACHE_CONTROL = os.getenv("EDGE_MENU_CACHE_CONTROL", "public, max-age=30, stale-while-revalidate=300")
+EDGE_TABLES_CACHE_CONTROL = os.getenv(
+    "EDGE_TABLES_CACHE_CONTROL", "public, max-age=60, stale-while-revalidate=600"
+)
+EDGE_QR_CACHE_CONTROL = os.getenv("EDGE_QR_CACHE_CONTROL", "public, max-age=86400, stale-while-revalidate=604800")
+# Fastly-style purge endpoint; keys are POSTed to ``{EDGE_PURGE_URL}/{key}``.
+EDGE_PURGE_URL = os.getenv("EDGE_PURGE_URL")
+EDGE_PURGE_TOKEN = os.getenv("EDGE_PURGE_TOKEN")
+
+COMPRESSIBLE_TYPES = ("application/json", "text/")
+
+# (path pattern, surrogate key group, Cache-Control)
+EDGE_POLICIES = (
+    (re.compile(r"^/api/menu/?$"), "menu", EDGE_MENU_CACHE_CONTROL),
+    (re.compile(r"^/api/menu/(items(/\d+)?|categories|changes)$"), "menu", EDGE_MENU_CACHE_CONTROL),
+    (re.compile(r"^/api/recommendations/(trending|fbt)$"), "menu", EDGE_MENU_CACHE_CONTROL),
+    (re.compile(r"^/api/tables/public$"), "tables", EDGE_TABLES_CACHE_CONTROL),
+    (re.compile(r"^/api/tables/(?P<table_id>\d+)/qr$"), "table", EDGE_QR_CACHE_CONTROL),
+)
+
+edge_compression = registry.register(
+    Counter(
+        "edge_compressed_responses_total", "Compressed responses by encoding and cache outcome.", ["encoding", "cache"]
+    )
+)
+edge_purges = registry.register(Counter("edge_purged_keys_total", "Surrogate keys sent to the purger."))
+
+
+def menu_key(restaurant_id: int) -> str:
+    return f"menu-{restaurant_id}"
+
+
+def tables_key(restaurant_id: int) -> str:
+    return f"tables-{restaurant_id}"
+
+
+def table_key(table_id: int) -> str:
+    return f"table-{table_id}"
+
+
+def surrogate_keys(group: str, params: dict, match: re.Match) -> list[str] | None:
+    """Keys for a public response, or ``None`` when it is not safe to share."""
+    if group == "table":
+        return [table_key(int(match.group("table_id")))]
+    restaurant_id = params.get("restaurant_id", [None])[0]
+    if restaurant_id is None or not restaurant_id.isdigit():
+        # /api/tables/public without a restaurant lists every table.
+        return ["tables"] if group == "tables" else None
+    restaurant_id = int(restaurant_id)
+    keys = [f"restaurant-{restaurant_id}", menu_key(restaurant_id) if group == "menu" else tables_key(restaurant_id)]
+    if group == "tables":
+        keys.append("tables")
+    return keys
+
+
+class LocalPurger:
+    """Records purged keys in memory; the offline stand-in for a CDN API."""
+
+    def __init__(self, history: int = 1000) -> None:
+        self.purged: deque[str] = deque(maxlen=history)
+
+    def purge(self, keys: list[str]) -> None:
+        self.purged.extend(keys)
+        logger.debug("purged surrogate keys %s", keys)
+
+
+class HttpPurger(LocalPurger):
+    def __init__(self, url: str, token: str | None = None, timeout: float = 5) -> None:
+        super().__init__()
+        self.url = url.rstrip("/")
+        self.token = token
+        self.timeout = timeout
+
+    def purge(self, keys: list[str]) -> None:
+        for key in keys:
+            request = urllib.request.Request(f"{self.url}/{key}", method="POST")
+            if self.token:
+                request.add_header("Fastly-Key", self.token)
+            with urllib.request.urlopen(request, timeout=self.timeout):
+                pass
+        super().purge(keys)
+
+
+purger = HttpPurger(EDGE_PURGE_URL, EDGE_PURGE_TOKEN) if EDGE_PURGE_URL else LocalPurger()
+
+
+def queue_purge(db: Session, *keys: str) -> None:
+    """Purge ``keys`` once ``db``'s transaction commits (delivered via the outbox)."""
+    enqueue(db, "edge_purge", {"keys": list(keys)})
+
+
+async def _deliver_purge(payload: dict) -> None:
+    await asyncio.to_thread(purger.purge, payload["keys"])
+    edge_purges.inc(len(payload["keys"]))
+
+
+outbox.register("edge_purge", _deliver_purge)
+
+
+def _accepted_encoding(accept_encoding: str) -> str | None:
+    offered = {}
+    for part in accept_encoding.split(","):
+        name, _, params = part.strip().partition(";")
+        quality = 1.0
+        if params.strip().startswith("q="):
+            try:
+                quality = float(params.strip()[2:])
+            except ValueError:
+                quality = 0.0
+        offered[name.strip().lower()] = quality
+    if brotli is not None and offered.get("br", 0) > 0:
+        return "br"
+    if offered.get("gzip", 0) > 0:
+        return "gzip"
+    return None
+
+
+def compress(body: bytes, encoding: str) -> bytes:
+    if encoding == "br":
+        return brotli.compress(body, quality=EDGE_BROTLI_QUALITY)
+    return gzip.compress(body, compresslevel=EDGE_GZIP_LEVEL, mtime=0)
+
+
+class EdgeMiddleware:
+    """Compresses GET responses and adds CDN headers to public routes.
+
+    Bodies of shareable responses are compressed once per ``(ETag,
+    encoding)`` and served from a small LRU afterwards; a matching
+    ``If-None-Match`` gets a 304.
+    """
+
+    def __init__(
+        self,
+        app,
+        policies=EDGE_POLICIES,
+        min_size: int = EDGE_COMPRESS_MIN_BYTES,
+        cache_entries: int = EDGE_COMPRESS_CACHE_ENTRIES,
+    ) -> None:
+        self.app = app
+        self.policies = policies
+        self.min_size = min_size
+        self.cache_entries = cache_entries
+        self._compressed: OrderedDict[tuple[str, str], bytes] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _policy(self, path: str):
+        for pattern, group, cache_control in self.policies:
+            match = pattern.match(path)
+            if match:
+                return match, group, cache_control
+        return None
+
+    def _compress_cached(self, etag: str, encoding: str, body: bytes) -> bytes:
+        key = (etag, encoding)
+        with self._lock:
+            cached = self._compressed.get(key)
+            if cached is not None:
+                self._compressed.move_to_end(key)
+        if cached is not None:
+            edge_compression.inc(encoding=encoding, cache="hit")
+            return cached
+        compressed = compress(body, encoding)
+        edge_compression.inc(encoding=encoding, cache="miss")
+        with self._lock:
+            self._compressed[key] = compressed
+            while len(self._compressed) > self.cache_entries:
+                self._compressed.popitem(last=False)
+        return compressed
+
+    async def __call__(self, scope, receive, send) -> None:
+        if scope["type"] != "http" or scope["method"] != "GET":
+            await self.app(scope, receive, send)
+            return
+        request_headers = {key.decode("latin-1"): value.decode("latin-1") for key, value in scope["headers"]}
+        policy = self._policy(scope["path"])
+        encoding = _accepted_encoding(request_headers.get("accept-encoding", ""))
+        if policy is None and encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start: dict = {}
+        chunks: list[bytes] = []
+
+        async def capture(message) -> None:
+            if message["type"] == "http.response.start":
+                start.update(message)
+            elif message["type"] == "http.response.body":
+                chunks.append(message.get("body", b""))
+
+        await self.app(scope, receive, capture)
+        body = b"".join(chunks)
+        headers = [(key.lower(), value) for key, value in start.get("headers", [])]
+        names = {key for key, _ in headers}
+        status = start.get("status", 500)
+
+        etag = None
+        if policy is not None and status == 200:
+            match, group, cache_control = policy
+            params = parse_qs(scope.get("query_string", b"").decode("latin-1"))
+            keys = None if "authorization" in request_headers else surrogate_keys(group, params, match)
+            if keys is None:
+                headers.append((b"cache-control", b"private, no-cache"))
+            else:
+                etag = f'"{hashlib.blake2b(body, digest_size=12).hexdigest()}"'
+                headers.append((b"cache-control", cache_control.encode("latin-1")))
+                headers.append((b"surrogate-key", " ".join(keys).encode("latin-1")))
+                headers.append((b"etag", etag.encode("latin-1")))
+                if etag in request_headers.get("if-none-match", ""):
+                    headers = [(key, value) for key, value in headers if key not in (b"content-length", b"content-type")]
+                    await send({"type": "http.response.start", "status": 304, "headers": headers})
+                    await send({"type": "http.response.body", "body": b""})
+                    return
+
+        content_type = dict(headers).get(b"content-type", b"").decode("latin-1")
+        if (
+            len(body) >= self.min_size
+            and b"content-encoding" not in names
+            and content_type.startswith(COMPRESSIBLE_TYPES)
+        ):
+            headers.append((b"vary", b"Accept-Encoding"))
+            if encoding is not None:
+                body = self._compress_cached(etag, encoding, body) if etag else compress(body, encoding)
+                if not etag:
+                    edge_compression.inc(encoding=encoding, cache="none")
+                headers = [(key, value) for key, value in headers if key != b"content-length"]
+                headers.append((b"content-encoding", encoding.encode("latin-1")))
+                headers.append((b"content-length", str(len(body)).encode("latin-1")))
+
+        await send({"type": "http.response.start", "status": status, "headers": headers})
+        await send({"type": "http.response.body", "body": body})
@@ -0,0 +1,242 @@
+"""Hourly demand forecasts for every restaurant.
+
+One streaming query pulls hourly order counts for all restaurants over the
+last ``FORECAST_HISTORY_WEEKS``. Each restaurant gets a day-of-week x hour
+profile: simple exponential smoothing across weeks, computed for a whole
+chunk of restaurants at once in NumPy. Profiles land in ``demand_forecasts``
+and are served by ``GET /api/analytics/forecast``.
+
+Runs in the app when ``FORECAST_INTERVAL_SECONDS`` > 0, or nightly from cron::
+
+    python forecast.py --workers 4
+"""
+import argparse
+import asyncio
+import logging
+import multiprocessing
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, datetime, timedelta
+
+import numpy as np
+from sqlalchemy import delete, extract, func, insert, select, union_all
+
+from archive import ARCHIVE_AFTER_DAYS
+from database import SessionLocal
+from metrics import Counter, registry
+from models import ArchivedOrder, DemandForecast, Order
+
+logger = logging.getLogger(__name__)
+
+FORECAST_HISTORY_WEEKS = int(os.getenv("FORECAST_HISTORY_WEEKS", "8"))
+FORECAST_ALPHA = float(os.getenv("FORECAST_ALPHA", "0.3"))
+FORECAST_CHUNK_SIZE = int(os.getenv("FORECAST_CHUNK_SIZE", "1000"))
+# Above 1, chunks are fitted in a process pool of this size.
+FORECAST_WORKERS = int(os.getenv("FORECAST_WORKERS", "0"))
+FORECAST_STREAM_ROWS = int(os.getenv("FORECAST_STREAM_ROWS", "20000"))
+FORECAST_INTERVAL_SECONDS = float(os.getenv("FORECAST_INTERVAL_SECONDS", "0"))
+SLOTS = 7 * 24
+
+forecasts_written = registry.register(Counter("demand_forecasts_written_total", "Restaurant forecasts stored."))
+
+
+def smoothing_weights(weeks: int, alpha: float = FORECAST_ALPHA) -> np.ndarray:
+    """Per-week weights of exponential smoothing seeded with the oldest week (index 0)."""
+    weights = alpha * (1 - alpha) ** np.arange(weeks - 1, -1, -1, dtype=np.float64)
+    weights[0] = (1 - alpha) ** (weeks - 1)
+    return weights
+
+
+def fit_profiles(counts: np.ndarray, alpha: float = FORECAST_ALPHA) -> np.ndarray:
+    """``(restaurants, weeks, 168)`` hourly counts -> ``(restaurants, 168)`` expected orders."""
+    return np.tensordot(counts, smoothing_weights(counts.shape[1], alpha), axes=([1], [0])).astype(np.float32)
+
+
+def fit_chunk(
+    size: int, positions: np.ndarray, counts: np.ndarray, weeks: int, alpha: float = FORECAST_ALPHA
+) -> np.ndarray:
+    """Fit from sparse ``(restaurant * weeks + week) * 168 + slot`` positions; picklable for the pool."""
+    dense = np.bincount(positions, weights=counts, minlength=size * weeks * SLOTS).reshape(size, weeks, SLOTS)
+    return fit_profiles(dense, alpha)
+
+
+def hourly_counts(start: datetime, end: datetime):
+    """Orders per restaurant, day and hour in ``[start, end)``, ordered by restaurant."""
+    models = [Order]
+    if (datetime.utcnow() - start).days >= ARCHIVE_AFTER_DAYS:
+        models.append(ArchivedOrder)
+    selects = [
+        select(model.restaurant_id.label("restaurant_id"), model.created_at.label("created_at"))
+        .where(model.created_at >= start)
+        .where(model.created_at < end)
+        for model in models
+    ]
+    orders = (union_all(*selects) if len(selects) > 1 else selects[0]).subquery()
+    day = func.date(orders.c.created_at)
+    hour = extract("hour", orders.c.created_at)
+    return (
+        select(orders.c.restaurant_id, day, hour, func.count())
+        .group_by(orders.c.restaurant_id, day, hour)
+        .order_by(orders.c.restaurant_id)
+    )
+
+
+class _Chunk:
+    __slots__ = ("ids", "positions", "counts")
+
+    def __init__(self) -> None:
+        self.ids: list[int] = []
+        self.positions: list[int] = []
+        self.counts: list[int] = []
+
+
+def _store(db, ids: list[int], profiles: np.ndarray, weeks: int, generated_at: datetime) -> None:
+    db.execute(delete(DemandForecast).where(DemandForecast.restaurant_id.in_(ids)))
+    db.execute(
+        insert(DemandForecast),
+        [
+            {"restaurant_id": restaurant_id, "profile": profile, "history_weeks": weeks, "generated_at": generated_at}
+            # float64 first: a rounded float32 like 1.12 widens to 1.1200000047683716 in tolist().
+            for restaurant_id, profile in zip(ids, np.round(profiles.astype(np.float64), 2).tolist())
+        ],
+    )
+    db.commit()
+    forecasts_written.inc(len(ids))
+
+
+def run_forecasts(
+    weeks: int = FORECAST_HISTORY_WEEKS,
+    alpha: float = FORECAST_ALPHA,
+    chunk_size: int = FORECAST_CHUNK_SIZE,
+    workers: int = FORECAST_WORKERS,
+) -> int:
+    """Refit every restaurant with orders in the window; returns restaurants written."""
+    today = datetime.utcnow().date()
+    start_day = today - timedelta(weeks=weeks)
+    start = datetime.combine(start_day, datetime.min.time())
+    end = datetime.combine(today, datetime.min.time())
+    generated_at = datetime.utcnow()
+
+    reader = SessionLocal()
+    writer = SessionLocal()
+    # spawn: forking a process that runs an event loop and DB pools is unsafe.
+    pool = ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context("spawn")) if workers > 1 else None
+    in_flight: deque = deque()
+    written = 0
+
+    def finish_one() -> None:
+        nonlocal written
+        ids, future = in_flight.popleft()
+        _store(writer, ids, future.result(), weeks, generated_at)
+        written += len(ids)
+
+    def submit(chunk: _Chunk) -> None:
+        nonlocal written
+        if not chunk.ids:
+            return
+        args = (
+            len(chunk.ids),
+            np.asarray(chunk.positions, dtype=np.int64),
+            np.asarray(chunk.counts, dtype=np.float64),
+            weeks,
+            alpha,
+        )
+        if pool is None:
+            _store(writer, chunk.ids, fit_chunk(*args), weeks, generated_at)
+            written += len(chunk.ids)
+            return
+        in_flight.append((chunk.ids, pool.submit(fit_chunk, *args)))
+        # Bound memory: never hold more than two chunks per worker.
+        while len(in_flight) > workers * 2:
+            finish_one()
+
+    try:
+        result = reader.execute(
+            hourly_counts(start, end).execution_options(stream_results=True, yield_per=FORECAST_STREAM_ROWS)
+        )
+        chunk = _Chunk()
+        restaurant_index = -1
+        last_restaurant = None
+        for partition in result.partitions():
+            for restaurant_id, day, hour, count in partition:
+                if restaurant_id != last_restaurant:
+                    if len(chunk.ids) >= chunk_size:
+                        submit(chunk)
+                        chunk = _Chunk()
+                    chunk.ids.append(restaurant_id)
+                    restaurant_index = len(chunk.ids) - 1
+                    last_restaurant = restaurant_id
+                if not isinstance(day, date):
+                    day = date.fromisoformat(str(day))
+                week = (day - start_day).days // 7
+                slot = day.weekday() * 24 + int(hour)
+                chunk.positions.append((restaurant_index * weeks + week) * SLOTS + slot)
+                chunk.counts.append(count)
+        submit(chunk)
+        while in_flight:
+            finish_one()
+        # Restaurants with no orders in the window keep no stale forecast.
+        writer.execute(delete(DemandForecast).where(DemandForecast.generated_at < generated_at))
+        writer.commit()
+    finally:
+        reader.close()
+        writer.close()
+        if pool is not None:
+            pool.shutdown(cancel_futures=True)
+    logger.info("stored demand forecasts for %s restaurants", written)
+    return written
+
+
+def forecast_days(profile: list[float], start: date, days: int) -> list[dict]:
+    """Expand a weekly profile into ``days`` calendar days from ``start``."""
+    result = []
+    for offset in range(days):
+        day = start + timedelta(days=offset)
+        first = day.weekday() * 24
+        result.append({"date": day.isoformat(), "hours": profile[first:first + 24]})
+    return result
+
+
+class ForecastJob:
+    def __init__(self, interval: float = FORECAST_INTERVAL_SECONDS) -> None:
+        self.interval = interval
+        self._task: asyncio.Task | None = None
+
+    def start(self) -> None:
+        if self.interval <= 0 or self._task is not None:
+            return
+
+        async def loop() -> None:
+            while True:
+                try:
+                    await asyncio.to_thread(run_forecasts)
+                except Exception:
+                    logger.exception("demand forecast run failed")
+                await asyncio.sleep(self.interval)
+
+        self._task = asyncio.create_task(loop())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+
+forecast_job = ForecastJob()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--weeks", type=int, default=FORECAST_HISTORY_WEEKS)
+    parser.add_argument("--alpha", type=float, default=FORECAST_ALPHA)
+    parser.add_argument("--chunk-size", type=int, default=FORECAST_CHUNK_SIZE)
+    parser.add_argument("--workers", type=int, default=FORECAST_WORKERS)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    count = run_forecasts(args.weeks, args.alpha, args.chunk_size, args.workers)
+    print(f"forecast {count} restaurants")
+
+
+if __name__ == "__main__":
+    main()
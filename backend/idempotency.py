@@ -0,0 +1,299 @@
+"""``Idempotency-Key`` support for ``POST /api/orders``.
+
+A key is claimed before the order is built. A concurrent request with the same
+key waits for the first one's result instead of running its own transaction,
+and a later one gets the stored response without reading the order tables.
+Keys are scoped to the order's restaurant. Results live in a bounded
+in-memory TTL store (or Redis, shared by every worker) and in
+``idempotency_keys``, written in the order's transaction. Its unique
+``(restaurant_id, key)`` is the backstop when two workers race on the same key.
+"""
+import asyncio
+import hashlib
+import logging
+import os
+import time
+import uuid
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable
+
+from fastapi import HTTPException, Request
+from sqlalchemy import delete, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from cache import FakeRedis
+from database import SessionLocal
+from metrics import Counter, registry
+from models import IdempotencyKey
+from serializers import dumps, loads
+
+logger = logging.getLogger(__name__)
+
+# memory: per-worker store; redis: shared store with a cross-worker claim;
+# fake: Redis code path on FakeRedis; off: the header is ignored.
+IDEMPOTENCY_BACKEND = os.getenv("IDEMPOTENCY_BACKEND", "memory").lower()
+IDEMPOTENCY_PREFIX = os.getenv("IDEMPOTENCY_PREFIX", "idempotency")
+IDEMPOTENCY_TTL_SECONDS = float(os.getenv("IDEMPOTENCY_TTL_SECONDS", "86400"))
+IDEMPOTENCY_MAX_KEYS = int(os.getenv("IDEMPOTENCY_MAX_KEYS", "10000"))
+# How long a duplicate waits for the request that holds the key before a 409.
+IDEMPOTENCY_WAIT_SECONDS = float(os.getenv("IDEMPOTENCY_WAIT_SECONDS", "10"))
+IDEMPOTENCY_POLL_MS = float(os.getenv("IDEMPOTENCY_POLL_MS", "25"))
+IDEMPOTENCY_KEY_MAX_LENGTH = 255
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+
+idempotent_requests = registry.register(
+    Counter("idempotent_requests_total", "Requests carrying an Idempotency-Key by outcome.", ["result"])
+)
+
+
+class IdempotencyInProgress(Exception):
+    """A duplicate gave up waiting for the request holding its key; answered 409 by ``main``."""
+
+    code = "idempotency_in_progress"
+    detail = "A request with this Idempotency-Key is still in progress"
+
+
+def request_key(request: Request) -> str | None:
+    key = request.headers.get("idempotency-key")
+    if key is None:
+        return None
+    key = key.strip()
+    if not key or len(key) > IDEMPOTENCY_KEY_MAX_LENGTH:
+        raise HTTPException(
+            status_code=400, detail=f"Idempotency-Key must be 1-{IDEMPOTENCY_KEY_MAX_LENGTH} characters"
+        )
+    return key
+
+
+def fingerprint(payload: dict) -> str:
+    return hashlib.sha256(dumps(payload)).hexdigest()
+
+
+def encode_response(response: dict) -> dict:
+    """JSON-safe copy of ``response`` for the ``idempotency_keys.response`` column."""
+    return loads(dumps(response))
+
+
+def expire_keys(db: Session, before: datetime) -> int:
+    result = db.execute(delete(IdempotencyKey).where(IdempotencyKey.created_at < before))
+    db.commit()
+    return result.rowcount
+
+
+class IdempotencyStore:
+    """Runs ``create`` at most once per ``(restaurant_id, key)`` and remembers its response.
+
+    ``run`` looks in the local store, then Redis, then ``idempotency_keys``. A
+    key being worked on in this worker has a future that duplicates await;
+    with Redis, a ``SET NX`` claim makes duplicates on other workers poll for
+    the stored result. If ``create`` loses a race on the unique key anyway, the
+    winner's row is returned. Redis errors fall back to the local store. Redis
+    and database calls run in threads, off the event loop.
+    """
+
+    def __init__(
+        self,
+        client=None,
+        prefix: str = IDEMPOTENCY_PREFIX,
+        ttl: float = IDEMPOTENCY_TTL_SECONDS,
+        max_keys: int = IDEMPOTENCY_MAX_KEYS,
+        wait_seconds: float = IDEMPOTENCY_WAIT_SECONDS,
+        poll_ms: float = IDEMPOTENCY_POLL_MS,
+        session_factory: Callable[[], Session] = SessionLocal,
+        enabled: bool = True,
+    ) -> None:
+        self.client = client
+        self.prefix = prefix
+        self.ttl = ttl
+        self.max_keys = max_keys
+        self.wait_seconds = wait_seconds
+        self.poll = poll_ms / 1000
+        self.session_factory = session_factory
+        self.enabled = enabled
+        self._entries: OrderedDict[str, tuple[str, dict, float]] = OrderedDict()
+        self._flights: dict[str, asyncio.Future] = {}
+
+    def _key(self, name: str) -> str:
+        return f"{self.prefix}:{name}"
+
+    # local
+
+    def _local_get(self, name: str) -> tuple[str, dict] | None:
+        entry = self._entries.get(name)
+        if entry is None:
+            return None
+        if entry[2] <= time.monotonic():
+            del self._entries[name]
+            return None
+        self._entries.move_to_end(name)
+        return entry[0], entry[1]
+
+    def _local_set(self, name: str, request_hash: str, response: dict) -> None:
+        self._entries[name] = (request_hash, response, time.monotonic() + self.ttl)
+        self._entries.move_to_end(name)
+        while len(self._entries) > self.max_keys:
+            self._entries.popitem(last=False)
+
+    # redis
+
+    def _remote_get(self, name: str) -> tuple[str, dict] | None:
+        raw = self.client.get(self._key(name))
+        if raw is None:
+            return None
+        envelope = loads(raw)
+        return envelope["h"], envelope["r"]
+
+    def _remote_set(self, name: str, request_hash: str, response: dict) -> None:
+        self.client.set(self._key(name), dumps({"h": request_hash, "r": response}), px=max(1, int(self.ttl * 1000)))
+
+    def _claim(self, name: str) -> str | None:
+        token = uuid.uuid4().hex
+        if self.client.set(f"{self._key(name)}:lock", token, px=int(self.wait_seconds * 1000), nx=True):
+            return token
+        return None
+
+    def _release(self, name: str, token: str) -> None:
+        current = self.client.get(f"{self._key(name)}:lock")
+        if current is not None and (current.decode("utf-8") if isinstance(current, bytes) else current) == token:
+            self.client.delete(f"{self._key(name)}:lock")
+
+    # database
+
+    def _db_get(self, restaurant_id: int, key: str) -> tuple[str, dict] | None:
+        db = self.session_factory()
+        try:
+            row = db.execute(
+                select(IdempotencyKey.request_hash, IdempotencyKey.response)
+                .where(IdempotencyKey.restaurant_id == restaurant_id)
+                .where(IdempotencyKey.key == key)
+            ).first()
+        finally:
+            db.close()
+        return (row[0], row[1]) if row is not None else None
+
+    async def _remember(self, name: str, request_hash: str, response: dict) -> None:
+        self._local_set(name, request_hash, response)
+        if self.client is not None:
+            try:
+                await asyncio.to_thread(self._remote_set, name, request_hash, response)
+            except Exception:
+                logger.warning("idempotency backend unavailable, keeping %s locally", name, exc_info=True)
+
+    async def _find(self, restaurant_id: int, key: str, name: str) -> tuple[str, dict] | None:
+        found = self._local_get(name)
+        if found is not None:
+            return found
+        if self.client is not None:
+            try:
+                found = await asyncio.to_thread(self._remote_get, name)
+            except Exception:
+                logger.warning("idempotency backend unavailable", exc_info=True)
+            if found is not None:
+                self._local_set(name, *found)
+                return found
+        found = await asyncio.to_thread(self._db_get, restaurant_id, key)
+        if found is not None:
+            await self._remember(name, *found)
+        return found
+
+    def _replay(self, found: tuple[str, dict], request_hash: str, result: str) -> tuple[dict, bool]:
+        if found[0] != request_hash:
+            idempotent_requests.inc(result="mismatch")
+            raise HTTPException(status_code=422, detail="Idempotency-Key was already used with a different request")
+        idempotent_requests.inc(result=result)
+        return found[1], True
+
+    def _in_progress(self) -> IdempotencyInProgress:
+        idempotent_requests.inc(result="in_progress")
+        return IdempotencyInProgress()
+
+    async def _wait_remote(self, name: str) -> tuple[str, dict] | None:
+        deadline = time.monotonic() + self.wait_seconds
+        while time.monotonic() < deadline:
+            await asyncio.sleep(self.poll)
+            found = await asyncio.to_thread(self._remote_get, name)
+            if found is not None:
+                return found
+        return None
+
+    # public API
+
+    async def run(
+        self, restaurant_id: int, key: str, request_hash: str, create: Callable[[], Awaitable[dict]]
+    ) -> tuple[dict, bool]:
+        """Return ``(response, replayed)``; ``create`` runs only if the restaurant has not seen ``key``."""
+        name = f"{restaurant_id}:{key}"
+        found = await self._find(restaurant_id, key, name)
+        if found is not None:
+            return self._replay(found, request_hash, "replayed")
+
+        flight = self._flights.get(name)
+        if flight is not None:
+            try:
+                found = await asyncio.wait_for(asyncio.shield(flight), self.wait_seconds)
+            except asyncio.TimeoutError:
+                raise self._in_progress() from None
+            return self._replay(found, request_hash, "waited")
+
+        flight = asyncio.get_running_loop().create_future()
+        self._flights[name] = flight
+        token = None
+        try:
+            if self.client is not None:
+                try:
+                    token = await asyncio.to_thread(self._claim, name)
+                    if token is None:
+                        found = await self._wait_remote(name)
+                        if found is None:
+                            raise self._in_progress()
+                except IdempotencyInProgress:
+                    raise
+                except Exception:
+                    logger.warning("idempotency backend unavailable, relying on the database", exc_info=True)
+                if found is not None:
+                    self._local_set(name, *found)
+                    flight.set_result(found)
+                    return self._replay(found, request_hash, "waited")
+
+            try:
+                response = await create()
+            except IntegrityError:
+                # Another worker committed the same key between _find and our insert.
+                found = await asyncio.to_thread(self._db_get, restaurant_id, key)
+                if found is None:
+                    raise
+                await self._remember(name, *found)
+                flight.set_result(found)
+                return self._replay(found, request_hash, "replayed")
+            await self._remember(name, request_hash, response)
+            flight.set_result((request_hash, response))
+            idempotent_requests.inc(result="created")
+            return response, False
+        except BaseException as exc:
+            if not flight.done():
+                flight.set_exception(exc)
+                # Mark it retrieved; duplicates that were waiting re-raise it.
+                flight.exception()
+            raise
+        finally:
+            self._flights.pop(name, None)
+            if token is not None:
+                try:
+                    await asyncio.to_thread(self._release, name, token)
+                except Exception:
+                    logger.warning("could not release idempotency claim %s", name, exc_info=True)
+
+
+def _build_client():
+    if IDEMPOTENCY_BACKEND == "redis":
+        import redis
+
+        return redis.Redis.from_url(REDIS_URL, socket_timeout=0.1)
+    if IDEMPOTENCY_BACKEND == "fake":
+        return FakeRedis()
+    return None
+
+
+idempotency = IdempotencyStore(client=_build_client(), enabled=IDEMPOTENCY_BACKEND != "off")
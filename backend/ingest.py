@@ -0,0 +1,162 @@
+import asyncio
+import os
+import time
+from typing import Callable
+
+from sqlalchemy.orm import Session, selectinload
+
+from database import SessionLocal
+from idempotency import encode_response
+from kitchen import order_to_dict
+from metrics import register_gauge
+from models import Order, OrderItem
+from outbox import enqueue
+from tabs import add_order, tab_for_order
+
+ORDER_INGEST_MODE = os.getenv("ORDER_INGEST_MODE", "direct").lower()
+ORDER_INGEST_BATCH_SIZE = int(os.getenv("ORDER_INGEST_BATCH_SIZE", "32"))
+ORDER_INGEST_MAX_DELAY_MS = float(os.getenv("ORDER_INGEST_MAX_DELAY_MS", "10"))
+ORDER_INGEST_QUEUE_SIZE = int(os.getenv("ORDER_INGEST_QUEUE_SIZE", "2000"))
+
+
+def persist_order(db: Session, order: Order) -> None:
+    tab = tab_for_order(db, order)
+    # Read while the order is transient: once flushed, an unset relationship would lazy-load.
+    idempotency_key = order.idempotency_key
+    db.add(order)
+    db.flush()
+    if tab is not None:
+        add_order(db, tab, order)
+    if idempotency_key is not None:
+        idempotency_key.response = encode_response(order_to_dict(order))
+    enqueue(db, "order_created", {"type": "order_created", "order_id": order.id})
+
+
+class OrderIngestQueue:
+    """Group-commit writer for new orders.
+
+    Callers submit validated, unsaved ``Order`` objects and await their own
+    result while a single writer task drains the queue and commits up to
+    ``batch_size`` orders per transaction. Each order is written inside a
+    savepoint so one failing order does not sink the rest of its batch.
+    """
+
+    def __init__(
+        self,
+        batch_size: int = ORDER_INGEST_BATCH_SIZE,
+        max_delay_ms: float = ORDER_INGEST_MAX_DELAY_MS,
+        maxsize: int = ORDER_INGEST_QUEUE_SIZE,
+        persist: Callable[[Session, Order], None] = persist_order,
+        session_factory: Callable[[], Session] = SessionLocal,
+    ) -> None:
+        self.batch_size = max(1, batch_size)
+        self.max_delay = max(0.0, max_delay_ms) / 1000
+        self.maxsize = maxsize
+        self.persist = persist
+        self.session_factory = session_factory
+        self.batches = 0
+        self.committed = 0
+        self._queue: asyncio.Queue | None = None
+        self._task: asyncio.Task | None = None
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def start(self) -> None:
+        if self.running:
+            return
+        self._queue = asyncio.Queue(maxsize=self.maxsize)
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if not self.running:
+            return
+        await self._queue.put(None)
+        await self._task
+        self._task = None
+
+    async def submit(self, order: Order) -> Order:
+        if not self.running:
+            raise RuntimeError("Order ingest queue is not running")
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((order, future))
+        return await future
+
+    async def _collect(self) -> tuple[list, bool]:
+        first = await self._queue.get()
+        if first is None:
+            return [], True
+        batch = [first]
+        deadline = time.monotonic() + self.max_delay
+        while len(batch) < self.batch_size:
+            timeout = deadline - time.monotonic()
+            try:
+                entry = self._queue.get_nowait() if timeout <= 0 else await asyncio.wait_for(
+                    self._queue.get(), timeout
+                )
+            except (asyncio.QueueEmpty, asyncio.TimeoutError):
+                break
+            if entry is None:
+                return batch, True
+            batch.append(entry)
+        return batch, False
+
+    async def _run(self) -> None:
+        stopping = False
+        while not stopping:
+            batch, stopping = await self._collect()
+            if not batch:
+                continue
+            orders = [order for order, _ in batch]
+            try:
+                results = await asyncio.to_thread(self._write_batch, orders)
+            except Exception as exc:
+                results = [exc] * len(batch)
+            for (_, future), result in zip(batch, results):
+                if future.done():
+                    continue
+                if isinstance(result, BaseException):
+                    future.set_exception(result)
+                else:
+                    future.set_result(result)
+
+    def _write_batch(self, orders: list[Order]) -> list:
+        db = self.session_factory()
+        try:
+            results: list = []
+            for order in orders:
+                savepoint = db.begin_nested()
+                try:
+                    self.persist(db, order)
+                    db.flush()
+                    savepoint.commit()
+                    results.append(order.id)
+                except Exception as exc:
+                    savepoint.rollback()
+                    results.append(exc)
+            db.commit()
+            self.batches += 1
+
+            ids = [result for result in results if isinstance(result, int)]
+            self.committed += len(ids)
+            loaded = {
+                order.id: order
+                for order in db.query(Order)
+                .options(selectinload(Order.items).selectinload(OrderItem.menu_item))
+                .filter(Order.id.in_(ids))
+                .all()
+            }
+            return [loaded.get(result, result) if isinstance(result, int) else result for result in results]
+        finally:
+            db.close()
+
+
+order_ingest = OrderIngestQueue()
+
+register_gauge(
+    "order_ingest_queue_depth",
+    "Orders waiting for the group-commit writer.",
+    [],
+    lambda: [({}, order_ingest._queue.qsize() if order_ingest.running else 0)],
+)
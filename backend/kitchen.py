@@ -0,0 +1,174 @@
+import os
+import threading
+import time
+from typing import Callable
+
+from metrics import register_gauge
+from models import Order
+from money import format_cents
+from serializers import dumps
+
+ACTIVE_STATUSES = ("pending", "in_progress", "ready")
+KITCHEN_BOARD_RETAIN_SECONDS = float(os.getenv("KITCHEN_BOARD_RETAIN_SECONDS", "60"))
+# Each worker keeps its own board; with several workers a periodic rebuild
+# bounds how long another worker's updates can be missing. 0 never rebuilds.
+KITCHEN_BOARD_MAX_AGE_SECONDS = float(os.getenv("KITCHEN_BOARD_MAX_AGE_SECONDS", "60"))
+
+
+def order_to_dict(order: Order) -> dict:
+    """Shape a loaded ``Order`` like ``routes.orders.order_rows`` does."""
+    return {
+        "id": order.id,
+        "status": order.status,
+        "table_id": order.table_id,
+        "restaurant_id": order.restaurant_id,
+        "notes": order.notes,
+        "subtotal_cents": order.subtotal_cents,
+        "subtotal": format_cents(order.subtotal_cents),
+        "item_count": order.item_count,
+        "line_count": order.line_count,
+        "created_at": order.created_at,
+        "updated_at": order.updated_at,
+        "items": [
+            {
+                "id": item.id,
+                "menu_item_id": item.menu_item_id,
+                "quantity": item.quantity,
+                "unit_price_cents": item.unit_price_cents,
+                "unit_price": format_cents(item.unit_price_cents),
+                "special_instructions": item.special_instructions,
+                "menu_item": (
+                    {"id": item.menu_item.id, "name": item.menu_item.name} if item.menu_item is not None else None
+                ),
+            }
+            for item in sorted(order.items, key=lambda item: item.id)
+        ],
+    }
+
+
+class Board:
+    def __init__(self) -> None:
+        self.orders: dict[int, dict] = {}
+        self.finished_at: dict[int, float] = {}
+        self.loaded_at: float | None = None
+        self.loading = False
+        self.load_lock = threading.Lock()
+        self.buffered: list[dict] = []
+        self.encoded: bytes | None = None
+
+
+class KitchenBoard:
+    """Per-restaurant live board of active orders, kept in process memory.
+
+    Loaded from the database on first access, then updated incrementally by
+    ``apply`` as orders are created or change status. Completed and cancelled
+    orders stay on the board for ``retain_seconds`` and then drop off.
+    Updates are versioned by ``updated_at`` so a stale write never
+    overwrites a newer one.
+    """
+
+    def __init__(
+        self,
+        retain_seconds: float = KITCHEN_BOARD_RETAIN_SECONDS,
+        max_age_seconds: float = KITCHEN_BOARD_MAX_AGE_SECONDS,
+    ) -> None:
+        self.retain_seconds = retain_seconds
+        self.max_age_seconds = max_age_seconds
+        self._boards: dict[int, Board] = {}
+        self._lock = threading.Lock()
+
+    def _board(self, restaurant_id: int) -> Board:
+        board = self._boards.get(restaurant_id)
+        if board is None:
+            board = self._boards.setdefault(restaurant_id, Board())
+        return board
+
+    def _upsert(self, board: Board, order: dict) -> None:
+        current = board.orders.get(order["id"])
+        if current is not None and current["updated_at"] > order["updated_at"]:
+            return
+        board.orders[order["id"]] = order
+        if order["status"] in ACTIVE_STATUSES:
+            board.finished_at.pop(order["id"], None)
+        else:
+            board.finished_at.setdefault(order["id"], time.monotonic())
+        board.encoded = None
+
+    def _prune(self, board: Board) -> None:
+        cutoff = time.monotonic() - self.retain_seconds
+        for order_id in [order_id for order_id, at in board.finished_at.items() if at <= cutoff]:
+            del board.finished_at[order_id]
+            board.orders.pop(order_id, None)
+            board.encoded = None
+
+    def apply(self, order: dict) -> None:
+        with self._lock:
+            board = self._board(order["restaurant_id"])
+            if board.loading:
+                board.buffered.append(order)
+            elif board.loaded_at is not None:
+                self._upsert(board, order)
+
+    def _needs_load(self, board: Board) -> bool:
+        if board.loaded_at is None:
+            return True
+        return self.max_age_seconds > 0 and time.monotonic() - board.loaded_at > self.max_age_seconds
+
+    def _load(self, board: Board, restaurant_id: int, loader: Callable[[int], list[dict]]) -> None:
+        with self._lock:
+            board.loading = True
+            board.buffered = []
+        try:
+            orders = loader(restaurant_id)
+        except Exception:
+            with self._lock:
+                board.loading = False
+            raise
+        with self._lock:
+            finished = [(board.orders[order_id], at) for order_id, at in board.finished_at.items()]
+            board.orders = {}
+            board.finished_at = {}
+            for order, at in finished:
+                board.orders[order["id"]] = order
+                board.finished_at[order["id"]] = at
+            for order in orders + board.buffered:
+                self._upsert(board, order)
+            board.buffered = []
+            board.loading = False
+            board.loaded_at = time.monotonic()
+            board.encoded = None
+
+    def snapshot(self, restaurant_id: int, loader: Callable[[int], list[dict]]) -> bytes:
+        """Encoded board for ``restaurant_id``; ``loader`` runs only to (re)build it."""
+        with self._lock:
+            board = self._board(restaurant_id)
+        if self._needs_load(board):
+            with board.load_lock:
+                if self._needs_load(board):
+                    self._load(board, restaurant_id, loader)
+        with self._lock:
+            self._prune(board)
+            if board.encoded is None:
+                # Newest first, like GET /api/orders/ that the kitchen pages read before.
+                board.encoded = dumps([board.orders[order_id] for order_id in sorted(board.orders, reverse=True)])
+            return board.encoded
+
+    def forget(self, restaurant_id: int | None = None) -> None:
+        with self._lock:
+            if restaurant_id is None:
+                self._boards.clear()
+            else:
+                self._boards.pop(restaurant_id, None)
+
+    def __len__(self) -> int:
+        return sum(len(board.orders) for board in self._boards.values())
+
+
+kitchen_board = KitchenBoard()
+
+register_gauge(
+    "kitchen_board_orders",
+    "Orders held on in-memory kitchen boards across restaurants.",
+    [],
+    lambda: [({}, len(kitchen_board))],
+)
@@ -1,13 +1,35 @@
-from fastapi import FastAPI, WebSocket, WebSocketDisconnect
+import hmac
+import time
+
+_import_started = time.perf_counter()
+
+from fastapi import FastAPI, Header, HTTPException, WebSocket
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, PlainTextResponse
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
 
 import os
-from database import Base, engine
-from routes import menu, orders, analytics, recommendations, tables, auth
-from ws import manager
+from archive import archive_job
+from database import replicas
+from edge import EdgeMiddleware
+from forecast import forecast_job
+from idempotency import IdempotencyInProgress
+from ingest import ORDER_INGEST_MODE, order_ingest
+from metrics import MetricsMiddleware, registry
+from outbox import outbox
+from profiler import ProfilerMiddleware
+from prep_stats import prep_stats
+from ratelimit import AdmissionControlMiddleware
+from routes import menu, orders, analytics, recommendations, tables, auth, diagnostics
+from startup import run_startup, state as startup_state, timings as startup_timings
+from ws import manager, menu_channel
+
+startup_timings["import"] = round(time.perf_counter() - _import_started, 4)
 
 app = FastAPI(title="Restaurant QR Order")
 
+METRICS_TOKEN = os.getenv("METRICS_TOKEN")
+
 cors_origins = os.getenv("CORS_ORIGINS", "*")
 allow_origins = [origin.strip() for origin in cors_origins.split(",")] if cors_origins else ["*"]
 allow_origin_regex = os.getenv("CORS_ORIGIN_REGEX")
@@ -15,6 +37,9 @@ allow_credentials = True
 if "*" in allow_origins:
     allow_credentials = False
 
+app.add_middleware(AdmissionControlMiddleware)
+app.add_middleware(EdgeMiddleware)
+app.add_middleware(MetricsMiddleware)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=allow_origins,
@@ -23,12 +48,52 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+# Outermost, so a profile covers every other middleware too.
+app.add_middleware(ProfilerMiddleware)
+
+
+@app.exception_handler(PoolTimeoutError)
+def pool_exhausted(request, exc: PoolTimeoutError) -> JSONResponse:
+    # A saturated bulkhead sheds its own traffic instead of surfacing a 500.
+    return JSONResponse({"detail": "Database busy, retry shortly"}, status_code=503, headers={"Retry-After": "1"})
+
+
+@app.exception_handler(IdempotencyInProgress)
+def idempotency_in_progress(request, exc: IdempotencyInProgress) -> JSONResponse:
+    # ``code`` tells clients this 409 is worth retrying, unlike an unavailable item.
+    return JSONResponse(
+        {"detail": exc.detail, "code": exc.code}, status_code=409, headers={"Retry-After": "1"}
+    )
 
 
 @app.on_event("startup")
 def on_startup() -> None:
-    if os.getenv("AUTO_CREATE_DB", "true").lower() == "true":
-        Base.metadata.create_all(bind=engine)
+    run_startup()
+
+
+@app.on_event("startup")
+async def start_background_tasks() -> None:
+    if ORDER_INGEST_MODE == "queue":
+        order_ingest.start()
+    replicas.start_health_checks()
+    manager.start()
+    menu_channel.start()
+    archive_job.start()
+    prep_stats.start()
+    outbox.start()
+    forecast_job.start()
+
+
+@app.on_event("shutdown")
+async def stop_background_tasks() -> None:
+    await order_ingest.stop()
+    await replicas.stop_health_checks()
+    await manager.stop()
+    await menu_channel.stop()
+    await archive_job.stop()
+    await prep_stats.stop()
+    await outbox.stop()
+    await forecast_job.stop()
 
 
 @app.get("/")
@@ -36,19 +101,38 @@ def root() -> dict:
     return {"status": "ok", "service": "restaurant-qr-order"}
 
 
+@app.get("/health/ready", include_in_schema=False)
+def ready() -> JSONResponse:
+    status_code = 200 if startup_state["ready"] else 503
+    return JSONResponse({"ready": startup_state["ready"], "timings": startup_timings}, status_code=status_code)
+
+
+@app.get("/metrics", include_in_schema=False)
+def metrics(authorization: str | None = Header(default=None)) -> PlainTextResponse:
+    # Routes, SQL and pool internals: closed unless a scrape token is configured.
+    if not METRICS_TOKEN:
+        raise HTTPException(status_code=404, detail="Metrics are not configured")
+    if not hmac.compare_digest((authorization or "").encode(), f"Bearer {METRICS_TOKEN}".encode()):
+        raise HTTPException(status_code=401, detail="Invalid metrics token")
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
+
+
 app.include_router(menu.router, prefix="/api")
 app.include_router(orders.router, prefix="/api")
 app.include_router(analytics.router, prefix="/api")
 app.include_router(recommendations.router, prefix="/api")
 app.include_router(tables.router, prefix="/api")
 app.include_router(auth.router, prefix="/api")
+app.include_router(diagnostics.router, prefix="/api")
 
 
 @app.websocket("/ws/orders")
 async def orders_ws(websocket: WebSocket) -> None:
-    await manager.connect(websocket)
-    try:
-        while True:
-            await websocket.receive_text()
-    except WebSocketDisconnect:
-        manager.disconnect(websocket)
+    if await manager.connect(websocket):
+        await manager.listen(websocket)
+
+
+@app.websocket("/ws/menu/{restaurant_id}")
+async def menu_ws(websocket: WebSocket, restaurant_id: int) -> None:
+    if await menu_channel.connect(restaurant_id, websocket):
+        await menu_channel.listen(restaurant_id, websocket)
@@ -0,0 +1,313 @@
+import threading
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+from dataclasses import dataclass
+from typing import Callable, Iterable
+
+from sqlalchemy import event
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 100)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labelnames: tuple[str, ...], values: tuple, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(labelnames, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: dict) -> tuple:
+        return tuple(labels.get(name, "") for name in self.labelnames)
+
+    def header(self) -> list[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self._values: dict[tuple, float] = {}
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self) -> list[str]:
+        with self._lock:
+            values = list(self._values.items())
+        return self.header() + [
+            f"{self.name}{_format_labels(self.labelnames, key)} {value}" for key, value in values
+        ]
+
+
+class Gauge(_Metric):
+    """A settable gauge, or a callback gauge when ``collect`` is given.
+
+    ``collect`` returns ``(labels_dict, value)`` pairs and is evaluated at
+    scrape time, so hot paths never touch the gauge.
+    """
+
+    kind = "gauge"
+
+    def __init__(self, *args, collect: Callable[[], Iterable[tuple[dict, float]]] | None = None, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self.collect = collect
+        self._values: dict[tuple, float] = {}
+
+    def set(self, value: float, **labels) -> None:
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels) -> None:
+        self.inc(-amount, **labels)
+
+    def render(self) -> list[str]:
+        if self.collect is not None:
+            values = [(self._key(labels), value) for labels, value in self.collect()]
+        else:
+            with self._lock:
+                values = list(self._values.items())
+        return self.header() + [
+            f"{self.name}{_format_labels(self.labelnames, key)} {value}" for key, value in values
+        ]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, *args, buckets: tuple = LATENCY_BUCKETS, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self.buckets = tuple(sorted(buckets))
+        self._values: dict[tuple, list] = {}
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._values.get(key)
+            if series is None:
+                series = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self) -> list[str]:
+        with self._lock:
+            values = [(key, list(counts), total, count) for key, (counts, total, count) in self._values.items()]
+        lines = self.header()
+        for key, counts, total, count in values:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                le = 'le="+Inf"' if bound == float("inf") else f'le="{bound}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {total}")
+            lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+
+class Registry:
+    def __init__(self) -> None:
+        self.metrics: list[_Metric] = []
+
+    def register(self, metric: _Metric) -> _Metric:
+        self.metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines: list[str] = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+http_requests = registry.register(
+    Counter("http_requests_total", "HTTP requests by route template and status.", ["method", "route", "status"])
+)
+http_latency = registry.register(
+    Histogram("http_request_duration_seconds", "HTTP request latency by route template.", ["method", "route"])
+)
+db_statements_per_request = registry.register(
+    Histogram(
+        "http_request_db_statements",
+        "SQL statements executed per HTTP request.",
+        ["route"],
+        buckets=COUNT_BUCKETS,
+    )
+)
+db_time_per_request = registry.register(
+    Histogram("http_request_db_seconds", "Time spent in SQL per HTTP request.", ["route"])
+)
+sql_latency = registry.register(
+    Histogram("db_statement_duration_seconds", "SQL statement execution time.", ["pool"])
+)
+pool_checkout_wait = registry.register(
+    Histogram("db_pool_checkout_wait_seconds", "Time spent waiting for a pooled connection.", ["pool"])
+)
+pool_checkout_errors = registry.register(
+    Counter("db_pool_checkout_errors_total", "Failed connection checkouts, including pool timeouts.", ["pool"])
+)
+ws_broadcast_latency = registry.register(
+    Histogram("ws_broadcast_duration_seconds", "Time to fan one event out to every socket.", ["channel"])
+)
+ws_broadcast_fanout = registry.register(
+    Histogram(
+        "ws_broadcast_recipients",
+        "Sockets addressed per broadcast.",
+        ["channel"],
+        buckets=(0, 1, 2, 5, 10, 25, 50, 100, 250, 500, 1000),
+    )
+)
+bcrypt_latency = registry.register(
+    Histogram("bcrypt_duration_seconds", "Password hashing and verification time.", ["operation"])
+)
+
+_pools: dict[str, object] = {}
+
+
+def _pool_stats() -> Iterable[tuple[dict, float]]:
+    for name, pool in list(_pools.items()):
+        size = getattr(pool, "size", None)
+        if not callable(size):
+            continue
+        yield {"pool": name, "state": "checked_out"}, pool.checkedout()
+        yield {"pool": name, "state": "idle"}, pool.checkedin()
+        yield {"pool": name, "state": "overflow"}, max(pool.overflow(), 0)
+        yield {"pool": name, "state": "capacity"}, pool.size() + max(getattr(pool, "_max_overflow", 0), 0)
+
+
+registry.register(
+    Gauge(
+        "db_pool_connections",
+        "Pool connections by state; saturation is checked_out / capacity.",
+        ["pool", "state"],
+        collect=_pool_stats,
+    )
+)
+
+
+@dataclass
+class RequestStats:
+    scope: dict
+    sql_statements: int = 0
+    sql_seconds: float = 0.0
+
+    @property
+    def route(self) -> str:
+        route = self.scope.get("route")
+        return getattr(route, "path", None) or "unmatched"
+
+
+current_request: ContextVar[RequestStats | None] = ContextVar("current_request", default=None)
+
+
+def instrument_engine(engine, pool_name: str = "primary") -> None:
+    """Record statement timings and pool checkout wait for ``engine``."""
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info["query_start"].pop()
+        sql_latency.observe(elapsed, pool=pool_name)
+        stats = current_request.get()
+        if stats is not None:
+            stats.sql_statements += 1
+            stats.sql_seconds += elapsed
+
+    pool = engine.pool
+    _pools[pool_name] = pool
+    connect = pool.connect
+
+    def timed_connect():
+        started = time.perf_counter()
+        try:
+            return connect()
+        except Exception:
+            pool_checkout_errors.inc(pool=pool_name)
+            raise
+        finally:
+            pool_checkout_wait.observe(time.perf_counter() - started, pool=pool_name)
+
+    pool.connect = timed_connect
+
+
+def register_gauge(name: str, documentation: str, labelnames: Iterable[str], collect) -> Gauge:
+    return registry.register(Gauge(name, documentation, labelnames, collect=collect))
+
+
+class timed:
+    """Context manager observing elapsed seconds into ``histogram``."""
+
+    __slots__ = ("histogram", "labels", "started")
+
+    def __init__(self, histogram: Histogram, **labels) -> None:
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self) -> "timed":
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.histogram.observe(time.perf_counter() - self.started, **self.labels)
+
+
+class MetricsMiddleware:
+    def __init__(self, app) -> None:
+        self.app = app
+
+    async def __call__(self, scope, receive, send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestStats(scope)
+        token = current_request.set(stats)
+        status_holder = {"status": 500}
+
+        async def send_wrapper(message) -> None:
+            if message["type"] == "http.response.start":
+                status_holder["status"] = message["status"]
+            await send(message)
+
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - started
+            route = stats.route
+            method = scope["method"]
+            http_requests.inc(method=method, route=route, status=status_holder["status"])
+            http_latency.observe(elapsed, method=method, route=route)
+            db_statements_per_request.observe(stats.sql_statements, route=route)
+            db_time_per_request.observe(stats.sql_seconds, route=route)
+            current_request.reset(token)
@@ -1,5 +1,7 @@
 from datetime import datetime
-from sqlalchemy import Column, Integer, String, Text, Boolean, DateTime, ForeignKey, Numeric
+from sqlalchemy import (
+    BigInteger, Column, Integer, String, Text, Boolean, DateTime, Float, ForeignKey, Index, JSON, text
+)
 from sqlalchemy.orm import relationship
 
 from database import Base
@@ -11,6 +13,8 @@ class Restaurant(Base):
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String(120), nullable=False)
     city = Column(String(80), nullable=True)
+    # Bumped by every menu mutation; menu rows record the version that last touched them.
+    menu_version = Column(BigInteger, nullable=False, default=0, server_default="0")
     created_at = Column(DateTime, default=datetime.utcnow)
 
     users = relationship("User", back_populates="restaurant")
@@ -36,11 +40,13 @@ class User(Base):
 
 class MenuCategory(Base):
     __tablename__ = "menu_categories"
+    __table_args__ = (Index("ix_menu_categories_restaurant_version", "restaurant_id", "version"),)
 
     id = Column(Integer, primary_key=True, index=True)
     restaurant_id = Column(Integer, ForeignKey("restaurants.id"))
     name = Column(String(80), nullable=False)
     sort_order = Column(Integer, default=0)
+    version = Column(BigInteger, nullable=False, default=0, server_default="0")
 
     restaurant = relationship("Restaurant", back_populates="categories")
     items = relationship("MenuItem", back_populates="category")
@@ -48,21 +54,36 @@ class MenuCategory(Base):
 
 class MenuItem(Base):
     __tablename__ = "menu_items"
+    __table_args__ = (Index("ix_menu_items_restaurant_version", "restaurant_id", "version"),)
 
     id = Column(Integer, primary_key=True, index=True)
     restaurant_id = Column(Integer, ForeignKey("restaurants.id"))
     category_id = Column(Integer, ForeignKey("menu_categories.id"), nullable=True)
     name = Column(String(120), nullable=False)
     description = Column(Text, nullable=True)
-    price = Column(Numeric(10, 2), nullable=False)
+    price_cents = Column(Integer, nullable=False)
     is_available = Column(Boolean, default=True)
     diet_tag = Column(String(24), nullable=True)
+    version = Column(BigInteger, nullable=False, default=0, server_default="0")
 
     restaurant = relationship("Restaurant", back_populates="items")
     category = relationship("MenuCategory", back_populates="items")
     order_items = relationship("OrderItem", back_populates="menu_item")
 
 
+class MenuTombstone(Base):
+    """Deleted menu items and categories, so ``/api/menu/changes`` can report removals."""
+
+    __tablename__ = "menu_tombstones"
+    __table_args__ = (Index("ix_menu_tombstones_restaurant_version", "restaurant_id", "version"),)
+
+    id = Column(Integer, primary_key=True)
+    restaurant_id = Column(Integer, ForeignKey("restaurants.id"), nullable=False)
+    kind = Column(String(16), nullable=False)
+    entity_id = Column(Integer, nullable=False)
+    version = Column(BigInteger, nullable=False)
+
+
 class Table(Base):
     __tablename__ = "tables"
 
@@ -76,31 +97,193 @@ class Table(Base):
     orders = relationship("Order", back_populates="table")
 
 
+class TableTab(Base):
+    """A table's running bill. Each table has at most one ``open`` tab until it is settled."""
+
+    __tablename__ = "table_tabs"
+    __table_args__ = (
+        Index(
+            "ix_table_tabs_open_table",
+            "table_id",
+            unique=True,
+            postgresql_where=text("status = 'open'"),
+            sqlite_where=text("status = 'open'"),
+        ),
+        Index("ix_table_tabs_restaurant_status", "restaurant_id", "status"),
+    )
+
+    id = Column(Integer, primary_key=True)
+    restaurant_id = Column(Integer, ForeignKey("restaurants.id"), nullable=False)
+    table_id = Column(Integer, ForeignKey("tables.id"), nullable=False)
+    status = Column(String(16), nullable=False, default="open")
+    total_cents = Column(Integer, nullable=False, default=0)
+    item_count = Column(Integer, nullable=False, default=0)
+    # Order ids and per-menu-item lines, kept in step with the orders so reads need no joins.
+    order_ids = Column(JSON, nullable=False, default=list)
+    items = Column(JSON, nullable=False, default=list)
+    opened_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow)
+    closed_at = Column(DateTime, nullable=True)
+
+
 class Order(Base):
     __tablename__ = "orders"
+    __table_args__ = (
+        Index("ix_orders_restaurant_created", "restaurant_id", "created_at"),
+        Index("ix_orders_restaurant_status", "restaurant_id", "status"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     restaurant_id = Column(Integer, ForeignKey("restaurants.id"))
     table_id = Column(Integer, ForeignKey("tables.id"), nullable=True)
+    tab_id = Column(Integer, ForeignKey("table_tabs.id"), nullable=True)
     status = Column(String(32), default="pending")
     notes = Column(Text, nullable=True)
+    subtotal_cents = Column(Integer, nullable=False, default=0, server_default="0")
+    item_count = Column(Integer, nullable=False, default=0, server_default="0")
+    line_count = Column(Integer, nullable=False, default=0, server_default="0")
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow)
 
     restaurant = relationship("Restaurant", back_populates="orders")
     items = relationship("OrderItem", back_populates="order", cascade="all, delete-orphan")
+    status_events = relationship(
+        "OrderStatusEvent",
+        primaryjoin="Order.id == foreign(OrderStatusEvent.order_id)",
+        cascade="save-update",
+        order_by="OrderStatusEvent.id",
+    )
     table = relationship("Table", back_populates="orders")
+    idempotency_key = relationship(
+        "IdempotencyKey",
+        primaryjoin="Order.id == foreign(IdempotencyKey.order_id)",
+        cascade="save-update",
+        uselist=False,
+    )
 
 
 class OrderItem(Base):
     __tablename__ = "order_items"
+    __table_args__ = (
+        Index("ix_order_items_order_id", "order_id"),
+        Index("ix_order_items_menu_item_id", "menu_item_id"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     order_id = Column(Integer, ForeignKey("orders.id"))
     menu_item_id = Column(Integer, ForeignKey("menu_items.id"))
     quantity = Column(Integer, nullable=False)
-    unit_price = Column(Numeric(10, 2), nullable=False)
+    unit_price_cents = Column(Integer, nullable=False)
     special_instructions = Column(Text, nullable=True)
 
     order = relationship("Order", back_populates="items")
     menu_item = relationship("MenuItem", back_populates="order_items")
+
+
+class ArchivedOrder(Base):
+    """Completed or cancelled orders moved out of ``orders`` by ``archive.py``."""
+
+    __tablename__ = "orders_archive"
+    __table_args__ = (Index("ix_orders_archive_restaurant_created", "restaurant_id", "created_at"),)
+
+    id = Column(Integer, primary_key=True, autoincrement=False)
+    restaurant_id = Column(Integer, ForeignKey("restaurants.id"))
+    table_id = Column(Integer, nullable=True)
+    tab_id = Column(Integer, nullable=True)
+    status = Column(String(32))
+    notes = Column(Text, nullable=True)
+    subtotal_cents = Column(Integer, nullable=False, default=0, server_default="0")
+    item_count = Column(Integer, nullable=False, default=0, server_default="0")
+    line_count = Column(Integer, nullable=False, default=0, server_default="0")
+    created_at = Column(DateTime)
+    updated_at = Column(DateTime)
+    archived_at = Column(DateTime, default=datetime.utcnow)
+
+
+class ArchivedOrderItem(Base):
+    __tablename__ = "order_items_archive"
+    __table_args__ = (
+        Index("ix_order_items_archive_order_id", "order_id"),
+        Index("ix_order_items_archive_menu_item_id", "menu_item_id"),
+    )
+
+    id = Column(Integer, primary_key=True, autoincrement=False)
+    order_id = Column(Integer, nullable=False)
+    menu_item_id = Column(Integer)
+    quantity = Column(Integer, nullable=False)
+    unit_price_cents = Column(Integer, nullable=False)
+    special_instructions = Column(Text, nullable=True)
+
+
+class OrderStatusEvent(Base):
+    """Append-only log of status transitions; kept when orders are archived."""
+
+    __tablename__ = "order_status_events"
+    __table_args__ = (Index("ix_order_status_events_restaurant_created", "restaurant_id", "created_at"),)
+
+    id = Column(Integer, primary_key=True)
+    order_id = Column(Integer, nullable=False, index=True)
+    restaurant_id = Column(Integer, ForeignKey("restaurants.id"), nullable=False)
+    from_status = Column(String(32), nullable=True)
+    to_status = Column(String(32), nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+
+class OrderStageHistogram(Base):
+    """Persisted bucket counts behind ``prep_stats``; rows are only ever incremented."""
+
+    __tablename__ = "order_stage_histograms"
+
+    restaurant_id = Column(Integer, ForeignKey("restaurants.id"), primary_key=True)
+    stage = Column(String(40), primary_key=True)
+    bucket = Column(Integer, primary_key=True, autoincrement=False)
+    count = Column(BigInteger, nullable=False, default=0)
+    sum_seconds = Column(Float, nullable=False, default=0)
+
+
+class OutboxEvent(Base):
+    """Side effects written in the same transaction as the change; delivered by ``outbox.py``."""
+
+    __tablename__ = "outbox_events"
+    __table_args__ = (Index("ix_outbox_events_status_available", "status", "available_at"),)
+
+    id = Column(Integer, primary_key=True)
+    topic = Column(String(64), nullable=False)
+    payload = Column(JSON, nullable=False)
+    status = Column(String(16), nullable=False, default="pending", server_default="pending")
+    attempts = Column(Integer, nullable=False, default=0, server_default="0")
+    available_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+    last_error = Column(Text, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+
+class DemandForecast(Base):
+    """Weekly day-of-week x hour order profile per restaurant, written by ``forecast.py``."""
+
+    __tablename__ = "demand_forecasts"
+
+    restaurant_id = Column(Integer, ForeignKey("restaurants.id"), primary_key=True, autoincrement=False)
+    # 168 expected order counts, Monday 00:00 first.
+    profile = Column(JSON, nullable=False)
+    history_weeks = Column(Integer, nullable=False)
+    generated_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+
+
+class IdempotencyKey(Base):
+    """``Idempotency-Key`` of a placed order and the response it got; written with the order."""
+
+    __tablename__ = "idempotency_keys"
+    __table_args__ = (
+        Index("ix_idempotency_keys_key", "restaurant_id", "key", unique=True),
+        Index("ix_idempotency_keys_created", "created_at"),
+    )
+
+    id = Column(Integer, primary_key=True)
+    restaurant_id = Column(Integer, ForeignKey("restaurants.id"), nullable=False)
+    key = Column(String(255), nullable=False)
+    request_hash = Column(String(64), nullable=False)
+    # No foreign key, like order_status_events: orders move to the archive tables.
+    order_id = Column(Integer, nullable=True)
+    # Set by ``ingest.persist_order`` once the order has ids, before the commit.
+    response = Column(JSON, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
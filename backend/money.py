@@ -0,0 +1,19 @@
+"""Money is stored and summed as integer cents.
+
+Amounts from requests are converted with ``to_cents`` on the way in, and
+cents become a decimal amount only when a response is shaped
+(``format_cents``), so no Decimal or float arithmetic runs in between.
+"""
+from decimal import ROUND_HALF_UP, Decimal
+
+CENT = Decimal("0.01")
+
+
+def to_cents(amount) -> int:
+    """Round a decimal amount (float, str or Decimal) to whole cents."""
+    return int(Decimal(str(amount)).quantize(CENT, rounding=ROUND_HALF_UP) * 100)
+
+
+def format_cents(cents: int | None) -> float:
+    """JSON amount for ``cents``; prints with at most two decimals."""
+    return (cents or 0) / 100
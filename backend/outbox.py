@@ -0,0 +1,179 @@
+import asyncio
+import logging
+import os
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable
+
+from sqlalchemy import delete, select, update
+from sqlalchemy.orm import Session
+
+from database import SessionLocal
+from metrics import Counter, Histogram, registry
+from models import OutboxEvent
+
+logger = logging.getLogger(__name__)
+
+# 0 disables dispatching in this process; events stay queued for another worker.
+OUTBOX_POLL_MS = float(os.getenv("OUTBOX_POLL_MS", "1000"))
+OUTBOX_BATCH_SIZE = int(os.getenv("OUTBOX_BATCH_SIZE", "100"))
+OUTBOX_MAX_ATTEMPTS = int(os.getenv("OUTBOX_MAX_ATTEMPTS", "10"))
+OUTBOX_RETRY_MAX_SECONDS = float(os.getenv("OUTBOX_RETRY_MAX_SECONDS", "60"))
+# A claimed batch becomes visible again after this long if its worker dies mid-delivery.
+OUTBOX_LEASE_SECONDS = float(os.getenv("OUTBOX_LEASE_SECONDS", "30"))
+
+outbox_events = registry.register(
+    Counter("outbox_events_total", "Outbox deliveries by topic and outcome.", ["topic", "result"])
+)
+outbox_lag = registry.register(
+    Histogram(
+        "outbox_delivery_lag_seconds",
+        "Time from commit to delivery of an outbox event.",
+        ["topic"],
+        buckets=(0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0),
+    )
+)
+
+Handler = Callable[[dict], Awaitable[None]]
+
+
+def enqueue(db: Session, topic: str, payload: dict) -> None:
+    """Add an event to ``db``'s transaction; it is delivered only if that commits."""
+    db.add(OutboxEvent(topic=topic, payload=payload))
+
+
+class OutboxDispatcher:
+    """Delivers ``outbox_events`` rows to the handler registered for their topic.
+
+    Batches are claimed with ``FOR UPDATE SKIP LOCKED`` and leased by pushing
+    ``available_at`` forward, so any number of workers can dispatch without
+    delivering the same row twice while its lease holds. Delivered rows are
+    deleted; failures are retried with exponential backoff and parked as
+    ``failed`` after ``max_attempts``. Delivery is at-least-once.
+    """
+
+    def __init__(
+        self,
+        poll_ms: float = OUTBOX_POLL_MS,
+        batch_size: int = OUTBOX_BATCH_SIZE,
+        max_attempts: int = OUTBOX_MAX_ATTEMPTS,
+        lease_seconds: float = OUTBOX_LEASE_SECONDS,
+        session_factory: Callable[[], Session] = SessionLocal,
+    ) -> None:
+        self.poll = poll_ms / 1000
+        self.batch_size = max(1, batch_size)
+        self.max_attempts = max(1, max_attempts)
+        self.lease = lease_seconds
+        self.session_factory = session_factory
+        self.handlers: dict[str, Handler] = {}
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._wakeup: asyncio.Event | None = None
+        self._task: asyncio.Task | None = None
+
+    def register(self, topic: str, handler: Handler) -> None:
+        self.handlers[topic] = handler
+
+    def start(self) -> None:
+        if self.poll <= 0 or self._task is not None:
+            return
+        self._loop = asyncio.get_running_loop()
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        self._loop = None
+
+    def notify(self) -> None:
+        """Wake the dispatcher after a commit instead of waiting for the next poll."""
+        if self._loop is not None:
+            try:
+                self._loop.call_soon_threadsafe(self._wakeup.set)
+            except RuntimeError:
+                pass
+
+    def claim(self) -> list:
+        db = self.session_factory()
+        try:
+            now = datetime.utcnow()
+            rows = db.execute(
+                select(
+                    OutboxEvent.id, OutboxEvent.topic, OutboxEvent.payload, OutboxEvent.attempts, OutboxEvent.created_at
+                )
+                .where(OutboxEvent.status == "pending")
+                .where(OutboxEvent.available_at <= now)
+                .order_by(OutboxEvent.id)
+                .limit(self.batch_size)
+                .with_for_update(skip_locked=True)
+            ).all()
+            if rows:
+                db.execute(
+                    update(OutboxEvent)
+                    .where(OutboxEvent.id.in_([row.id for row in rows]))
+                    .values(available_at=now + timedelta(seconds=self.lease), attempts=OutboxEvent.attempts + 1)
+                )
+            db.commit()
+            return rows
+        finally:
+            db.close()
+
+    def complete(self, delivered: list[int], failed: list[tuple[int, int, str]]) -> None:
+        db = self.session_factory()
+        try:
+            if delivered:
+                db.execute(delete(OutboxEvent).where(OutboxEvent.id.in_(delivered)))
+            now = datetime.utcnow()
+            for event_id, attempts, error in failed:
+                values = {"last_error": error[:1000]}
+                if attempts >= self.max_attempts:
+                    values["status"] = "failed"
+                else:
+                    delay = min(OUTBOX_RETRY_MAX_SECONDS, 2 ** (attempts - 1))
+                    values["available_at"] = now + timedelta(seconds=delay)
+                db.execute(update(OutboxEvent).where(OutboxEvent.id == event_id).values(**values))
+            db.commit()
+        finally:
+            db.close()
+
+    async def dispatch_once(self) -> int:
+        rows = await asyncio.to_thread(self.claim)
+        if not rows:
+            return 0
+        delivered: list[int] = []
+        failed: list[tuple[int, int, str]] = []
+        for row in rows:
+            handler = self.handlers.get(row.topic)
+            try:
+                if handler is None:
+                    raise LookupError(f"no outbox handler for {row.topic!r}")
+                await handler(row.payload)
+            except Exception as exc:
+                logger.warning("outbox event %s (%s) failed: %r", row.id, row.topic, exc)
+                outbox_events.inc(topic=row.topic, result="failed")
+                failed.append((row.id, row.attempts + 1, repr(exc)))
+                continue
+            outbox_events.inc(topic=row.topic, result="delivered")
+            if row.created_at is not None:
+                outbox_lag.observe((datetime.utcnow() - row.created_at).total_seconds(), topic=row.topic)
+            delivered.append(row.id)
+        await asyncio.to_thread(self.complete, delivered, failed)
+        return len(rows)
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                dispatched = await self.dispatch_once()
+            except Exception:
+                logger.exception("outbox dispatch failed")
+                dispatched = 0
+            if dispatched >= self.batch_size:
+                continue
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.poll)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+
+
+outbox = OutboxDispatcher()
@@ -0,0 +1,188 @@
+import asyncio
+import logging
+import math
+import os
+import threading
+from bisect import bisect_left
+
+from sqlalchemy import update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from database import SessionLocal
+from models import OrderStageHistogram
+
+logger = logging.getLogger(__name__)
+
+PREP_STATS_FLUSH_SECONDS = float(os.getenv("PREP_STATS_FLUSH_SECONDS", "30"))
+
+# Upper bounds in seconds; index len(PREP_TIME_BUCKETS) is the overflow bucket.
+# Persisted rows store bucket indexes, so only ever append to this tuple.
+PREP_TIME_BUCKETS = (
+    15, 30, 45, 60, 90, 120, 180, 240, 300, 420, 600, 900, 1200, 1500, 1800, 2700, 3600, 5400, 7200, 14400,
+)
+STAGES = {
+    ("pending", "in_progress"): "pending->in_progress",
+    ("in_progress", "ready"): "in_progress->ready",
+    ("ready", "completed"): "ready->completed",
+}
+# Measured from order creation rather than the previous transition.
+END_TO_END = {"ready": "placed->ready", "completed": "placed->completed"}
+STAGE_NAMES = (*STAGES.values(), *END_TO_END.values())
+PERCENTILES = (50, 90, 95, 99)
+
+
+def _percentile(counts: list[int], sums: list[float], total: int, pct: float) -> float:
+    rank = pct / 100 * total
+    seen = 0
+    for index, count in enumerate(counts):
+        if count and seen + count >= rank:
+            lower = PREP_TIME_BUCKETS[index - 1] if index else 0
+            upper = PREP_TIME_BUCKETS[index] if index < len(PREP_TIME_BUCKETS) else math.inf
+            # Interpolate over the span centred on the bucket's own mean rather than
+            # the whole bucket: one 0.1s ticket in the 0-15s bucket is p99 0.1s, not 14.8s.
+            mean = min(max(sums[index] / count, lower), upper)
+            half = min(mean - lower, upper - mean) if count > 1 else 0.0
+            return mean - half + 2 * half * (rank - seen) / count
+        seen += count
+    return float(PREP_TIME_BUCKETS[-1])
+
+
+def summarize(counts: list[int], sums: list[float]) -> dict:
+    total = sum(counts)
+    if not total:
+        return {"count": 0}
+    summary = {"count": total, "mean_seconds": round(sum(sums) / total, 1)}
+    for pct in PERCENTILES:
+        summary[f"p{pct}_seconds"] = round(_percentile(counts, sums, total, pct), 1)
+    return summary
+
+
+class PrepStats:
+    """Streaming per-restaurant histograms of order stage latencies.
+
+    ``observe`` bumps an in-memory delta; ``flush`` adds the deltas to
+    ``order_stage_histograms`` so every worker's observations accumulate in
+    the same rows. Reads combine the persisted rows with this worker's
+    unflushed delta, a fixed number of buckets regardless of order volume.
+    """
+
+    def __init__(self, flush_seconds: float = PREP_STATS_FLUSH_SECONDS) -> None:
+        self.flush_seconds = flush_seconds
+        self._pending: dict[tuple[int, str, int], list] = {}
+        self._lock = threading.Lock()
+        self._task: asyncio.Task | None = None
+
+    def _add(self, restaurant_id: int, stage: str, seconds: float) -> None:
+        bucket = bisect_left(PREP_TIME_BUCKETS, seconds)
+        delta = self._pending.setdefault((restaurant_id, stage, bucket), [0, 0.0])
+        delta[0] += 1
+        delta[1] += seconds
+
+    def observe(
+        self, restaurant_id: int, from_status: str, to_status: str, stage_seconds: float, order_seconds: float
+    ) -> None:
+        with self._lock:
+            stage = STAGES.get((from_status, to_status))
+            if stage is not None:
+                self._add(restaurant_id, stage, max(0.0, stage_seconds))
+            if to_status in END_TO_END:
+                self._add(restaurant_id, END_TO_END[to_status], max(0.0, order_seconds))
+
+    def _merge(self, db: Session, key: tuple[int, str, int], count: int, seconds: float) -> None:
+        restaurant_id, stage, bucket = key
+        updated = db.execute(
+            update(OrderStageHistogram)
+            .where(OrderStageHistogram.restaurant_id == restaurant_id)
+            .where(OrderStageHistogram.stage == stage)
+            .where(OrderStageHistogram.bucket == bucket)
+            .values(
+                count=OrderStageHistogram.count + count,
+                sum_seconds=OrderStageHistogram.sum_seconds + seconds,
+            )
+        ).rowcount
+        if not updated:
+            db.add(
+                OrderStageHistogram(
+                    restaurant_id=restaurant_id, stage=stage, bucket=bucket, count=count, sum_seconds=seconds
+                )
+            )
+            db.flush()
+
+    def flush(self) -> int:
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        if not pending:
+            return 0
+        db = SessionLocal()
+        try:
+            for key, (count, seconds) in pending.items():
+                try:
+                    with db.begin_nested():
+                        self._merge(db, key, count, seconds)
+                except IntegrityError:
+                    # Another worker inserted the row first; add to it instead.
+                    self._merge(db, key, count, seconds)
+            db.commit()
+        except Exception:
+            db.rollback()
+            with self._lock:
+                for key, (count, seconds) in pending.items():
+                    delta = self._pending.setdefault(key, [0, 0.0])
+                    delta[0] += count
+                    delta[1] += seconds
+            raise
+        finally:
+            db.close()
+        return len(pending)
+
+    def summary(self, db: Session, restaurant_id: int) -> dict:
+        counts = {stage: [0] * (len(PREP_TIME_BUCKETS) + 1) for stage in STAGE_NAMES}
+        sums = {stage: [0.0] * (len(PREP_TIME_BUCKETS) + 1) for stage in STAGE_NAMES}
+        rows = (
+            db.query(
+                OrderStageHistogram.stage,
+                OrderStageHistogram.bucket,
+                OrderStageHistogram.count,
+                OrderStageHistogram.sum_seconds,
+            )
+            .filter(OrderStageHistogram.restaurant_id == restaurant_id)
+            .all()
+        )
+        with self._lock:
+            local = [
+                (stage, bucket, count, seconds)
+                for (rid, stage, bucket), (count, seconds) in self._pending.items()
+                if rid == restaurant_id
+            ]
+        for stage, bucket, count, seconds in [*rows, *local]:
+            if stage in counts and bucket < len(counts[stage]):
+                counts[stage][bucket] += count
+                sums[stage][bucket] += seconds
+        return {stage: summarize(counts[stage], sums[stage]) for stage in STAGE_NAMES}
+
+    def start(self) -> None:
+        if self.flush_seconds <= 0 or self._task is not None:
+            return
+
+        async def loop() -> None:
+            while True:
+                await asyncio.sleep(self.flush_seconds)
+                try:
+                    await asyncio.to_thread(self.flush)
+                except Exception:
+                    logger.exception("prep stats flush failed")
+
+        self._task = asyncio.create_task(loop())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        try:
+            await asyncio.to_thread(self.flush)
+        except Exception:
+            logger.exception("prep stats flush failed")
+
+
+prep_stats = PrepStats()
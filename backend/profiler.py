@@ -0,0 +1,367 @@
+"""On-demand sampling profiles of individual requests.
+
+A request is profiled when it carries ``X-Profile: <PROFILE_TOKEN>`` or is
+picked at ``PROFILE_SAMPLE_RATE`` (only paths matching ``PROFILE_PATHS``).
+A sampler thread records the stacks running that request every
+``PROFILE_INTERVAL_MS``: the event-loop thread while the request's task is on
+it, and worker threads from the point they run one of its SQL statements.
+Statements are recorded with their timings. The last ``PROFILE_STORE_SIZE``
+profiles are kept in memory and served by ``/api/diagnostics/profiles`` as
+speedscope JSON or collapsed stacks for flamegraph tools; the profiled
+response gets an ``X-Profile-Id`` header.
+
+With neither setting the middleware passes requests straight through.
+While a profile runs, the GIL switch interval is lowered to a quarter of
+``PROFILE_INTERVAL_MS`` so the sampler is not starved by CPU-bound requests.
+"""
+import hmac
+import itertools
+import os
+import random
+import re
+import sys
+import threading
+import time
+from collections import OrderedDict, defaultdict
+from contextvars import ContextVar
+from datetime import datetime
+
+from sqlalchemy import event
+
+from metrics import Counter, registry
+from slowlog import redact
+
+PROFILE_TOKEN = os.getenv("PROFILE_TOKEN")
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+PROFILE_PATHS = re.compile(os.getenv("PROFILE_PATHS", r"^/api/(?!diagnostics/)"))
+PROFILE_INTERVAL_MS = float(os.getenv("PROFILE_INTERVAL_MS", "2"))
+PROFILE_STORE_SIZE = int(os.getenv("PROFILE_STORE_SIZE", "50"))
+# Sampled (not token-requested) profiles are skipped while this many are running.
+PROFILE_MAX_CONCURRENT = int(os.getenv("PROFILE_MAX_CONCURRENT", "4"))
+PROFILE_MAX_SECONDS = float(os.getenv("PROFILE_MAX_SECONDS", "30"))
+PROFILE_MAX_STATEMENTS = 1000
+
+# Root-side frames of worker threads that say nothing about the request.
+THREAD_BOOTSTRAP_FILES = ("threading.py", f"anyio{os.sep}_backends", f"concurrent{os.sep}futures")
+
+profiles_captured = registry.register(
+    Counter("request_profiles_total", "Requests profiled, by trigger.", ["trigger"])
+)
+
+current_profile: ContextVar["RequestProfile | None"] = ContextVar("current_profile", default=None)
+
+
+class RequestProfile:
+    def __init__(self, profile_id: int, scope: dict, trigger: str, anchor) -> None:
+        self.id = profile_id
+        self.method = scope["method"]
+        self.path = scope["path"]
+        self.query = scope.get("query_string", b"").decode("latin-1")
+        self.trigger = trigger
+        self.at = datetime.utcnow()
+        self.started = time.perf_counter()
+        self.duration = 0.0
+        self.status: int | None = None
+        self.anchor = anchor
+        self.loop_thread = threading.get_ident()
+        self.threads: set[int] = set()
+        # thread id -> [(stack, weight seconds)], stacks root first
+        self.samples: dict[int, list[tuple[tuple, float]]] = defaultdict(list)
+        self.statements: list[dict] = []
+
+    def summary(self) -> dict:
+        return {
+            "id": self.id,
+            "at": self.at.isoformat(),
+            "method": self.method,
+            "path": self.path,
+            "query": self.query,
+            "status": self.status,
+            "trigger": self.trigger,
+            "duration_ms": round(self.duration * 1000, 2),
+            "samples": sum(len(samples) for samples in self.samples.values()),
+            "sql_statements": len(self.statements),
+            "sql_ms": round(sum(statement["duration_ms"] for statement in self.statements), 2),
+        }
+
+    def detail(self) -> dict:
+        return {**self.summary(), "statements": self.statements}
+
+
+def _frame_key(frame) -> tuple[str, str, int]:
+    code = frame.f_code
+    return code.co_qualname, code.co_filename, code.co_firstlineno
+
+
+def _is_bootstrap(frame) -> bool:
+    return any(part in frame.f_code.co_filename for part in THREAD_BOOTSTRAP_FILES)
+
+
+def _stack(frame, anchor=None) -> tuple | None:
+    """Frames from ``anchor`` (or the thread's root) to ``frame``, root first.
+
+    Returns ``None`` when ``anchor`` is given but not on the stack.
+    """
+    frames = []
+    while frame is not None:
+        frames.append(frame)
+        if frame is anchor:
+            break
+        frame = frame.f_back
+    else:
+        if anchor is not None:
+            return None
+    frames.reverse()
+    start = 0
+    if anchor is None:
+        while start < len(frames) - 1 and _is_bootstrap(frames[start]):
+            start += 1
+    return tuple(_frame_key(frame) for frame in frames[start:])
+
+
+class Profiler:
+    """Request profile store plus the sampler thread shared by running profiles."""
+
+    def __init__(
+        self,
+        token: str | None = PROFILE_TOKEN,
+        sample_rate: float = PROFILE_SAMPLE_RATE,
+        interval_ms: float = PROFILE_INTERVAL_MS,
+        store_size: int = PROFILE_STORE_SIZE,
+        max_concurrent: int = PROFILE_MAX_CONCURRENT,
+        max_seconds: float = PROFILE_MAX_SECONDS,
+    ) -> None:
+        self.token = token
+        self.sample_rate = sample_rate
+        self.interval = interval_ms / 1000
+        self.store_size = store_size
+        self.max_concurrent = max_concurrent
+        self.max_seconds = max_seconds
+        self.profiles: OrderedDict[int, RequestProfile] = OrderedDict()
+        self._active: dict[int, RequestProfile] = {}
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread: threading.Thread | None = None
+        self._switch_interval = sys.getswitchinterval()
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.token) or self.sample_rate > 0
+
+    def install(self, engine) -> None:
+        if not self.enabled:
+            return
+
+        @event.listens_for(engine, "before_cursor_execute")
+        def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+            profile = current_profile.get()
+            if profile is not None:
+                profile.threads.add(threading.get_ident())
+                conn.info.setdefault("profile_start", []).append(time.perf_counter())
+
+        @event.listens_for(engine, "after_cursor_execute")
+        def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+            profile = current_profile.get()
+            if profile is None or not conn.info.get("profile_start"):
+                return
+            started = conn.info["profile_start"].pop()
+            if len(profile.statements) < PROFILE_MAX_STATEMENTS:
+                profile.statements.append(
+                    {
+                        "offset_ms": round((started - profile.started) * 1000, 3),
+                        "duration_ms": round((time.perf_counter() - started) * 1000, 3),
+                        "statement": statement,
+                        "params": redact(parameters),
+                        "executemany": executemany,
+                    }
+                )
+
+    def authorized(self, token: str | None) -> bool:
+        return bool(self.token) and token is not None and hmac.compare_digest(token, self.token)
+
+    def trigger(self, scope: dict, headers: dict[bytes, bytes]) -> str | None:
+        if self.token and self.authorized(headers.get(b"x-profile", b"").decode("latin-1")):
+            return "token"
+        if (
+            self.sample_rate > 0
+            and random.random() < self.sample_rate
+            and PROFILE_PATHS.match(scope["path"])
+            and len(self._active) < self.max_concurrent
+        ):
+            return "sampled"
+        return None
+
+    def begin(self, scope: dict, trigger: str, anchor) -> RequestProfile:
+        profile = RequestProfile(next(self._ids), scope, trigger, anchor)
+        with self._lock:
+            if not self._active:
+                # The sampler needs the GIL to take a sample; by default it may wait 5 ms for it.
+                self._switch_interval = sys.getswitchinterval()
+                sys.setswitchinterval(min(self._switch_interval, self.interval / 4))
+            self._active[profile.id] = profile
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._sample, name="request-profiler", daemon=True)
+                self._thread.start()
+        self._wakeup.set()
+        return profile
+
+    def end(self, profile: RequestProfile) -> None:
+        profile.duration = time.perf_counter() - profile.started
+        profile.anchor = None
+        with self._lock:
+            self._active.pop(profile.id, None)
+            if not self._active:
+                sys.setswitchinterval(self._switch_interval)
+            self.profiles[profile.id] = profile
+            while len(self.profiles) > self.store_size:
+                self.profiles.popitem(last=False)
+        profiles_captured.inc(trigger=profile.trigger)
+
+    def get(self, profile_id: int) -> RequestProfile | None:
+        with self._lock:
+            return self.profiles.get(profile_id)
+
+    def recent(self, limit: int = 50) -> list[dict]:
+        with self._lock:
+            profiles = list(self.profiles.values())
+        return [profile.summary() for profile in profiles[::-1][:limit]]
+
+    def _sample(self) -> None:
+        own = threading.get_ident()
+        last = time.perf_counter()
+        while True:
+            if not self._active:
+                self._wakeup.wait()
+                self._wakeup.clear()
+                last = time.perf_counter()
+                continue
+            time.sleep(self.interval)
+            now = time.perf_counter()
+            weight, last = now - last, now
+            frames = sys._current_frames()
+            with self._lock:
+                active = list(self._active.values())
+            for profile in active:
+                anchor = profile.anchor
+                if anchor is None or now - profile.started > self.max_seconds:
+                    continue
+                loop_frame = frames.get(profile.loop_thread)
+                if loop_frame is not None:
+                    stack = _stack(loop_frame, anchor)
+                    if stack is not None:
+                        profile.samples[profile.loop_thread].append((stack, weight))
+                for thread_id in list(profile.threads):
+                    if thread_id in (own, profile.loop_thread) or thread_id not in frames:
+                        continue
+                    profile.samples[thread_id].append((_stack(frames[thread_id]), weight))
+            del frames
+
+
+profiler = Profiler()
+
+
+class ProfilerMiddleware:
+    def __init__(self, app, profiler: Profiler = profiler) -> None:
+        self.app = app
+        self.profiler = profiler
+
+    async def __call__(self, scope, receive, send) -> None:
+        if scope["type"] != "http" or not self.profiler.enabled:
+            await self.app(scope, receive, send)
+            return
+        trigger = self.profiler.trigger(scope, dict(scope["headers"]))
+        if trigger is None:
+            await self.app(scope, receive, send)
+            return
+
+        profile = self.profiler.begin(scope, trigger, sys._getframe())
+        token = current_profile.set(profile)
+
+        async def send_wrapper(message) -> None:
+            if message["type"] == "http.response.start":
+                profile.status = message["status"]
+                message = {
+                    **message,
+                    "headers": [*message.get("headers", []), (b"x-profile-id", str(profile.id).encode("latin-1"))],
+                }
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            current_profile.reset(token)
+            self.profiler.end(profile)
+
+
+def _thread_name(profile: RequestProfile, thread_id: int) -> str:
+    return "event loop" if thread_id == profile.loop_thread else f"thread {thread_id}"
+
+
+def to_speedscope(profile: RequestProfile) -> dict:
+    """https://www.speedscope.app file: one sampled profile per thread, plus SQL as an evented profile."""
+    frames: list[dict] = []
+    index: dict[tuple, int] = {}
+
+    def frame_index(key: tuple) -> int:
+        if key not in index:
+            name, filename, line = key
+            index[key] = len(frames)
+            frames.append({"name": name, "file": filename, "line": line})
+        return index[key]
+
+    title = f"{profile.method} {profile.path}"
+    end_ms = profile.duration * 1000
+    profiles = []
+    for thread_id, samples in profile.samples.items():
+        weights = [round(weight * 1000, 3) for _, weight in samples]
+        profiles.append(
+            {
+                "type": "sampled",
+                "name": f"{title} ({_thread_name(profile, thread_id)})",
+                "unit": "milliseconds",
+                "startValue": 0,
+                "endValue": round(sum(weights), 3),
+                "samples": [[frame_index(key) for key in stack] for stack, _ in samples],
+                "weights": weights,
+            }
+        )
+    if profile.statements:
+        events = []
+        cursor = 0.0
+        for statement in sorted(profile.statements, key=lambda entry: entry["offset_ms"]):
+            # Evented profiles must nest; concurrent statements are clipped.
+            start = max(statement["offset_ms"], cursor)
+            end = max(start, statement["offset_ms"] + statement["duration_ms"])
+            frame = frame_index((" ".join(statement["statement"].split())[:200], "sql", 0))
+            events.append({"type": "O", "frame": frame, "at": round(start, 3)})
+            events.append({"type": "C", "frame": frame, "at": round(end, 3)})
+            cursor = end
+        profiles.append(
+            {
+                "type": "evented",
+                "name": f"{title} (SQL)",
+                "unit": "milliseconds",
+                "startValue": 0,
+                "endValue": round(max(end_ms, cursor), 3),
+                "events": events,
+            }
+        )
+    return {
+        "$schema": "https://www.speedscope.app/file-format-schema.json",
+        "name": f"{title} #{profile.id}",
+        "exporter": "restaurant-qr-order profiler",
+        "activeProfileIndex": 0,
+        "shared": {"frames": frames},
+        "profiles": profiles,
+    }
+
+
+def to_collapsed(profile: RequestProfile) -> str:
+    """Folded stacks (``a;b;c <microseconds>``) for flamegraph.pl and similar tools."""
+    totals: dict[str, float] = defaultdict(float)
+    for thread_id, samples in profile.samples.items():
+        root = _thread_name(profile, thread_id)
+        for stack, weight in samples:
+            totals[";".join([root, *(name for name, _, _ in stack)])] += weight
+    return "".join(f"{stack} {round(weight * 1e6)}\n" for stack, weight in totals.items())
@@ -0,0 +1,263 @@
+import asyncio
+import logging
+import math
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+
+from fastapi import HTTPException, Request
+from starlette.responses import JSONResponse
+
+from metrics import Counter, registry
+
+logger = logging.getLogger(__name__)
+
+RATE_LIMIT_ENABLED = os.getenv("RATE_LIMIT_ENABLED", "true").lower() == "true"
+RATE_LIMIT_BACKEND = os.getenv("RATE_LIMIT_BACKEND", "memory").lower()
+RATE_LIMIT_MAX_KEYS = int(os.getenv("RATE_LIMIT_MAX_KEYS", "100000"))
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+TRUST_PROXY_HEADERS = os.getenv("TRUST_PROXY_HEADERS", "false").lower() == "true"
+
+DB_CONCURRENCY_LIMIT = int(os.getenv("DB_CONCURRENCY_LIMIT", "12"))
+DB_ADMISSION_TIMEOUT_MS = float(os.getenv("DB_ADMISSION_TIMEOUT_MS", "250"))
+# GETs that admission control lets straight through: cache-backed guest reads,
+# whose cold misses are bounded by the public pool, and in-memory diagnostics.
+ADMISSION_EXEMPT_PATHS = re.compile(
+    r"^/api/(menu/?|menu/(items(/\d+)?|categories|changes)|recommendations/(trending|fbt)"
+    r"|tables/(public|\d+/qr)|diagnostics/.*)$"
+)
+
+
+@dataclass(frozen=True)
+class Limit:
+    """Token bucket settings; a rate of 0 turns the bucket off."""
+
+    rate: float
+    burst: float
+
+    def __post_init__(self) -> None:
+        if self.rate < 0 or (self.rate > 0 and self.burst <= 0):
+            raise ValueError(f"invalid rate limit {self.rate}/{self.burst}")
+
+    @property
+    def enabled(self) -> bool:
+        return self.rate > 0
+
+    @classmethod
+    def parse(cls, value: str) -> "Limit":
+        rate, _, burst = value.partition("/")
+        return cls(rate=float(rate), burst=float(burst or rate))
+
+
+# Tokens per second / bucket size, overridable as RATE_LIMIT_<NAME>="rate/burst"
+# ("0" disables one).
+DEFAULT_LIMITS = {
+    "ip": "10/40",
+    "table": "1/10",
+    "restaurant": "100/300",
+    "login_ip": "0.2/10",
+    "login_email": "0.1/5",
+}
+LIMITS = {
+    name: Limit.parse(os.getenv(f"RATE_LIMIT_{name.upper()}", default))
+    for name, default in DEFAULT_LIMITS.items()
+}
+# Buckets that draw on another bucket's limit. Table ids and table codes share
+# the "table" limit but keep separate keys, so id 12 and code "12" don't collide.
+BUCKET_LIMITS = {"table_id": "table", "table_code": "table"}
+
+rate_limited = registry.register(
+    Counter("rate_limited_requests_total", "Requests rejected with 429 by bucket.", ["bucket"])
+)
+admission_shed = registry.register(
+    Counter("admission_shed_requests_total", "Requests shed with 503 by admission control.")
+)
+
+
+class MemoryBackend:
+    def __init__(self, max_keys: int = RATE_LIMIT_MAX_KEYS) -> None:
+        self.max_keys = max_keys
+        self._buckets: OrderedDict[str, tuple[float, float]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def take(self, key: str, limit: Limit, cost: float = 1) -> float:
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated = self._buckets.pop(key, (limit.burst, now))
+            tokens = min(limit.burst, tokens + (now - updated) * limit.rate)
+            if tokens >= cost:
+                tokens -= cost
+                retry_after = 0.0
+            else:
+                retry_after = (cost - tokens) / limit.rate
+            self._buckets[key] = (tokens, now)
+            if len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+        return retry_after
+
+
+_TOKEN_BUCKET_LUA = """
+local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'updated')
+local rate = tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+local now = tonumber(ARGV[3])
+local cost = tonumber(ARGV[4])
+local tokens = tonumber(bucket[1]) or burst
+local updated = tonumber(bucket[2]) or now
+tokens = math.min(burst, tokens + math.max(0, now - updated) * rate)
+local retry_after = 0
+if tokens >= cost then
+  tokens = tokens - cost
+else
+  retry_after = (cost - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'updated', now)
+redis.call('PEXPIRE', KEYS[1], math.ceil(burst / rate * 1000) + 1000)
+return tostring(retry_after)
+"""
+
+
+class RedisBackend:
+    """Token buckets shared by every worker; fails open if Redis is unreachable."""
+
+    def __init__(self, client) -> None:
+        self.client = client
+        self._script = client.register_script(_TOKEN_BUCKET_LUA)
+
+    def take(self, key: str, limit: Limit, cost: float = 1) -> float:
+        try:
+            result = self._script(
+                keys=[f"ratelimit:{key}"],
+                args=[limit.rate, limit.burst, time.time(), cost],
+            )
+        except Exception:
+            logger.warning("rate limit backend unavailable, allowing request", exc_info=True)
+            return 0.0
+        return float(result)
+
+
+def _build_backend():
+    if RATE_LIMIT_BACKEND == "redis":
+        import redis
+
+        return RedisBackend(redis.Redis.from_url(REDIS_URL, socket_timeout=0.05))
+    return MemoryBackend()
+
+
+class RateLimiter:
+    def __init__(self, backend, limits: dict[str, Limit] = LIMITS, enabled: bool = RATE_LIMIT_ENABLED) -> None:
+        self.backend = backend
+        self.limits = limits
+        self.enabled = enabled
+
+    def check(self, **subjects) -> None:
+        """Take one token from each ``name=value`` bucket; raise 429 if any is empty."""
+        if not self.enabled:
+            return
+        retry_after = 0.0
+        for name, value in subjects.items():
+            limit_name = BUCKET_LIMITS.get(name, name)
+            limit = self.limits[limit_name]
+            if value is None or not limit.enabled:
+                continue
+            wait = self.backend.take(f"{name}:{value}", limit)
+            if wait > 0:
+                rate_limited.inc(bucket=limit_name)
+                retry_after = max(retry_after, wait)
+        if retry_after > 0:
+            raise HTTPException(
+                status_code=429,
+                detail="Too many requests",
+                headers={"Retry-After": str(math.ceil(retry_after))},
+            )
+
+
+limiter = RateLimiter(_build_backend())
+
+
+def client_ip(request: Request) -> str:
+    if TRUST_PROXY_HEADERS:
+        forwarded = request.headers.get("x-forwarded-for")
+        if forwarded:
+            return forwarded.split(",")[0].strip()
+    return request.client.host if request.client else "unknown"
+
+
+def public_rate_limit(request: Request) -> None:
+    limiter.check(
+        ip=client_ip(request),
+        table_id=request.path_params.get("table_id"),
+        table_code=request.query_params.get("code"),
+        restaurant=request.query_params.get("restaurant_id"),
+    )
+
+
+def order_rate_limit(request: Request, table_id: int | None) -> None:
+    limiter.check(ip=client_ip(request), table_id=table_id)
+
+
+def restaurant_rate_limit(restaurant_id: int) -> None:
+    """Per-restaurant bucket, taken once the restaurant is known (orders may give only a table)."""
+    limiter.check(restaurant=restaurant_id)
+
+
+def login_rate_limit(request: Request, email: str) -> None:
+    limiter.check(login_ip=client_ip(request), login_email=email.lower())
+
+
+class AdmissionControlMiddleware:
+    """Caps concurrent DB-bound requests and sheds the excess with a fast 503.
+
+    Requests wait at most ``timeout_ms`` for a slot instead of queueing on the
+    connection pool for ``pool_timeout`` seconds.
+    """
+
+    def __init__(
+        self,
+        app,
+        limit: int = DB_CONCURRENCY_LIMIT,
+        timeout_ms: float = DB_ADMISSION_TIMEOUT_MS,
+        prefix: str = "/api",
+        exempt: re.Pattern = ADMISSION_EXEMPT_PATHS,
+    ) -> None:
+        self.app = app
+        self.limit = limit
+        self.timeout = timeout_ms / 1000
+        self.prefix = prefix
+        self.exempt = exempt
+        self.in_flight = 0
+        self.shed = 0
+        self._semaphore: asyncio.Semaphore | None = None
+
+    async def __call__(self, scope, receive, send) -> None:
+        if (
+            self.limit <= 0
+            or scope["type"] != "http"
+            or not scope["path"].startswith(self.prefix)
+            or (scope["method"] in ("GET", "HEAD") and self.exempt.match(scope["path"]))
+        ):
+            await self.app(scope, receive, send)
+            return
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.limit)
+        try:
+            await asyncio.wait_for(self._semaphore.acquire(), self.timeout)
+        except asyncio.TimeoutError:
+            self.shed += 1
+            admission_shed.inc()
+            response = JSONResponse(
+                {"detail": "Server busy, please retry"},
+                status_code=503,
+                headers={"Retry-After": "1"},
+            )
+            await response(scope, receive, send)
+            return
+        self.in_flight += 1
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.in_flight -= 1
+            self._semaphore.release()
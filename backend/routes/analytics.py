@@ -1,101 +1,210 @@
+import os
+from datetime import datetime
+
 from fastapi import APIRouter, Depends
 from sqlalchemy.orm import Session
-from sqlalchemy import func, extract, desc, text
+from sqlalchemy import func, extract, text
 
+from archive import ARCHIVE_AFTER_DAYS
 from auth import require_owner
-from database import get_db
-from models import Order, OrderItem, MenuItem, MenuCategory, User
+from cache import cache
+from database import get_analytics_db
+from forecast import forecast_days
+from money import format_cents
+from prep_stats import prep_stats
+from models import ArchivedOrder, ArchivedOrderItem, DemandForecast, Order, OrderItem, MenuItem, MenuCategory, User
 
 router = APIRouter(prefix="/analytics", tags=["analytics"])
 
+ANALYTICS_CACHE_SECONDS = float(os.getenv("ANALYTICS_CACHE_SECONDS", "30"))
+
+
+def order_sources(days: int | None = None) -> list[tuple]:
+    """``(order, item)`` models to aggregate over, hot tables first.
+
+    The archive only holds orders older than ``ARCHIVE_AFTER_DAYS``, so
+    windows shorter than that never touch it.
+    """
+    sources = [(Order, OrderItem)]
+    if days is None or days >= ARCHIVE_AFTER_DAYS:
+        sources.append((ArchivedOrder, ArchivedOrderItem))
+    return sources
+
+
+def merge_totals(rows, totals: dict | None = None) -> dict:
+    totals = {} if totals is None else totals
+    for key, *values in rows:
+        current = totals.get(key)
+        totals[key] = values if current is None else [a + b for a, b in zip(current, values)]
+    return totals
+
 
 @router.get("/summary")
-def analytics_summary(db: Session = Depends(get_db), owner: User = Depends(require_owner)) -> dict:
-    total_orders = (
-        db.query(func.count(Order.id))
-        .filter(Order.restaurant_id == owner.restaurant_id)
-        .scalar()
-        or 0
-    )
-    total_revenue = (
-        db.query(func.coalesce(func.sum(OrderItem.quantity * OrderItem.unit_price), 0))
-        .join(Order, Order.id == OrderItem.order_id)
-        .filter(Order.restaurant_id == owner.restaurant_id)
-        .scalar()
+def analytics_summary(db: Session = Depends(get_analytics_db), owner: User = Depends(require_owner)) -> dict:
+    def compute() -> dict:
+        total_orders = 0
+        total_revenue_cents = 0
+        for order_model, _ in order_sources():
+            count, revenue_cents = (
+                db.query(func.count(order_model.id), func.coalesce(func.sum(order_model.subtotal_cents), 0))
+                .filter(order_model.restaurant_id == owner.restaurant_id)
+                .one()
+            )
+            total_orders += count or 0
+            total_revenue_cents += revenue_cents or 0
+        return {
+            "total_orders": int(total_orders),
+            "total_revenue_cents": int(total_revenue_cents),
+            "total_revenue": format_cents(total_revenue_cents),
+        }
+
+    return cache.get_or_set(
+        owner.restaurant_id, "analytics:summary", compute, ttl=ANALYTICS_CACHE_SECONDS, tags=("analytics",)
     )
-    return {
-        "total_orders": int(total_orders),
-        "total_revenue": float(total_revenue or 0)
-    }
 
 
 @router.get("/status")
-def analytics_by_status(db: Session = Depends(get_db), owner: User = Depends(require_owner)) -> dict:
-    rows = (
-        db.query(Order.status, func.count(Order.id))
-        .filter(Order.restaurant_id == owner.restaurant_id)
-        .group_by(Order.status)
-        .all()
+def analytics_by_status(db: Session = Depends(get_analytics_db), owner: User = Depends(require_owner)) -> dict:
+    def compute() -> dict:
+        totals: dict = {}
+        for order_model, _ in order_sources():
+            rows = (
+                db.query(order_model.status, func.count(order_model.id))
+                .filter(order_model.restaurant_id == owner.restaurant_id)
+                .group_by(order_model.status)
+                .all()
+            )
+            merge_totals(rows, totals)
+        return {status: int(count) for status, (count,) in totals.items()}
+
+    return cache.get_or_set(
+        owner.restaurant_id, "analytics:status", compute, ttl=ANALYTICS_CACHE_SECONDS, tags=("analytics",)
     )
-    return {status: int(count) for status, count in rows}
 
 
 @router.get("/top-items")
-def top_items(limit: int = 5, db: Session = Depends(get_db), owner: User = Depends(require_owner)) -> list[dict]:
-    rows = (
-        db.query(
-            MenuItem.id,
-            MenuItem.name,
-            func.coalesce(func.sum(OrderItem.quantity), 0).label("orders"),
-            func.coalesce(func.sum(OrderItem.quantity * OrderItem.unit_price), 0).label("revenue"),
+def top_items(limit: int = 5, db: Session = Depends(get_analytics_db), owner: User = Depends(require_owner)) -> list[dict]:
+    def item_totals(item_model, item_ids: list[int] | None = None):
+        query = (
+            db.query(
+                MenuItem.id,
+                MenuItem.name,
+                func.coalesce(func.sum(item_model.quantity), 0),
+                func.coalesce(func.sum(item_model.quantity * item_model.unit_price_cents), 0),
+            )
+            .join(item_model, item_model.menu_item_id == MenuItem.id)
+            .filter(MenuItem.restaurant_id == owner.restaurant_id)
+            .group_by(MenuItem.id)
         )
-        .join(OrderItem, OrderItem.menu_item_id == MenuItem.id)
-        .filter(MenuItem.restaurant_id == owner.restaurant_id)
-        .group_by(MenuItem.id)
-        .order_by(desc("orders"))
-        .limit(limit)
-        .all()
+        if item_ids is not None:
+            return query.filter(MenuItem.id.in_(item_ids)).all()
+        return query.order_by(func.sum(item_model.quantity).desc(), MenuItem.id).limit(limit).all()
+
+    def compute() -> list[dict]:
+        # Candidates are each source's top ``limit``; the others' totals for
+        # those items are then filled in, so no source is read in full.
+        item_models = [item_model for _, item_model in order_sources()]
+        per_source = [item_totals(item_model) for item_model in item_models]
+        candidates = {row[0] for rows in per_source for row in rows}
+        totals: dict = {}
+        for item_model, rows in zip(item_models, per_source):
+            missing = candidates - {row[0] for row in rows}
+            if missing:
+                rows = rows + item_totals(item_model, sorted(missing))
+            merge_totals(
+                (((item_id, name), orders, revenue_cents) for item_id, name, orders, revenue_cents in rows), totals
+            )
+        ranked = sorted(totals.items(), key=lambda entry: entry[1][0], reverse=True)[:limit]
+        return [
+            {
+                "id": item_id,
+                "name": name,
+                "orders": int(orders),
+                "revenue_cents": int(revenue_cents),
+                "revenue": format_cents(revenue_cents),
+            }
+            for (item_id, name), (orders, revenue_cents) in ranked
+        ]
+
+    return cache.get_or_set(
+        owner.restaurant_id,
+        f"analytics:top-items:{limit}",
+        compute,
+        ttl=ANALYTICS_CACHE_SECONDS,
+        tags=("menu", "analytics"),
     )
-    return [
-        {
-            "id": row.id,
-            "name": row.name,
-            "orders": int(row.orders),
-            "revenue": float(row.revenue or 0),
-        }
-        for row in rows
-    ]
 
 
 @router.get("/by-category")
-def sales_by_category(db: Session = Depends(get_db), owner: User = Depends(require_owner)) -> list[dict]:
-    rows = (
-        db.query(
-            MenuCategory.name,
-            func.coalesce(func.sum(OrderItem.quantity * OrderItem.unit_price), 0).label("revenue"),
-        )
-        .join(MenuItem, MenuItem.category_id == MenuCategory.id)
-        .join(OrderItem, OrderItem.menu_item_id == MenuItem.id)
-        .filter(MenuCategory.restaurant_id == owner.restaurant_id)
-        .group_by(MenuCategory.name)
-        .order_by(desc("revenue"))
-        .all()
+def sales_by_category(db: Session = Depends(get_analytics_db), owner: User = Depends(require_owner)) -> list[dict]:
+    def compute() -> list[dict]:
+        totals: dict = {}
+        for _, item_model in order_sources():
+            rows = (
+                db.query(
+                    MenuCategory.name,
+                    func.coalesce(func.sum(item_model.quantity * item_model.unit_price_cents), 0),
+                )
+                .join(MenuItem, MenuItem.category_id == MenuCategory.id)
+                .join(item_model, item_model.menu_item_id == MenuItem.id)
+                .filter(MenuCategory.restaurant_id == owner.restaurant_id)
+                .group_by(MenuCategory.name)
+                .all()
+            )
+            merge_totals(rows, totals)
+        ranked = sorted(totals.items(), key=lambda entry: entry[1][0], reverse=True)
+        return [
+            {"category": name, "revenue_cents": int(revenue_cents), "revenue": format_cents(revenue_cents)}
+            for name, (revenue_cents,) in ranked
+        ]
+
+    return cache.get_or_set(
+        owner.restaurant_id, "analytics:by-category", compute, ttl=ANALYTICS_CACHE_SECONDS, tags=("menu", "analytics")
     )
-    return [{"category": row.name, "revenue": float(row.revenue or 0)} for row in rows]
 
 
 @router.get("/by-hour")
-def orders_by_hour(days: int = 7, db: Session = Depends(get_db), owner: User = Depends(require_owner)) -> list[dict]:
-    cutoff = func.now() - text(f"interval '{days} days'")
-    rows = (
-        db.query(
-            extract("hour", Order.created_at).label("hour"),
-            func.count(Order.id).label("orders"),
-        )
-        .filter(Order.restaurant_id == owner.restaurant_id)
-        .filter(Order.created_at >= cutoff)
-        .group_by("hour")
-        .order_by("hour")
-        .all()
+def orders_by_hour(
+    days: int = 7, db: Session = Depends(get_analytics_db), owner: User = Depends(require_owner)
+) -> list[dict]:
+    def compute() -> list[dict]:
+        cutoff = func.now() - text(f"interval '{days} days'")
+        totals: dict = {}
+        for order_model, _ in order_sources(days):
+            rows = (
+                db.query(
+                    extract("hour", order_model.created_at).label("hour"),
+                    func.count(order_model.id).label("orders"),
+                )
+                .filter(order_model.restaurant_id == owner.restaurant_id)
+                .filter(order_model.created_at >= cutoff)
+                .group_by("hour")
+                .all()
+            )
+            merge_totals(rows, totals)
+        return [{"hour": int(hour), "orders": int(orders)} for hour, (orders,) in sorted(totals.items())]
+
+    return cache.get_or_set(
+        owner.restaurant_id, f"analytics:by-hour:{days}", compute, ttl=ANALYTICS_CACHE_SECONDS, tags=("analytics",)
     )
-    return [{"hour": int(row.hour), "orders": int(row.orders)} for row in rows]
+
+
+@router.get("/prep-times")
+def prep_times(db: Session = Depends(get_analytics_db), owner: User = Depends(require_owner)) -> dict:
+    """Stage latency percentiles from the streaming histograms, not order history."""
+    return prep_stats.summary(db, owner.restaurant_id)
+
+
+@router.get("/forecast")
+def demand_forecast(
+    days: int = 7, db: Session = Depends(get_analytics_db), owner: User = Depends(require_owner)
+) -> dict:
+    """Expected orders per hour (UTC) for the next ``days`` days, from the last forecast run."""
+    forecast = db.query(DemandForecast).filter(DemandForecast.restaurant_id == owner.restaurant_id).first()
+    if forecast is None:
+        return {"generated_at": None, "history_weeks": 0, "days": []}
+    return {
+        "generated_at": forecast.generated_at.isoformat(),
+        "history_weeks": forecast.history_weeks,
+        "days": forecast_days(forecast.profile, datetime.utcnow().date(), max(1, min(days, 28))),
+    }
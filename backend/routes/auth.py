@@ -1,10 +1,11 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request
 from pydantic import BaseModel, EmailStr, Field
 from sqlalchemy.orm import Session
 
 from auth import create_access_token, get_password_hash, require_owner, verify_password
 from database import get_db
 from models import Restaurant, User
+from ratelimit import login_rate_limit
 
 router = APIRouter(prefix="/auth", tags=["auth"])
 
@@ -65,7 +66,8 @@ def signup(payload: SignupPayload, db: Session = Depends(get_db)) -> dict:
 
 
 @router.post("/login")
-def login(payload: LoginPayload, db: Session = Depends(get_db)) -> dict:
+def login(request: Request, payload: LoginPayload, db: Session = Depends(get_db)) -> dict:
+    login_rate_limit(request, payload.email)
     _enforce_password_limit(payload.password)
     user = db.query(User).filter(User.email == payload.email).first()
     if not user or not verify_password(payload.password, user.password_hash):
@@ -0,0 +1,56 @@
+from fastapi import APIRouter, Depends, Header, HTTPException
+from fastapi.responses import JSONResponse, PlainTextResponse
+
+from profiler import profiler, to_collapsed, to_speedscope
+from slowlog import slow_query_log
+
+router = APIRouter(prefix="/diagnostics", tags=["diagnostics"])
+
+
+def require_profile_token(x_profile_token: str | None = Header(default=None)) -> None:
+    # Profiles and slow queries span every restaurant's requests (plans include bound
+    # literals), so they need the admin token rather than an owner login.
+    if not profiler.token:
+        raise HTTPException(status_code=404, detail="Diagnostics are not configured")
+    if not profiler.authorized(x_profile_token):
+        raise HTTPException(status_code=401, detail="Invalid profile token")
+
+
+@router.get("/slow-queries", dependencies=[Depends(require_profile_token)])
+def slow_queries(limit: int = 50) -> dict:
+    return {
+        "enabled": slow_query_log.enabled,
+        "threshold_ms": slow_query_log.threshold * 1000,
+        "entries": slow_query_log.recent(limit),
+    }
+
+
+@router.get("/profiles", dependencies=[Depends(require_profile_token)])
+def list_profiles(limit: int = 50) -> dict:
+    return {
+        "enabled": profiler.enabled,
+        "sample_rate": profiler.sample_rate,
+        "interval_ms": profiler.interval * 1000,
+        "profiles": profiler.recent(limit),
+    }
+
+
+@router.get("/profiles/{profile_id}", dependencies=[Depends(require_profile_token)])
+def get_profile(profile_id: int, format: str = "json"):
+    """``format``: ``json`` (summary and SQL), ``speedscope`` or ``collapsed`` (flamegraph.pl input)."""
+    profile = profiler.get(profile_id)
+    if profile is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    if format == "json":
+        return profile.detail()
+    filename = f"profile-{profile_id}"
+    if format == "speedscope":
+        return JSONResponse(
+            to_speedscope(profile),
+            headers={"Content-Disposition": f'attachment; filename="{filename}.speedscope.json"'},
+        )
+    if format == "collapsed":
+        return PlainTextResponse(
+            to_collapsed(profile), headers={"Content-Disposition": f'attachment; filename="{filename}.folded"'}
+        )
+    raise HTTPException(status_code=400, detail="format must be json, speedscope or collapsed")
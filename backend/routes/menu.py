@@ -1,12 +1,22 @@
 from fastapi import APIRouter, Depends, HTTPException
-from pydantic import BaseModel
+from fastapi.responses import Response
+from pydantic import BaseModel, computed_field
+from sqlalchemy import update
 from sqlalchemy.orm import Session
 
 from auth import get_optional_user, require_owner
-from database import get_db
-from models import MenuCategory, MenuItem, User
+from cache import cache
+from database import get_db, get_public_db
+from edge import menu_key, queue_purge
+from money import format_cents, to_cents
+from ratelimit import public_rate_limit
+from serializers import json_response, rows_to_dicts
+from models import MenuCategory, MenuItem, MenuTombstone, Restaurant, User
+from outbox import enqueue, outbox
+from ws import menu_channel
 
 router = APIRouter(prefix="/menu", tags=["menu"])
+outbox.register("menu_delta", menu_channel.deliver)
 
 DIET_OPTIONS = {"veg", "nonveg", "vegan", "gluten_free"}
 
@@ -16,12 +26,17 @@ class MenuItemOut(BaseModel):
     category_id: int | None
     name: str
     description: str | None
-    price: float
+    price_cents: int
     is_available: bool
     diet_tag: str | None
 
     model_config = {"from_attributes": True}
 
+    @computed_field
+    @property
+    def price(self) -> float:
+        return format_cents(self.price_cents)
+
 
 class MenuItemCreate(BaseModel):
     category_id: int | None = None
@@ -68,118 +83,190 @@ def resolve_restaurant_id(restaurant_id: int | None, user: User | None) -> int:
     raise HTTPException(status_code=400, detail="restaurant_id is required")
 
 
-@router.get("/", response_model=list[MenuCategoryOut])
+MENU_ITEM_FIELDS = ("id", "category_id", "name", "description", "price_cents", "is_available", "diet_tag")
+MENU_ITEM_COLUMNS = tuple(getattr(MenuItem, field) for field in MENU_ITEM_FIELDS)
+
+
+def next_menu_version(db: Session, restaurant_id: int) -> int:
+    """Bump the restaurant's menu version in the caller's transaction.
+
+    The row lock on ``restaurants`` is held until commit, so versions become
+    visible in order and ``version > since`` never skips a late commit.
+    """
+    return db.execute(
+        update(Restaurant)
+        .where(Restaurant.id == restaurant_id)
+        .values(menu_version=Restaurant.menu_version + 1)
+        .returning(Restaurant.menu_version)
+    ).scalar_one()
+
+
+def queue_menu_delta(db: Session, restaurant_id: int, delta: dict) -> None:
+    """Send ``delta`` to the restaurant's guests on every worker once ``db`` commits."""
+    enqueue(db, "menu_delta", {"restaurant_id": restaurant_id, "delta": delta})
+
+
+def queue_availability(db: Session, item: MenuItem) -> None:
+    queue_menu_delta(
+        db,
+        item.restaurant_id,
+        {
+            "id": item.id,
+            "is_available": bool(item.is_available),
+            "price_cents": item.price_cents,
+            "price": format_cents(item.price_cents),
+            "version": item.version,
+        },
+    )
+
+
+def menu_item_rows(query) -> list[dict]:
+    items = rows_to_dicts(query.all(), MENU_ITEM_FIELDS)
+    for item in items:
+        item["price"] = format_cents(item["price_cents"])
+    return items
+
+
+def filter_menu_items(query, diet: str | None = None, search: str | None = None):
+    if diet:
+        if diet not in DIET_OPTIONS:
+            raise HTTPException(status_code=400, detail="Invalid diet tag")
+        query = query.filter(MenuItem.diet_tag == diet)
+    if search:
+        query = query.filter(
+            (MenuItem.name.ilike(f"%{search}%"))
+            | (MenuItem.description.ilike(f"%{search}%"))
+        )
+    return query
+
+
+@router.get("/", response_model=list[MenuCategoryOut], dependencies=[Depends(public_rate_limit)])
 def list_menu(
     restaurant_id: int | None = None,
     diet: str | None = None,
     search: str | None = None,
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_public_db),
     user: User | None = Depends(get_optional_user),
-) -> list[MenuCategoryOut]:
+) -> Response:
     restaurant_id = resolve_restaurant_id(restaurant_id, user)
-    if diet and diet not in DIET_OPTIONS:
-        raise HTTPException(status_code=400, detail="Invalid diet tag")
 
-    categories = (
-        db.query(MenuCategory)
-        .filter(MenuCategory.restaurant_id == restaurant_id)
-        .order_by(MenuCategory.sort_order, MenuCategory.id)
-        .all()
-    )
+    def compute() -> list[dict]:
+        categories = (
+            db.query(MenuCategory.id, MenuCategory.name, MenuCategory.sort_order)
+            .filter(MenuCategory.restaurant_id == restaurant_id)
+            .order_by(MenuCategory.sort_order, MenuCategory.id)
+            .all()
+        )
+        items = menu_item_rows(
+            filter_menu_items(
+                db.query(*MENU_ITEM_COLUMNS).filter(MenuItem.restaurant_id == restaurant_id), diet, search
+            ).order_by(MenuItem.id)
+        )
 
-    filtered_categories: list[MenuCategoryOut] = []
-    for category in categories:
-        items = [item for item in category.items if item.restaurant_id == restaurant_id]
-        if diet:
-            items = [item for item in items if item.diet_tag == diet]
-        if search:
-            needle = search.lower()
-            items = [
-                item
-                for item in items
-                if needle in item.name.lower()
-                or (item.description and needle in item.description.lower())
-            ]
-        items.sort(key=lambda item: item.id)
-        if items:
-            filtered_categories.append(
-                MenuCategoryOut(
-                    id=category.id,
-                    name=category.name,
-                    sort_order=category.sort_order,
-                    items=items,
-                )
-            )
+        grouped: dict[int | None, list[dict]] = {}
+        for item in items:
+            grouped.setdefault(item["category_id"], []).append(item)
 
-    uncategorized = (
-        db.query(MenuItem)
-        .filter(MenuItem.restaurant_id == restaurant_id)
-        .filter(MenuItem.category_id.is_(None))
-        .order_by(MenuItem.id)
-        .all()
-    )
-    if diet:
-        uncategorized = [item for item in uncategorized if item.diet_tag == diet]
-    if search:
-        needle = search.lower()
-        uncategorized = [
-            item
-            for item in uncategorized
-            if needle in item.name.lower()
-            or (item.description and needle in item.description.lower())
+        menu = [
+            {"id": category.id, "name": category.name, "sort_order": category.sort_order, "items": grouped[category.id]}
+            for category in categories
+            if category.id in grouped
         ]
-    if uncategorized:
-        filtered_categories.append(
-            MenuCategoryOut(id=0, name="Other", sort_order=999, items=uncategorized)
-        )
-    return filtered_categories
+        if None in grouped:
+            menu.append({"id": 0, "name": "Other", "sort_order": 999, "items": grouped[None]})
+        return menu
+
+    # Free-text searches are too varied to be worth caching.
+    if search:
+        return json_response(compute())
+    return json_response(cache.get_or_set(restaurant_id, f"menu:{diet or 'all'}", compute, tags=("menu",)))
 
 
-@router.get("/items", response_model=list[MenuItemOut])
+@router.get("/items", response_model=list[MenuItemOut], dependencies=[Depends(public_rate_limit)])
 def list_menu_items(
     restaurant_id: int | None = None,
     category_id: int | None = None,
     available_only: bool = False,
     diet: str | None = None,
     search: str | None = None,
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_public_db),
     user: User | None = Depends(get_optional_user),
-) -> list[MenuItem]:
+) -> Response:
     restaurant_id = resolve_restaurant_id(restaurant_id, user)
-    query = db.query(MenuItem).filter(MenuItem.restaurant_id == restaurant_id)
+    query = db.query(*MENU_ITEM_COLUMNS).filter(MenuItem.restaurant_id == restaurant_id)
     if category_id is not None:
         query = query.filter(MenuItem.category_id == category_id)
     if available_only:
         query = query.filter(MenuItem.is_available.is_(True))
-    if diet:
-        if diet not in DIET_OPTIONS:
-            raise HTTPException(status_code=400, detail="Invalid diet tag")
-        query = query.filter(MenuItem.diet_tag == diet)
-    if search:
-        query = query.filter(
-            (MenuItem.name.ilike(f"%{search}%"))
-            | (MenuItem.description.ilike(f"%{search}%"))
+    query = filter_menu_items(query, diet, search)
+    return json_response(menu_item_rows(query.order_by(MenuItem.id)))
+
+
+@router.get("/changes", dependencies=[Depends(public_rate_limit)])
+def menu_changes(
+    since: int = 0,
+    restaurant_id: int | None = None,
+    db: Session = Depends(get_public_db),
+    user: User | None = Depends(get_optional_user),
+) -> Response:
+    """Items and categories changed after menu version ``since``, plus deletions.
+
+    ``since=0`` (or a version newer than the server's) returns the whole menu
+    with ``full: true``; clients replace their copy instead of merging.
+    """
+    restaurant_id = resolve_restaurant_id(restaurant_id, user)
+    # Read before the rows: anything committed meanwhile is returned again next time.
+    version = db.query(Restaurant.menu_version).filter(Restaurant.id == restaurant_id).scalar()
+    if version is None:
+        raise HTTPException(status_code=404, detail="Restaurant not found")
+    full = since <= 0 or since > version
+
+    items = db.query(*MENU_ITEM_COLUMNS).filter(MenuItem.restaurant_id == restaurant_id)
+    categories = db.query(MenuCategory.id, MenuCategory.name, MenuCategory.sort_order).filter(
+        MenuCategory.restaurant_id == restaurant_id
+    )
+    deleted: dict[str, list[int]] = {"items": [], "categories": []}
+    if not full:
+        items = items.filter(MenuItem.version > since)
+        categories = categories.filter(MenuCategory.version > since)
+        tombstones = (
+            db.query(MenuTombstone.kind, MenuTombstone.entity_id)
+            .filter(MenuTombstone.restaurant_id == restaurant_id)
+            .filter(MenuTombstone.version > since)
+            .all()
         )
-    return query.order_by(MenuItem.id).all()
+        for kind, entity_id in tombstones:
+            deleted["items" if kind == "item" else "categories"].append(entity_id)
+    return json_response(
+        {
+            "version": version,
+            "full": full,
+            "items": menu_item_rows(items.order_by(MenuItem.id)),
+            "categories": rows_to_dicts(
+                categories.order_by(MenuCategory.sort_order, MenuCategory.id).all(), ("id", "name", "sort_order")
+            ),
+            "deleted": deleted,
+        }
+    )
 
 
-@router.get("/items/{item_id}", response_model=MenuItemOut)
+@router.get("/items/{item_id}", response_model=MenuItemOut, dependencies=[Depends(public_rate_limit)])
 def get_menu_item(
     item_id: int,
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_public_db),
     user: User | None = Depends(get_optional_user),
     restaurant_id: int | None = None,
-) -> MenuItem:
+) -> Response:
     restaurant_id = resolve_restaurant_id(restaurant_id, user)
-    item = (
-        db.query(MenuItem)
+    items = menu_item_rows(
+        db.query(*MENU_ITEM_COLUMNS)
         .filter(MenuItem.id == item_id)
         .filter(MenuItem.restaurant_id == restaurant_id)
-        .first()
+        .limit(1)
     )
-    if not item:
+    if not items:
         raise HTTPException(status_code=404, detail="Menu item not found")
-    return item
+    return json_response(items[0])
 
 
 @router.post("/items", response_model=MenuItemOut, status_code=201)
@@ -204,12 +291,18 @@ def create_menu_item(
         category_id=payload.category_id,
         name=payload.name,
         description=payload.description,
-        price=payload.price,
+        price_cents=to_cents(payload.price),
         is_available=payload.is_available,
         diet_tag=payload.diet_tag,
+        version=next_menu_version(db, owner.restaurant_id),
     )
     db.add(item)
+    db.flush()
+    queue_purge(db, menu_key(owner.restaurant_id))
+    queue_availability(db, item)
     db.commit()
+    cache.invalidate(owner.restaurant_id, "menu")
+    outbox.notify()
     db.refresh(item)
     return item
 
@@ -240,9 +333,19 @@ def update_menu_item(
             raise HTTPException(status_code=404, detail="Category not found")
     if payload.diet_tag and payload.diet_tag not in DIET_OPTIONS:
         raise HTTPException(status_code=400, detail="Invalid diet tag")
-    for field, value in payload.model_dump(exclude_unset=True).items():
+    changes = payload.model_dump(exclude_unset=True)
+    price = changes.pop("price", None)
+    if price is not None:
+        changes["price_cents"] = to_cents(price)
+    for field, value in changes.items():
         setattr(item, field, value)
+    item.version = next_menu_version(db, owner.restaurant_id)
+    queue_purge(db, menu_key(owner.restaurant_id))
+    if "is_available" in changes or "price_cents" in changes:
+        queue_availability(db, item)
     db.commit()
+    cache.invalidate(owner.restaurant_id, "menu")
+    outbox.notify()
     db.refresh(item)
     return item
 
@@ -261,26 +364,44 @@ def delete_menu_item(
     )
     if not item:
         raise HTTPException(status_code=404, detail="Menu item not found")
+    version = next_menu_version(db, owner.restaurant_id)
+    db.add(MenuTombstone(restaurant_id=owner.restaurant_id, kind="item", entity_id=item_id, version=version))
     db.delete(item)
+    queue_purge(db, menu_key(owner.restaurant_id))
+    queue_menu_delta(db, owner.restaurant_id, {"id": item_id, "deleted": True, "version": version})
     db.commit()
+    cache.invalidate(owner.restaurant_id, "menu")
+    outbox.notify()
 
 
-@router.get("/categories", response_model=list[MenuCategoryOut])
+@router.get("/categories", response_model=list[MenuCategoryOut], dependencies=[Depends(public_rate_limit)])
 def list_categories(
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_public_db),
     user: User | None = Depends(get_optional_user),
     restaurant_id: int | None = None,
-) -> list[MenuCategoryOut]:
+) -> Response:
     restaurant_id = resolve_restaurant_id(restaurant_id, user)
-    categories = (
-        db.query(MenuCategory)
-        .filter(MenuCategory.restaurant_id == restaurant_id)
-        .order_by(MenuCategory.sort_order, MenuCategory.id)
-        .all()
-    )
-    for category in categories:
-        category.items.sort(key=lambda item: item.id)
-    return categories
+
+    def compute() -> list[dict]:
+        categories = (
+            db.query(MenuCategory.id, MenuCategory.name, MenuCategory.sort_order)
+            .filter(MenuCategory.restaurant_id == restaurant_id)
+            .order_by(MenuCategory.sort_order, MenuCategory.id)
+            .all()
+        )
+        grouped: dict[int, list[dict]] = {category.id: [] for category in categories}
+        if grouped:
+            items = menu_item_rows(
+                db.query(*MENU_ITEM_COLUMNS).filter(MenuItem.category_id.in_(list(grouped))).order_by(MenuItem.id)
+            )
+            for item in items:
+                grouped[item["category_id"]].append(item)
+        return [
+            {"id": category.id, "name": category.name, "sort_order": category.sort_order, "items": grouped[category.id]}
+            for category in categories
+        ]
+
+    return json_response(cache.get_or_set(restaurant_id, "categories", compute, tags=("menu",)))
 
 
 @router.post("/categories", response_model=MenuCategoryOut, status_code=201)
@@ -301,9 +422,13 @@ def create_category(
         name=payload.name,
         sort_order=payload.sort_order,
         restaurant_id=owner.restaurant_id,
+        version=next_menu_version(db, owner.restaurant_id),
     )
     db.add(category)
+    queue_purge(db, menu_key(owner.restaurant_id))
     db.commit()
+    cache.invalidate(owner.restaurant_id, "menu")
+    outbox.notify()
     db.refresh(category)
     return category
 
@@ -325,7 +450,11 @@ def update_category(
         raise HTTPException(status_code=404, detail="Category not found")
     for field, value in payload.model_dump(exclude_unset=True).items():
         setattr(category, field, value)
+    category.version = next_menu_version(db, owner.restaurant_id)
+    queue_purge(db, menu_key(owner.restaurant_id))
     db.commit()
+    cache.invalidate(owner.restaurant_id, "menu")
+    outbox.notify()
     db.refresh(category)
     return category
 
@@ -344,7 +473,13 @@ def delete_category(
     )
     if not category:
         raise HTTPException(status_code=404, detail="Category not found")
+    version = next_menu_version(db, owner.restaurant_id)
     for item in category.items:
         item.category_id = None
+        item.version = version
+    db.add(MenuTombstone(restaurant_id=owner.restaurant_id, kind="category", entity_id=category_id, version=version))
     db.delete(category)
+    queue_purge(db, menu_key(owner.restaurant_id))
     db.commit()
+    cache.invalidate(owner.restaurant_id, "menu")
+    outbox.notify()
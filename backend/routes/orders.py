@@ -1,14 +1,33 @@
+import asyncio
 from datetime import datetime
-from fastapi import APIRouter, Depends, HTTPException
-from pydantic import BaseModel
+from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi.responses import Response
+from pydantic import BaseModel, computed_field
 from sqlalchemy.orm import Session
 
 from auth import require_owner
-from database import get_db
-from models import Order, OrderItem, MenuItem, Table, User
+from cache import cache
+from database import SessionLocal, get_db
+from idempotency import encode_response, fingerprint, idempotency, request_key
+from ingest import order_ingest, persist_order
+from kitchen import ACTIVE_STATUSES, kitchen_board, order_to_dict
+from money import format_cents
+from prep_stats import prep_stats
+from ratelimit import order_rate_limit, restaurant_rate_limit
+from serializers import json_response, rows_to_dicts
+from totals import apply_totals
+from models import (
+    ArchivedOrder, ArchivedOrderItem, IdempotencyKey, Order, OrderItem, OrderStatusEvent, MenuItem, Table, User
+)
+from outbox import enqueue, outbox
+from tabs import remove_order, restore_order
 from ws import manager
 
 router = APIRouter(prefix="/orders", tags=["orders"])
+
+outbox.register("order_created", manager.broadcast)
+outbox.register("order_status", manager.broadcast)
+
 ALLOWED_STATUSES = {"pending", "in_progress", "ready", "completed", "cancelled"}
 
 
@@ -36,12 +55,17 @@ class OrderItemOut(BaseModel):
     id: int
     menu_item_id: int
     quantity: int
-    unit_price: float
+    unit_price_cents: int
     special_instructions: str | None
     menu_item: MenuItemSnapshot | None = None
 
     model_config = {"from_attributes": True}
 
+    @computed_field
+    @property
+    def unit_price(self) -> float:
+        return format_cents(self.unit_price_cents)
+
 
 class OrderOut(BaseModel):
     id: int
@@ -49,62 +73,145 @@ class OrderOut(BaseModel):
     table_id: int | None
     restaurant_id: int
     notes: str | None
+    subtotal_cents: int
+    item_count: int
+    line_count: int
     created_at: datetime
     updated_at: datetime
     items: list[OrderItemOut]
 
     model_config = {"from_attributes": True}
 
+    @computed_field
+    @property
+    def subtotal(self) -> float:
+        return format_cents(self.subtotal_cents)
+
 
 class OrderStatusUpdate(BaseModel):
     status: str
 
 
+ORDER_FIELDS = (
+    "id", "status", "table_id", "restaurant_id", "notes", "subtotal_cents", "item_count", "line_count", "created_at",
+    "updated_at",
+)
+ORDER_COLUMNS = tuple(getattr(Order, field) for field in ORDER_FIELDS)
+
+
+def order_rows(db: Session, query, order_model=Order, item_model=OrderItem) -> list[dict]:
+    """Serialize ``query`` (a filtered ``Order`` query) from two column projections.
+
+    Pass ``ArchivedOrder``/``ArchivedOrderItem`` to read from the archive tables.
+    """
+    columns = ORDER_COLUMNS if order_model is Order else tuple(getattr(order_model, field) for field in ORDER_FIELDS)
+    orders = rows_to_dicts(query.with_entities(*columns).all(), ORDER_FIELDS)
+    if not orders:
+        return []
+    by_id = {}
+    for order in orders:
+        order["subtotal"] = format_cents(order["subtotal_cents"])
+        order["items"] = []
+        by_id[order["id"]] = order
+
+    items = (
+        db.query(
+            item_model.order_id,
+            item_model.id,
+            item_model.menu_item_id,
+            item_model.quantity,
+            item_model.unit_price_cents,
+            item_model.special_instructions,
+            MenuItem.name,
+        )
+        .outerjoin(MenuItem, MenuItem.id == item_model.menu_item_id)
+        .filter(item_model.order_id.in_(query.with_entities(order_model.id).subquery().select()))
+        .order_by(item_model.id)
+        .all()
+    )
+    for order_id, item_id, menu_item_id, quantity, unit_price_cents, instructions, name in items:
+        by_id[order_id]["items"].append(
+            {
+                "id": item_id,
+                "menu_item_id": menu_item_id,
+                "quantity": quantity,
+                "unit_price_cents": unit_price_cents,
+                "unit_price": format_cents(unit_price_cents),
+                "special_instructions": instructions,
+                "menu_item": {"id": menu_item_id, "name": name} if name is not None else None,
+            }
+        )
+    return orders
+
+
 @router.get("/", response_model=list[OrderOut])
 def list_orders(
     status: str | None = None,
     db: Session = Depends(get_db),
     owner: User = Depends(require_owner),
-) -> list[Order]:
+) -> Response:
     query = db.query(Order).filter(Order.restaurant_id == owner.restaurant_id)
     if status:
         query = query.filter(Order.status == status)
-    return query.order_by(Order.id.desc()).all()
+    return json_response(order_rows(db, query.order_by(Order.id.desc())))
 
 
 @router.get("/history", response_model=list[OrderOut])
 def order_history(
     limit: int = 50, db: Session = Depends(get_db), owner: User = Depends(require_owner)
-) -> list[Order]:
-    return (
+) -> Response:
+    query = (
         db.query(Order)
         .filter(Order.restaurant_id == owner.restaurant_id)
         .order_by(Order.id.desc())
         .limit(limit)
-        .all()
+    )
+    return json_response(order_rows(db, query))
+
+
+def load_active_orders(restaurant_id: int) -> list[dict]:
+    db = SessionLocal()
+    try:
+        query = (
+            db.query(Order)
+            .filter(Order.restaurant_id == restaurant_id)
+            .filter(Order.status.in_(ACTIVE_STATUSES))
+        )
+        return order_rows(db, query)
+    finally:
+        db.close()
+
+
+@router.get("/active", response_model=list[OrderOut])
+def active_orders(owner: User = Depends(require_owner)) -> Response:
+    """Live kitchen board, served from memory once loaded."""
+    return Response(
+        content=kitchen_board.snapshot(owner.restaurant_id, load_active_orders), media_type="application/json"
     )
 
 
 @router.get("/{order_id}", response_model=OrderOut)
-def get_order(order_id: int, db: Session = Depends(get_db), owner: User = Depends(require_owner)) -> Order:
-    order = (
+def get_order(order_id: int, db: Session = Depends(get_db), owner: User = Depends(require_owner)) -> Response:
+    query = (
         db.query(Order)
         .filter(Order.id == order_id)
         .filter(Order.restaurant_id == owner.restaurant_id)
-        .first()
     )
-    if not order:
+    orders = order_rows(db, query)
+    if not orders:
+        archived = (
+            db.query(ArchivedOrder)
+            .filter(ArchivedOrder.id == order_id)
+            .filter(ArchivedOrder.restaurant_id == owner.restaurant_id)
+        )
+        orders = order_rows(db, archived, ArchivedOrder, ArchivedOrderItem)
+    if not orders:
         raise HTTPException(status_code=404, detail="Order not found")
-    return order
-
+    return json_response(orders[0])
 
-@router.post("/", response_model=OrderOut, status_code=201)
-async def create_order(payload: OrderCreate, db: Session = Depends(get_db)) -> Order:
-    if not payload.items:
-        raise HTTPException(status_code=400, detail="Order must include items")
 
+def order_restaurant_id(payload: OrderCreate, db: Session) -> int:
     restaurant_id = payload.restaurant_id
-    table = None
     if payload.table_id is not None:
         table = db.query(Table).filter(Table.id == payload.table_id).first()
         if not table:
@@ -113,15 +220,20 @@ async def create_order(payload: OrderCreate, db: Session = Depends(get_db)) -> O
 
     if not restaurant_id:
         raise HTTPException(status_code=400, detail="restaurant_id is required")
+    return restaurant_id
+
 
+def build_order(payload: OrderCreate, db: Session) -> Order:
+    if not payload.items:
+        raise HTTPException(status_code=400, detail="Order must include items")
+
+    restaurant_id = order_restaurant_id(payload, db)
     order = Order(
         status="pending",
         table_id=payload.table_id,
         restaurant_id=restaurant_id,
         notes=payload.notes,
     )
-    db.add(order)
-    db.flush()
 
     for item in payload.items:
         if item.quantity <= 0:
@@ -134,26 +246,81 @@ async def create_order(payload: OrderCreate, db: Session = Depends(get_db)) -> O
         )
         if not menu_item:
             raise HTTPException(status_code=404, detail=f"Menu item {item.menu_item_id} not found")
-        order_item = OrderItem(
-            order_id=order.id,
-            menu_item_id=menu_item.id,
-            quantity=item.quantity,
-            unit_price=float(menu_item.price),
-            special_instructions=item.special_instructions,
+        if not menu_item.is_available:
+            raise HTTPException(status_code=409, detail=f"Menu item {item.menu_item_id} is unavailable")
+        order.items.append(
+            OrderItem(
+                menu_item_id=menu_item.id,
+                quantity=item.quantity,
+                unit_price_cents=menu_item.price_cents,
+                special_instructions=item.special_instructions,
+            )
         )
-        db.add(order_item)
+    apply_totals(order)
+    order.status_events.append(OrderStatusEvent(restaurant_id=restaurant_id, from_status=None, to_status="pending"))
+    return order
+
 
+def persist_direct(db: Session, order: Order) -> dict:
+    persist_order(db, order)
     db.commit()
     db.refresh(order)
-    try:
-        await manager.broadcast({"type": "order_created", "order_id": order.id})
-    except Exception:
-        pass
+    return order_to_dict(order)
+
+
+async def place_order(
+    request: Request, payload: OrderCreate, db: Session, idempotency_key: IdempotencyKey | None = None
+) -> Order:
+    order_rate_limit(request, payload.table_id)
+    order = build_order(payload, db)
+    restaurant_rate_limit(order.restaurant_id)
+    if idempotency_key is not None:
+        order.idempotency_key = idempotency_key
+
+    if order_ingest.running:
+        db.close()
+        order = await order_ingest.submit(order)
+        shaped = order_to_dict(order)
+    else:
+        # A thread, not the event loop: the tab row lock can wait on other orders at the table.
+        shaped = await asyncio.to_thread(persist_direct, db, order)
+    outbox.notify()
+    # The INCR on Redis blocks; keep it off the event loop.
+    await asyncio.to_thread(cache.invalidate, order.restaurant_id, "analytics")
+    kitchen_board.apply(shaped)
     return order
 
 
+@router.post("/", response_model=OrderOut, status_code=201)
+async def create_order(request: Request, payload: OrderCreate, db: Session = Depends(get_db)) -> Order:
+    """Place an order; with an ``Idempotency-Key`` header, repeats return the first response."""
+    key = request_key(request) if idempotency.enabled else None
+    if key is None:
+        return await place_order(request, payload, db)
+
+    # Keys are per restaurant, so one tenant's client can't replay another's order.
+    restaurant_id = await asyncio.to_thread(order_restaurant_id, payload, db)
+    request_hash = fingerprint(payload.model_dump())
+
+    async def create() -> dict:
+        order = await place_order(
+            request,
+            payload,
+            db,
+            IdempotencyKey(restaurant_id=restaurant_id, key=key, request_hash=request_hash),
+        )
+        # The same shape persist_order stored on the key row.
+        return encode_response(order_to_dict(order))
+
+    response, replayed = await idempotency.run(restaurant_id, key, request_hash, create)
+    result = json_response(response, status_code=201)
+    if replayed:
+        result.headers["Idempotent-Replayed"] = "true"
+    return result
+
+
 @router.patch("/{order_id}/status", response_model=OrderOut)
-async def update_order_status(
+def update_order_status(
     order_id: int,
     payload: OrderStatusUpdate,
     db: Session = Depends(get_db),
@@ -169,14 +336,37 @@ async def update_order_status(
     )
     if not order:
         raise HTTPException(status_code=404, detail="Order not found")
+    previous_status = order.status
+    previous_at = order.updated_at or order.created_at
+    now = datetime.utcnow()
     order.status = payload.status
-    order.updated_at = datetime.utcnow()
+    order.updated_at = now
+    if payload.status != previous_status:
+        db.add(
+            OrderStatusEvent(
+                order_id=order.id,
+                restaurant_id=order.restaurant_id,
+                from_status=previous_status,
+                to_status=payload.status,
+                created_at=now,
+            )
+        )
+        if payload.status == "cancelled":
+            remove_order(db, order)
+        elif previous_status == "cancelled":
+            restore_order(db, order)
+    enqueue(db, "order_status", {"type": "order_status", "order_id": order.id, "status": payload.status})
     db.commit()
     db.refresh(order)
-    try:
-        await manager.broadcast(
-            {"type": "order_status", "order_id": order.id, "status": order.status}
+    outbox.notify()
+    cache.invalidate(order.restaurant_id, "analytics")
+    if payload.status != previous_status and previous_at is not None:
+        prep_stats.observe(
+            order.restaurant_id,
+            previous_status,
+            payload.status,
+            (now - previous_at).total_seconds(),
+            (now - (order.created_at or previous_at)).total_seconds(),
         )
-    except Exception:
-        pass
+    kitchen_board.apply(order_to_dict(order))
     return order
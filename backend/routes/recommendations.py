@@ -1,13 +1,21 @@
+import os
+
 from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import Response
 from pydantic import BaseModel
 from sqlalchemy.orm import Session
 from sqlalchemy import func, desc
 
-from database import get_db
+from cache import cache
+from database import get_public_db
+from ratelimit import public_rate_limit
+from serializers import json_response
 from models import MenuItem, OrderItem
 
 router = APIRouter(prefix="/recommendations", tags=["recommendations"])
 
+RECOMMENDATIONS_CACHE_SECONDS = float(os.getenv("RECOMMENDATIONS_CACHE_SECONDS", "60"))
+
 
 class TrendingItem(BaseModel):
     id: int
@@ -21,58 +29,70 @@ class FbtItem(BaseModel):
     together: int
 
 
-@router.get("/trending", response_model=list[TrendingItem])
+@router.get("/trending", response_model=list[TrendingItem], dependencies=[Depends(public_rate_limit)])
 def trending_items(
-    restaurant_id: int, limit: int = 5, db: Session = Depends(get_db)
-) -> list[TrendingItem]:
-    rows = (
-        db.query(
-            MenuItem.id,
-            MenuItem.name,
-            func.coalesce(func.sum(OrderItem.quantity), 0).label("orders"),
+    restaurant_id: int, limit: int = 5, db: Session = Depends(get_public_db)
+) -> Response:
+    def compute() -> list[dict]:
+        rows = (
+            db.query(
+                MenuItem.id,
+                MenuItem.name,
+                func.coalesce(func.sum(OrderItem.quantity), 0).label("orders"),
+            )
+            .join(OrderItem, OrderItem.menu_item_id == MenuItem.id)
+            .filter(MenuItem.restaurant_id == restaurant_id)
+            .group_by(MenuItem.id)
+            .order_by(desc("orders"))
+            .limit(limit)
+            .all()
         )
-        .join(OrderItem, OrderItem.menu_item_id == MenuItem.id)
-        .filter(MenuItem.restaurant_id == restaurant_id)
-        .group_by(MenuItem.id)
-        .order_by(desc("orders"))
-        .limit(limit)
-        .all()
+        return [{"id": row.id, "name": row.name, "orders": int(row.orders)} for row in rows]
+
+    data = cache.get_or_set(
+        restaurant_id, f"trending:{limit}", compute, ttl=RECOMMENDATIONS_CACHE_SECONDS, tags=("menu",)
     )
-    return [TrendingItem(id=row.id, name=row.name, orders=int(row.orders)) for row in rows]
+    return json_response(data)
 
 
-@router.get("/fbt", response_model=list[FbtItem])
+@router.get("/fbt", response_model=list[FbtItem], dependencies=[Depends(public_rate_limit)])
 def frequently_bought_together(
-    restaurant_id: int, item_id: int, limit: int = 5, db: Session = Depends(get_db)
-) -> list[FbtItem]:
-    exists = (
-        db.query(MenuItem)
-        .filter(MenuItem.id == item_id)
-        .filter(MenuItem.restaurant_id == restaurant_id)
-        .first()
-    )
-    if not exists:
-        raise HTTPException(status_code=404, detail="Menu item not found")
+    restaurant_id: int, item_id: int, limit: int = 5, db: Session = Depends(get_public_db)
+) -> Response:
+    def compute() -> list[dict]:
+        exists = (
+            db.query(MenuItem)
+            .filter(MenuItem.id == item_id)
+            .filter(MenuItem.restaurant_id == restaurant_id)
+            .first()
+        )
+        if not exists:
+            raise HTTPException(status_code=404, detail="Menu item not found")
 
-    order_ids = (
-        db.query(OrderItem.order_id)
-        .filter(OrderItem.menu_item_id == item_id)
-        .subquery()
-    )
+        order_ids = (
+            db.query(OrderItem.order_id)
+            .filter(OrderItem.menu_item_id == item_id)
+            .subquery()
+        )
 
-    rows = (
-        db.query(
-            MenuItem.id,
-            MenuItem.name,
-            func.coalesce(func.sum(OrderItem.quantity), 0).label("together"),
+        rows = (
+            db.query(
+                MenuItem.id,
+                MenuItem.name,
+                func.coalesce(func.sum(OrderItem.quantity), 0).label("together"),
+            )
+            .join(OrderItem, OrderItem.menu_item_id == MenuItem.id)
+            .filter(MenuItem.restaurant_id == restaurant_id)
+            .filter(OrderItem.order_id.in_(order_ids))
+            .filter(MenuItem.id != item_id)
+            .group_by(MenuItem.id)
+            .order_by(desc("together"))
+            .limit(limit)
+            .all()
         )
-        .join(OrderItem, OrderItem.menu_item_id == MenuItem.id)
-        .filter(MenuItem.restaurant_id == restaurant_id)
-        .filter(OrderItem.order_id.in_(order_ids))
-        .filter(MenuItem.id != item_id)
-        .group_by(MenuItem.id)
-        .order_by(desc("together"))
-        .limit(limit)
-        .all()
+        return [{"id": row.id, "name": row.name, "together": int(row.together)} for row in rows]
+
+    data = cache.get_or_set(
+        restaurant_id, f"fbt:{item_id}:{limit}", compute, ttl=RECOMMENDATIONS_CACHE_SECONDS, tags=("menu",)
     )
-    return [FbtItem(id=row.id, name=row.name, together=int(row.together)) for row in rows]
+    return json_response(data)
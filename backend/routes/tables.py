@@ -8,8 +8,13 @@ from pydantic import BaseModel
 from sqlalchemy.orm import Session
 
 from auth import require_owner
-from database import get_db
-from models import Table, User
+from database import get_db, get_public_db
+from edge import queue_purge, table_key, tables_key
+from ratelimit import public_rate_limit
+from serializers import json_response, rows_to_dicts
+from models import Table, TableTab, User
+from outbox import outbox
+from tabs import close_tab, tab_to_dict
 
 router = APIRouter(prefix="/tables", tags=["tables"])
 
@@ -29,33 +34,38 @@ class TableCreate(BaseModel):
     label: str
 
 
+TABLE_FIELDS = ("id", "label", "code", "restaurant_id")
+TABLE_COLUMNS = tuple(getattr(Table, field) for field in TABLE_FIELDS)
+
+
 @router.get("/", response_model=list[TableOut])
-def list_tables(db: Session = Depends(get_db), owner: User = Depends(require_owner)) -> list[Table]:
-    return (
-        db.query(Table)
+def list_tables(db: Session = Depends(get_public_db), owner: User = Depends(require_owner)) -> Response:
+    rows = (
+        db.query(*TABLE_COLUMNS)
         .filter(Table.restaurant_id == owner.restaurant_id)
         .order_by(Table.id)
         .all()
     )
+    return json_response(rows_to_dicts(rows, TABLE_FIELDS))
 
 
-@router.get("/public", response_model=list[TableOut])
+@router.get("/public", response_model=list[TableOut], dependencies=[Depends(public_rate_limit)])
 def list_tables_public(
     restaurant_id: int | None = None,
-    db: Session = Depends(get_db),
-) -> list[Table]:
-    query = db.query(Table).order_by(Table.id)
+    db: Session = Depends(get_public_db),
+) -> Response:
+    query = db.query(*TABLE_COLUMNS).order_by(Table.id)
     if restaurant_id:
         query = query.filter(Table.restaurant_id == restaurant_id)
-    return query.all()
+    return json_response(rows_to_dicts(query.all(), TABLE_FIELDS))
 
 
-@router.get("/lookup", response_model=TableOut)
-def lookup_table(code: str, db: Session = Depends(get_db)) -> Table:
-    table = db.query(Table).filter(Table.code == code).first()
-    if not table:
+@router.get("/lookup", response_model=TableOut, dependencies=[Depends(public_rate_limit)])
+def lookup_table(code: str, db: Session = Depends(get_public_db)) -> Response:
+    row = db.query(*TABLE_COLUMNS).filter(Table.code == code).first()
+    if not row:
         raise HTTPException(status_code=404, detail="Table not found")
-    return table
+    return json_response(dict(zip(TABLE_FIELDS, row)))
 
 
 @router.post("/", response_model=TableOut, status_code=201)
@@ -65,13 +75,28 @@ def create_table(
     code = uuid.uuid4().hex[:10]
     table = Table(label=payload.label, code=code, restaurant_id=owner.restaurant_id)
     db.add(table)
+    queue_purge(db, tables_key(owner.restaurant_id), "tables")
     db.commit()
+    outbox.notify()
     db.refresh(table)
     return table
 
 
+@router.get("/floor")
+def floor(db: Session = Depends(get_db), owner: User = Depends(require_owner)) -> Response:
+    """Every table with its open tab (``null`` when nothing is owed), in one query."""
+    rows = (
+        db.query(Table.id, Table.label, Table.code, Table.restaurant_id, TableTab)
+        .outerjoin(TableTab, (TableTab.table_id == Table.id) & (TableTab.status == "open"))
+        .filter(Table.restaurant_id == owner.restaurant_id)
+        .order_by(Table.id)
+        .all()
+    )
+    return json_response([{**dict(zip(TABLE_FIELDS, row[:4])), "tab": tab_to_dict(row[4])} for row in rows])
+
+
 @router.get("/{table_id}", response_model=TableOut)
-def get_table(table_id: int, db: Session = Depends(get_db), owner: User = Depends(require_owner)) -> Table:
+def get_table(table_id: int, db: Session = Depends(get_public_db), owner: User = Depends(require_owner)) -> Table:
     table = (
         db.query(Table)
         .filter(Table.id == table_id)
@@ -93,12 +118,38 @@ def delete_table(table_id: int, db: Session = Depends(get_db), owner: User = Dep
     )
     if not table:
         raise HTTPException(status_code=404, detail="Table not found")
+    queue_purge(db, tables_key(owner.restaurant_id), "tables", table_key(table_id))
     db.delete(table)
     db.commit()
+    outbox.notify()
+
+
+@router.get("/{table_id}/tab")
+def get_tab(table_id: int, db: Session = Depends(get_db), owner: User = Depends(require_owner)) -> Response:
+    tab = (
+        db.query(TableTab)
+        .filter(TableTab.table_id == table_id)
+        .filter(TableTab.restaurant_id == owner.restaurant_id)
+        .filter(TableTab.status == "open")
+        .first()
+    )
+    if not tab:
+        raise HTTPException(status_code=404, detail="No open tab for this table")
+    return json_response(tab_to_dict(tab))
+
+
+@router.post("/{table_id}/tab/close")
+def settle_tab(table_id: int, db: Session = Depends(get_db), owner: User = Depends(require_owner)) -> Response:
+    """Settle the bill; the table's next order opens a new tab."""
+    tab = close_tab(db, owner.restaurant_id, table_id)
+    if not tab:
+        raise HTTPException(status_code=404, detail="No open tab for this table")
+    db.commit()
+    return json_response(tab_to_dict(tab))
 
 
-@router.get("/{table_id}/qr")
-def table_qr(table_id: int, db: Session = Depends(get_db)) -> Response:
+@router.get("/{table_id}/qr", dependencies=[Depends(public_rate_limit)])
+def table_qr(table_id: int, db: Session = Depends(get_public_db)) -> Response:
     """Public endpoint to generate QR code for a table."""
     table = db.query(Table).filter(Table.id == table_id).first()
     if not table:
@@ -0,0 +1,43 @@
+import json
+from datetime import datetime
+from decimal import Decimal
+
+from fastapi.responses import Response
+
+try:
+    import orjson
+except Exception:
+    orjson = None
+
+
+def _default(value):
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def dumps(data) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(data, default=_default)
+    return json.dumps(data, default=_default, separators=(",", ":")).encode("utf-8")
+
+
+def loads(data: bytes | str):
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def json_response(data, status_code: int = 200) -> Response:
+    """Encode already-shaped rows once, skipping ``response_model`` revalidation.
+
+    Routes keep their ``response_model`` for the OpenAPI schema; returning a
+    ``Response`` tells FastAPI the body is final.
+    """
+    return Response(content=dumps(data), status_code=status_code, media_type="application/json")
+
+
+def rows_to_dicts(rows, fields: tuple[str, ...]) -> list[dict]:
+    return [dict(zip(fields, row)) for row in rows]
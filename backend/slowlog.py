@@ -0,0 +1,170 @@
+import hashlib
+import itertools
+import json
+import logging
+import os
+import re
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from sqlalchemy import event
+
+from metrics import current_request
+
+logger = logging.getLogger("slow_query")
+
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "0"))
+SLOW_QUERY_EXPLAIN = os.getenv("SLOW_QUERY_EXPLAIN", "true").lower() == "true"
+SLOW_QUERY_BUFFER_SIZE = int(os.getenv("SLOW_QUERY_BUFFER_SIZE", "200"))
+SLOW_QUERY_EXPLAIN_INTERVAL_S = float(os.getenv("SLOW_QUERY_EXPLAIN_INTERVAL_S", "300"))
+MAX_PENDING_EXPLAINS = 16
+# Plans come from plain EXPLAIN, which never runs the statement. Locking reads
+# and SELECTs calling functions with side effects (advisory locks, sequences,
+# sleeps, notifications) are still skipped outright.
+LOCKING_CLAUSE = re.compile(r"\bFOR\s+(?:NO\s+KEY\s+)?(?:UPDATE|SHARE|KEY\s+SHARE)\b|\bSKIP\s+LOCKED\b|\bNOWAIT\b", re.I)
+SIDE_EFFECT_CALL = re.compile(
+    r"\b(?:pg_advisory\w*|pg_try_advisory\w*|nextval|setval|pg_sleep\w*|pg_notify|pg_terminate_backend"
+    r"|pg_cancel_backend|set_config|lo_\w+|dblink\w*)\s*\(",
+    re.I,
+)
+
+
+def redact(parameters):
+    """Replace bound values with their type (and length for strings/bytes)."""
+    if parameters is None:
+        return None
+    if isinstance(parameters, dict):
+        return {key: redact(value) for key, value in parameters.items()}
+    if isinstance(parameters, (list, tuple)):
+        return [redact(value) for value in parameters]
+    if isinstance(parameters, (str, bytes)):
+        return f"<{type(parameters).__name__}:{len(parameters)}>"
+    return f"<{type(parameters).__name__}>"
+
+
+class SlowQueryLog:
+    def __init__(
+        self,
+        threshold_ms: float = SLOW_QUERY_MS,
+        maxlen: int = SLOW_QUERY_BUFFER_SIZE,
+        explain: bool = SLOW_QUERY_EXPLAIN,
+    ) -> None:
+        self.threshold = threshold_ms / 1000
+        self.explain = explain
+        self.entries: deque[dict] = deque(maxlen=maxlen)
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._explained: dict[str, float] = {}
+        self._pending = 0
+        self._executor: ThreadPoolExecutor | None = None
+
+    @property
+    def enabled(self) -> bool:
+        return self.threshold > 0
+
+    def install(self, engine) -> None:
+        if not self.enabled:
+            return
+
+        @event.listens_for(engine, "before_cursor_execute")
+        def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+            conn.info.setdefault("slowlog_start", []).append(time.perf_counter())
+
+        @event.listens_for(engine, "after_cursor_execute")
+        def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+            elapsed = time.perf_counter() - conn.info["slowlog_start"].pop()
+            if elapsed >= self.threshold:
+                self.record(engine, statement, parameters, elapsed, executemany)
+
+    def record(self, engine, statement: str, parameters, elapsed: float, executemany: bool = False) -> dict:
+        stats = current_request.get()
+        entry = {
+            "id": next(self._ids),
+            "at": datetime.utcnow().isoformat(),
+            "duration_ms": round(elapsed * 1000, 2),
+            "route": stats.route if stats is not None else "background",
+            "statement": statement,
+            "params": redact(parameters),
+            "plan": None,
+            "plan_status": "disabled",
+        }
+        if self.explain and not executemany:
+            entry["plan_status"] = self._schedule_explain(engine, entry, statement, parameters)
+        with self._lock:
+            self.entries.append(entry)
+        logger.warning(
+            json.dumps(
+                {
+                    "event": "slow_query",
+                    "duration_ms": entry["duration_ms"],
+                    "route": entry["route"],
+                    "statement": statement,
+                    "params": entry["params"],
+                }
+            )
+        )
+        return entry
+
+    def _schedule_explain(self, engine, entry: dict, statement: str, parameters) -> str:
+        if not statement.lstrip().lower().startswith("select"):
+            return "skipped: not a select"
+        if LOCKING_CLAUSE.search(statement):
+            return "skipped: locking read"
+        if SIDE_EFFECT_CALL.search(statement):
+            return "skipped: side-effecting function"
+        fingerprint = hashlib.sha1(statement.encode("utf-8")).hexdigest()
+        now = time.monotonic()
+        with self._lock:
+            last = self._explained.get(fingerprint)
+            if last is not None and now - last < SLOW_QUERY_EXPLAIN_INTERVAL_S:
+                return "skipped: explained recently"
+            if self._pending >= MAX_PENDING_EXPLAINS:
+                return "skipped: explain queue full"
+            self._explained[fingerprint] = now
+            self._pending += 1
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="slowlog-explain")
+        self._executor.submit(self._explain, engine, entry, statement, parameters)
+        return "pending"
+
+    def _explain(self, engine, entry: dict, statement: str, parameters) -> None:
+        postgres = engine.dialect.name == "postgresql"
+        if engine.dialect.name == "sqlite":
+            explain_sql = f"EXPLAIN QUERY PLAN {statement}"
+        else:
+            explain_sql = f"EXPLAIN {statement}"
+        try:
+            # Runs on a raw DBAPI cursor so the EXPLAIN itself is never timed or
+            # logged. The connection is discarded afterwards, not returned to the
+            # pool, so no session state it picked up can leak into a request.
+            connection = engine.raw_connection()
+            try:
+                cursor = connection.cursor()
+                if postgres:
+                    cursor.execute("SET TRANSACTION READ ONLY")
+                cursor.execute(explain_sql, parameters or ())
+                rows = cursor.fetchall()
+                cursor.close()
+                connection.rollback()
+            finally:
+                connection.invalidate()
+                connection.close()
+            entry["plan"] = "\n".join(" ".join(str(column) for column in row) for row in rows)
+            entry["plan_status"] = "captured"
+            logger.info(json.dumps({"event": "slow_query_plan", "id": entry["id"], "plan": entry["plan"]}))
+        except Exception as exc:
+            entry["plan_status"] = f"failed: {exc.__class__.__name__}"
+        finally:
+            with self._lock:
+                self._pending -= 1
+
+    def recent(self, limit: int = 50) -> list[dict]:
+        with self._lock:
+            entries = list(self.entries)
+        return entries[::-1][:limit]
+
+
+slow_query_log = SlowQueryLog()
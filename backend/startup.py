@@ -0,0 +1,171 @@
+import importlib
+import logging
+import os
+import time
+from typing import Callable
+
+from sqlalchemy import text
+
+from database import Base, engine, engines
+from metrics import register_gauge
+
+logger = logging.getLogger(__name__)
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# create: Base.metadata.create_all (legacy, dev only); check: verify the Alembic
+# head and fail fast if behind; migrate: upgrade to head under an advisory
+# lock; off: no schema work at all.
+_legacy_mode = "create" if os.getenv("AUTO_CREATE_DB", "true").lower() == "true" else "off"
+STARTUP_SCHEMA_MODE = os.getenv("STARTUP_SCHEMA_MODE", _legacy_mode).lower()
+PRELOAD_MODULES = [name.strip() for name in os.getenv("PRELOAD_MODULES", "").split(",") if name.strip()]
+POOL_PREWARM = int(os.getenv("POOL_PREWARM", "2"))
+WARM_CACHES = os.getenv("WARM_CACHES", "false").lower() == "true"
+SCHEMA_LOCK_ID = 0x51_52_54  # arbitrary, shared by every worker of this app
+
+# Heavy optional imports are deferred to first use by default; listing them in
+# PRELOAD_MODULES moves the cost to boot instead of the first request.
+PRELOADABLE = {
+    "sklearn": ("sklearn.feature_extraction", "sklearn.neighbors"),
+    "qrcode": ("qrcode", "qrcode.image.pil", "PIL.PngImagePlugin"),
+}
+
+timings: dict[str, float] = {}
+state = {"ready": False}
+_warmers: list[tuple[str, Callable[[], None]]] = []
+
+register_gauge(
+    "startup_phase_seconds",
+    "Seconds spent in each startup phase of this worker.",
+    ["phase"],
+    lambda: [({"phase": phase}, seconds) for phase, seconds in timings.items()],
+)
+
+
+def register_warmer(name: str, fn: Callable[[], None]) -> None:
+    """Register a cache warmer that runs at boot when WARM_CACHES=true."""
+    _warmers.append((name, fn))
+
+
+class _phase:
+    def __init__(self, name: str) -> None:
+        self.name = name
+
+    def __enter__(self) -> None:
+        self.started = time.perf_counter()
+
+    def __exit__(self, *exc) -> None:
+        timings[self.name] = round(time.perf_counter() - self.started, 4)
+
+
+def _alembic_config():
+    from alembic.config import Config
+
+    # No ini file: alembic/env.py would otherwise call fileConfig() and
+    # silence uvicorn's loggers in the running worker.
+    config = Config()
+    config.set_main_option("script_location", os.path.join(BACKEND_DIR, "alembic"))
+    config.set_main_option(
+        "sqlalchemy.url", engine.url.render_as_string(hide_password=False).replace("%", "%%")
+    )
+    return config
+
+
+def _schema_revisions(connection) -> tuple[set[str], set[str]]:
+    from alembic.runtime.migration import MigrationContext
+    from alembic.script import ScriptDirectory
+
+    heads = set(ScriptDirectory.from_config(_alembic_config()).get_heads())
+    current = set(MigrationContext.configure(connection).get_current_heads())
+    return current, heads
+
+
+def _advisory_lock(connection) -> None:
+    if connection.dialect.name == "postgresql":
+        connection.execute(text("SELECT pg_advisory_lock(:id)"), {"id": SCHEMA_LOCK_ID})
+
+
+def _advisory_unlock(connection) -> None:
+    if connection.dialect.name == "postgresql":
+        connection.execute(text("SELECT pg_advisory_unlock(:id)"), {"id": SCHEMA_LOCK_ID})
+
+
+def ensure_schema(mode: str = STARTUP_SCHEMA_MODE) -> str:
+    if mode == "off":
+        return "skipped"
+    if mode == "create":
+        Base.metadata.create_all(bind=engine)
+        return "created"
+
+    with engine.connect() as connection:
+        current, heads = _schema_revisions(connection)
+        if current == heads:
+            return "at head"
+        if mode == "check":
+            raise RuntimeError(f"Database schema {sorted(current)} is not at Alembic head {sorted(heads)}")
+        if mode != "migrate":
+            raise ValueError(f"Unknown STARTUP_SCHEMA_MODE {mode!r}")
+
+        # One worker migrates; the rest block on the lock and then find the head.
+        connection.commit()
+        _advisory_lock(connection)
+        try:
+            current, heads = _schema_revisions(connection)
+            connection.commit()
+            if current == heads:
+                return "at head"
+            from alembic import command
+
+            command.upgrade(_alembic_config(), "head")
+            return "migrated"
+        finally:
+            _advisory_unlock(connection)
+            connection.commit()
+
+
+def preload_modules(names: list[str] = PRELOAD_MODULES) -> None:
+    for name in names:
+        with _phase(f"import:{name}"):
+            for module in PRELOADABLE.get(name, (name,)):
+                try:
+                    importlib.import_module(module)
+                except Exception:
+                    logger.warning("could not preload %s", module, exc_info=True)
+
+
+def prewarm_pool(connections: int = POOL_PREWARM) -> None:
+    opened = []
+    try:
+        for pool_engine in engines.values():
+            size = getattr(pool_engine.pool, "size", None)
+            limit = size() if callable(size) else 1
+            for _ in range(max(0, min(connections, limit))):
+                connection = pool_engine.connect()
+                connection.execute(text("SELECT 1"))
+                opened.append(connection)
+    finally:
+        for connection in opened:
+            connection.close()
+
+
+def warm_caches() -> None:
+    for name, fn in _warmers:
+        with _phase(f"warm:{name}"):
+            try:
+                fn()
+            except Exception:
+                logger.warning("cache warmer %s failed", name, exc_info=True)
+
+
+def run_startup() -> None:
+    started = time.perf_counter()
+    with _phase("schema"):
+        outcome = ensure_schema()
+    preload_modules()
+    with _phase("pool_prewarm"):
+        prewarm_pool()
+    if WARM_CACHES:
+        warm_caches()
+    timings["startup_total"] = round(time.perf_counter() - started, 4)
+    state["ready"] = True
+    logger.info("startup complete (schema %s) %s", outcome, timings)
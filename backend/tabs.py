@@ -0,0 +1,126 @@
+"""Running tabs: one open bill per table, kept current as orders commit.
+
+``tab_for_order``/``add_order`` run inside the order's own transaction
+(``persist_order``), and ``remove_order``/``restore_order`` inside the status
+update that cancels or un-cancels an order, so a tab never disagrees with its
+committed orders.
+The open tab's row lock serialises concurrent orders for the same table.
+Reads are a single indexed row per table.
+"""
+from datetime import datetime
+
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from models import MenuItem, Order, TableTab
+from money import format_cents
+
+
+def open_tab(db: Session, restaurant_id: int, table_id: int, create: bool = True) -> TableTab | None:
+    """The table's open tab, locked for update; opened if missing and ``create``."""
+    query = (
+        db.query(TableTab)
+        .filter(TableTab.table_id == table_id)
+        .filter(TableTab.status == "open")
+        .with_for_update()
+    )
+    tab = query.first()
+    if tab is not None or not create:
+        return tab
+    savepoint = db.begin_nested()
+    try:
+        tab = TableTab(restaurant_id=restaurant_id, table_id=table_id, status="open", order_ids=[], items=[])
+        db.add(tab)
+        db.flush()
+        savepoint.commit()
+        return tab
+    except IntegrityError:
+        # Another order opened it first; use theirs.
+        savepoint.rollback()
+        return query.first()
+
+
+def _apply(db: Session, tab: TableTab, order: Order, sign: int) -> None:
+    lines = {line["menu_item_id"]: dict(line) for line in tab.items}
+    missing = {item.menu_item_id for item in order.items} - lines.keys()
+    names = dict(db.query(MenuItem.id, MenuItem.name).filter(MenuItem.id.in_(missing)).all()) if missing else {}
+    for item in order.items:
+        line = lines.setdefault(
+            item.menu_item_id,
+            {"menu_item_id": item.menu_item_id, "name": names.get(item.menu_item_id), "quantity": 0, "total_cents": 0},
+        )
+        line["quantity"] += sign * item.quantity
+        line["total_cents"] += sign * item.quantity * item.unit_price_cents
+    # JSON columns are replaced, not mutated in place, so the change is flushed.
+    tab.items = sorted((line for line in lines.values() if line["quantity"] > 0), key=lambda line: line["menu_item_id"])
+    tab.total_cents += sign * order.subtotal_cents
+    tab.item_count += sign * order.item_count
+    tab.order_ids = [*tab.order_ids, order.id] if sign > 0 else [oid for oid in tab.order_ids if oid != order.id]
+    tab.updated_at = datetime.utcnow()
+
+
+def tab_for_order(db: Session, order: Order) -> TableTab | None:
+    """Open (or lock) the tab a new table order is charged to and link the order to it."""
+    if order.table_id is None:
+        return None
+    tab = open_tab(db, order.restaurant_id, order.table_id)
+    order.tab_id = tab.id
+    return tab
+
+
+def add_order(db: Session, tab: TableTab, order: Order) -> None:
+    """Charge a flushed order to ``tab`` (from ``tab_for_order``)."""
+    _apply(db, tab, order, 1)
+
+
+def _order_tab(db: Session, order: Order) -> TableTab | None:
+    if order.tab_id is None:
+        return None
+    return (
+        db.query(TableTab)
+        .filter(TableTab.id == order.tab_id)
+        .filter(TableTab.status == "open")
+        .with_for_update()
+        .first()
+    )
+
+
+def remove_order(db: Session, order: Order) -> None:
+    """Take a cancelled order off its tab; settled tabs are left as billed."""
+    tab = _order_tab(db, order)
+    if tab is not None and order.id in tab.order_ids:
+        _apply(db, tab, order, -1)
+
+
+def restore_order(db: Session, order: Order) -> None:
+    """Put an un-cancelled order back on its tab while that tab is still open."""
+    tab = _order_tab(db, order)
+    if tab is not None and order.id not in tab.order_ids:
+        _apply(db, tab, order, 1)
+
+
+def close_tab(db: Session, restaurant_id: int, table_id: int) -> TableTab | None:
+    tab = open_tab(db, restaurant_id, table_id, create=False)
+    if tab is None or tab.restaurant_id != restaurant_id:
+        return None
+    tab.status = "closed"
+    tab.closed_at = datetime.utcnow()
+    return tab
+
+
+def tab_to_dict(tab: TableTab | None) -> dict | None:
+    if tab is None:
+        return None
+    return {
+        "id": tab.id,
+        "table_id": tab.table_id,
+        "status": tab.status,
+        "total_cents": tab.total_cents,
+        "total": format_cents(tab.total_cents),
+        "item_count": tab.item_count,
+        "order_ids": tab.order_ids,
+        "items": [{**line, "total": format_cents(line["total_cents"])} for line in tab.items],
+        "opened_at": tab.opened_at,
+        "updated_at": tab.updated_at,
+        "closed_at": tab.closed_at,
+    }
@@ -0,0 +1,109 @@
+"""Stored order totals (``subtotal_cents``, ``item_count``, ``line_count``).
+
+Totals are written with the order in ``build_order``. To verify or repair
+them in bulk against the line items::
+
+    python totals.py            # report mismatches
+    python totals.py --repair   # rewrite mismatched totals
+"""
+import argparse
+
+from sqlalchemy import func, select, update
+from sqlalchemy.orm import Session
+
+from database import SessionLocal
+from models import ArchivedOrder, ArchivedOrderItem, Order, OrderItem
+
+TOTAL_SOURCES = ((Order, OrderItem), (ArchivedOrder, ArchivedOrderItem))
+
+
+def apply_totals(order) -> None:
+    """Set totals on an unsaved ``Order`` from its ``items``."""
+    order.subtotal_cents = sum(item.unit_price_cents * item.quantity for item in order.items)
+    order.item_count = sum(item.quantity for item in order.items)
+    order.line_count = len(order.items)
+
+
+def expected_totals(item_model):
+    """Per-order totals computed from line items, as a subquery."""
+    return (
+        select(
+            item_model.order_id.label("order_id"),
+            func.sum(item_model.quantity * item_model.unit_price_cents).label("subtotal_cents"),
+            func.sum(item_model.quantity).label("item_count"),
+            func.count(item_model.id).label("line_count"),
+        )
+        .group_by(item_model.order_id)
+        .subquery()
+    )
+
+
+def find_mismatches(db: Session, order_model, item_model, after_id: int = 0, limit: int = 5000) -> list:
+    """Orders with ``id > after_id`` whose stored totals disagree with their items."""
+    expected = expected_totals(item_model)
+    subtotal_cents = func.coalesce(expected.c.subtotal_cents, 0)
+    item_count = func.coalesce(expected.c.item_count, 0)
+    line_count = func.coalesce(expected.c.line_count, 0)
+    return db.execute(
+        select(order_model.id, order_model.subtotal_cents, subtotal_cents, item_count, line_count)
+        .outerjoin(expected, expected.c.order_id == order_model.id)
+        .where(order_model.id > after_id)
+        .where(
+            (order_model.subtotal_cents != subtotal_cents)
+            | (order_model.item_count != item_count)
+            | (order_model.line_count != line_count)
+        )
+        .order_by(order_model.id)
+        .limit(limit)
+    ).all()
+
+
+def check_totals(repair: bool = False, batch_size: int = 5000) -> dict[str, int]:
+    """Scan hot and archived orders; with ``repair`` rewrite mismatches batch by batch."""
+    report = {}
+    db = SessionLocal()
+    try:
+        for order_model, item_model in TOTAL_SOURCES:
+            mismatched = 0
+            after_id = 0
+            while True:
+                rows = find_mismatches(db, order_model, item_model, after_id, batch_size)
+                if not rows:
+                    break
+                mismatched += len(rows)
+                after_id = rows[-1][0]
+                if repair:
+                    db.execute(
+                        update(order_model),
+                        [
+                            {
+                                "id": order_id,
+                                "subtotal_cents": int(subtotal_cents),
+                                "item_count": int(item_count),
+                                "line_count": int(line_count),
+                            }
+                            for order_id, _, subtotal_cents, item_count, line_count in rows
+                        ],
+                    )
+                    db.commit()
+            report[order_model.__tablename__] = mismatched
+    finally:
+        db.close()
+    return report
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repair", action="store_true", help="rewrite mismatched totals")
+    parser.add_argument("--batch-size", type=int, default=5000)
+    args = parser.parse_args()
+    report = check_totals(repair=args.repair, batch_size=args.batch_size)
+    action = "repaired" if args.repair else "mismatched"
+    for table, count in report.items():
+        print(f"{table}: {count} {action}")
+    if not args.repair and any(report.values()):
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,21 +1,432 @@
-from fastapi import WebSocket
+import asyncio
+import logging
+import os
+import threading
+import time
+
+from fastapi import WebSocket, WebSocketDisconnect
+
+from metrics import Counter, Histogram, register_gauge, registry, timed, ws_broadcast_fanout, ws_broadcast_latency
+from serializers import dumps, loads
+
+logger = logging.getLogger(__name__)
+
+try:
+    import msgpack
+except Exception:
+    msgpack = None
+
+MENU_WS_COALESCE_MS = float(os.getenv("MENU_WS_COALESCE_MS", "250"))
+MENU_WS_MAX_CONNECTIONS = int(os.getenv("MENU_WS_MAX_CONNECTIONS", "10000"))
+MENU_WS_SEND_TIMEOUT_S = float(os.getenv("MENU_WS_SEND_TIMEOUT_S", "2"))
+# memory: deltas reach guests on this worker only; redis: published on
+# MENU_WS_CHANNEL so every worker's guests get them.
+MENU_WS_BACKEND = os.getenv("MENU_WS_BACKEND", "memory").lower()
+MENU_WS_CHANNEL = os.getenv("MENU_WS_CHANNEL", "menu-deltas")
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+WS_MAX_CONNECTIONS = int(os.getenv("WS_MAX_CONNECTIONS", "1000"))
+WS_PING_INTERVAL_S = float(os.getenv("WS_PING_INTERVAL_S", "20"))
+# Should exceed WS_PING_INTERVAL_S so a live client always has a ping to answer.
+WS_IDLE_TIMEOUT_S = float(os.getenv("WS_IDLE_TIMEOUT_S", "60"))
+WS_SEND_TIMEOUT_S = float(os.getenv("WS_SEND_TIMEOUT_S", "2"))
+WS_BATCH_WINDOW_MS = float(os.getenv("WS_BATCH_WINDOW_MS", "50"))
+
+# Sec-WebSocket-Protocol name -> (frame format, batched). No subprotocol means
+# ("json", False), the original one-text-frame-per-event behaviour.
+ORDER_PROTOCOLS = {
+    "orders.json": ("json", False),
+    "orders.json.batch": ("json", True),
+}
+if msgpack is not None:
+    ORDER_PROTOCOLS.update({"orders.msgpack": ("msgpack", False), "orders.msgpack.batch": ("msgpack", True)})
+
+ws_disconnects = registry.register(
+    Counter("ws_disconnects_total", "Closed or rejected WebSocket connections by reason.", ["channel", "reason"])
+)
+ws_lifetime = registry.register(
+    Histogram(
+        "ws_connection_lifetime_seconds",
+        "How long WebSocket connections stay open.",
+        ["channel"],
+        buckets=(1, 10, 60, 300, 900, 1800, 3600, 7200, 14400, 28800, 86400),
+    )
+)
+ws_sent_bytes = registry.register(
+    Counter("ws_sent_bytes_total", "Uncompressed bytes sent to /ws/orders sockets.", ["format"])
+)
+
+
+async def read_until_closed(websocket: WebSocket, idle_timeout: float) -> str:
+    """Read until the client goes away (``client``), stays silent past ``idle_timeout`` (``idle``) or fails."""
+    timeout = idle_timeout if idle_timeout > 0 else None
+    try:
+        while True:
+            message = await asyncio.wait_for(websocket.receive(), timeout)
+            if message["type"] == "websocket.disconnect":
+                return "client"
+    except asyncio.TimeoutError:
+        return "idle"
+    except WebSocketDisconnect:
+        return "client"
+    except Exception:
+        return "error"
+
+
+def encode_frame(fmt: str, payload: dict) -> str | bytes:
+    """Binary MessagePack frame for ``msgpack``, otherwise a JSON text frame."""
+    if fmt == "msgpack":
+        return msgpack.packb(payload)
+    return dumps(payload).decode("utf-8")
 
 
 class ConnectionManager:
-    def __init__(self) -> None:
+    """Kitchen sockets on ``/ws/orders`` with server-driven heartbeats.
+
+    Clients pick a wire format through ``Sec-WebSocket-Protocol`` (see
+    ``ORDER_PROTOCOLS``); without one they get one JSON text frame per event.
+    Each event is encoded once per format, not once per socket. Batched
+    sockets receive ``{"type": "batch", "events": [...]}`` frames holding
+    everything broadcast within ``batch_window_ms``.
+
+    Every ``ping_interval`` each socket gets a ``{"type": "ping"}`` frame;
+    clients answer with any frame (the dashboards send ``pong``). ``listen``
+    closes a socket that has been silent for ``idle_timeout``, which is what
+    reaps half-open connections whose peer vanished without a FIN.
+    """
+
+    def __init__(
+        self,
+        max_connections: int = WS_MAX_CONNECTIONS,
+        ping_interval: float = WS_PING_INTERVAL_S,
+        idle_timeout: float = WS_IDLE_TIMEOUT_S,
+        send_timeout: float = WS_SEND_TIMEOUT_S,
+        batch_window_ms: float = WS_BATCH_WINDOW_MS,
+    ) -> None:
+        self.max_connections = max_connections
+        self.ping_interval = ping_interval
+        self.idle_timeout = idle_timeout
+        self.send_timeout = send_timeout
+        self.batch_window = max(0.0, batch_window_ms) / 1000
         self.active_connections: list[WebSocket] = []
+        self.protocols: dict[WebSocket, tuple[str, bool]] = {}
+        self._connected_at: dict[WebSocket, float] = {}
+        self._batch: list[dict] = []
+        self._wakeup: asyncio.Event | None = None
+        self._tasks: list[asyncio.Task] = []
 
-    async def connect(self, websocket: WebSocket) -> None:
-        await websocket.accept()
+    async def connect(self, websocket: WebSocket) -> bool:
+        if len(self.active_connections) >= self.max_connections:
+            await websocket.close(code=1013)
+            ws_disconnects.inc(channel="orders", reason="rejected")
+            return False
+        offered = websocket.scope.get("subprotocols") or []
+        subprotocol = next((name for name in offered if name in ORDER_PROTOCOLS), None)
+        await websocket.accept(subprotocol=subprotocol)
         self.active_connections.append(websocket)
+        self.protocols[websocket] = ORDER_PROTOCOLS.get(subprotocol, ("json", False))
+        self._connected_at[websocket] = time.monotonic()
+        return True
 
-    def disconnect(self, websocket: WebSocket) -> None:
+    def disconnect(self, websocket: WebSocket, reason: str = "client") -> None:
         if websocket in self.active_connections:
             self.active_connections.remove(websocket)
+            ws_disconnects.inc(channel="orders", reason=reason)
+        self.protocols.pop(websocket, None)
+        connected_at = self._connected_at.pop(websocket, None)
+        if connected_at is not None:
+            ws_lifetime.observe(time.monotonic() - connected_at, channel="orders")
+
+    async def _close(self, websocket: WebSocket, reason: str, code: int) -> None:
+        self.disconnect(websocket, reason)
+        try:
+            await websocket.close(code=code)
+        except Exception:
+            pass
+
+    async def listen(self, websocket: WebSocket) -> None:
+        """Read until the client goes away or stays silent past ``idle_timeout``."""
+        reason = await read_until_closed(websocket, self.idle_timeout)
+        if reason == "client":
+            self.disconnect(websocket)
+        else:
+            await self._close(websocket, reason, 1001 if reason == "idle" else 1011)
+
+    async def _send_all(self, sends: list[tuple[WebSocket, str | bytes]]) -> None:
+        # Concurrent, each socket with its own timeout: a slow client neither
+        # delays the others nor spends their budget.
+        results = await asyncio.gather(
+            *(
+                asyncio.wait_for(
+                    socket.send_bytes(frame) if isinstance(frame, bytes) else socket.send_text(frame),
+                    self.send_timeout,
+                )
+                for socket, frame in sends
+            ),
+            return_exceptions=True,
+        )
+        for (socket, _), result in zip(sends, results):
+            if isinstance(result, BaseException):
+                # A dead socket must not fail the event for everyone else.
+                reason = "timeout" if isinstance(result, asyncio.TimeoutError) else "error"
+                await self._close(socket, reason, 1011)
+
+    async def _fanout(self, payload: dict, sockets: list[WebSocket]) -> None:
+        frames: dict[str, str | bytes] = {}
+        recipients: dict[str, int] = {}
+        sends = []
+        for socket in sockets:
+            protocol = self.protocols.get(socket)
+            if protocol is None:
+                continue
+            fmt = protocol[0]
+            frame = frames.get(fmt)
+            if frame is None:
+                frame = frames[fmt] = encode_frame(fmt, payload)
+            recipients[fmt] = recipients.get(fmt, 0) + 1
+            sends.append((socket, frame))
+        for fmt, count in recipients.items():
+            ws_sent_bytes.inc(len(frames[fmt]) * count, format=fmt)
+        await self._send_all(sends)
 
     async def broadcast(self, message: dict) -> None:
+        connections = list(self.active_connections)
+        ws_broadcast_fanout.observe(len(connections), channel="orders")
+        immediate = [socket for socket in connections if not self.protocols.get(socket, ("json", False))[1]]
+        if len(immediate) < len(connections):
+            self._batch.append(message)
+            if self._wakeup is not None:
+                self._wakeup.set()
+        with timed(ws_broadcast_latency, channel="orders"):
+            await self._fanout(message, immediate)
+
+    async def _flush_batches(self) -> None:
+        while True:
+            await self._wakeup.wait()
+            await asyncio.sleep(self.batch_window)
+            self._wakeup.clear()
+            events, self._batch = self._batch, []
+            sockets = [socket for socket in self.active_connections if self.protocols.get(socket, ("json", False))[1]]
+            if events and sockets:
+                await self._fanout({"type": "batch", "events": events}, sockets)
+
+    async def _heartbeat(self) -> None:
+        while True:
+            await asyncio.sleep(self.ping_interval)
+            await self._fanout({"type": "ping"}, list(self.active_connections))
+
+    def start(self) -> None:
+        if self._tasks:
+            return
+        self._wakeup = asyncio.Event()
+        self._tasks.append(asyncio.create_task(self._flush_batches()))
+        if self.ping_interval > 0:
+            self._tasks.append(asyncio.create_task(self._heartbeat()))
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        self._tasks = []
+        self._wakeup = None
         for connection in list(self.active_connections):
-            await connection.send_json(message)
+            await self._close(connection, "shutdown", 1001)
+
+
+class MenuChannel:
+    """Per-restaurant guest sockets receiving coalesced menu deltas.
+
+    Menu routes enqueue deltas in the outbox; ``deliver`` (its handler)
+    publishes them on ``MENU_WS_CHANNEL`` when a Redis client is set, and every
+    worker's subscriber hands them to ``publish``, so guests on any worker see
+    the change. Without Redis, ``deliver`` publishes locally. ``publish`` may
+    be called from any thread. Deltas for the same item within ``coalesce_ms``
+    collapse into one, and each restaurant's batch is encoded once and the
+    same frame is sent to every guest. Sockets that cannot take a frame within
+    the send timeout are dropped. Guests get the kitchen's heartbeat: a
+    ``ping`` frame every ``ping_interval`` and a close after ``idle_timeout``
+    of silence.
+    """
+
+    def __init__(
+        self,
+        coalesce_ms: float = MENU_WS_COALESCE_MS,
+        max_connections: int = MENU_WS_MAX_CONNECTIONS,
+        send_timeout: float = MENU_WS_SEND_TIMEOUT_S,
+        ping_interval: float = WS_PING_INTERVAL_S,
+        idle_timeout: float = WS_IDLE_TIMEOUT_S,
+        client=None,
+        channel: str = MENU_WS_CHANNEL,
+    ) -> None:
+        self.coalesce = max(0.0, coalesce_ms) / 1000
+        self.max_connections = max_connections
+        self.send_timeout = send_timeout
+        self.ping_interval = ping_interval
+        self.idle_timeout = idle_timeout
+        self.client = client
+        self.channel = channel
+        self.connections: dict[int, set[WebSocket]] = {}
+        self._connected_at: dict[WebSocket, float] = {}
+        self._pending: dict[int, dict[int, dict]] = {}
+        self._lock = threading.Lock()
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._wakeup: asyncio.Event | None = None
+        self._tasks: list[asyncio.Task] = []
+        self._stopping = threading.Event()
+
+    def __len__(self) -> int:
+        return sum(len(sockets) for sockets in self.connections.values())
+
+    def start(self) -> None:
+        if self._tasks:
+            return
+        self._loop = asyncio.get_running_loop()
+        self._wakeup = asyncio.Event()
+        self._stopping.clear()
+        self._tasks.append(asyncio.create_task(self._run()))
+        if self.ping_interval > 0:
+            self._tasks.append(asyncio.create_task(self._heartbeat()))
+        if self.client is not None:
+            self._tasks.append(asyncio.create_task(self._subscribe()))
+
+    async def stop(self) -> None:
+        self._stopping.set()
+        for task in self._tasks:
+            task.cancel()
+        self._tasks = []
+        self._loop = None
+
+    async def connect(self, restaurant_id: int, websocket: WebSocket) -> bool:
+        if len(self) >= self.max_connections:
+            await websocket.close(code=1013)
+            ws_disconnects.inc(channel="menu", reason="rejected")
+            return False
+        await websocket.accept()
+        self.connections.setdefault(restaurant_id, set()).add(websocket)
+        self._connected_at[websocket] = time.monotonic()
+        return True
+
+    def disconnect(self, restaurant_id: int, websocket: WebSocket, reason: str = "client") -> None:
+        sockets = self.connections.get(restaurant_id)
+        if sockets is not None and websocket in sockets:
+            sockets.discard(websocket)
+            if not sockets:
+                del self.connections[restaurant_id]
+            ws_disconnects.inc(channel="menu", reason=reason)
+        connected_at = self._connected_at.pop(websocket, None)
+        if connected_at is not None:
+            ws_lifetime.observe(time.monotonic() - connected_at, channel="menu")
+
+    async def _close(self, restaurant_id: int, websocket: WebSocket, reason: str, code: int) -> None:
+        self.disconnect(restaurant_id, websocket, reason)
+        try:
+            await websocket.close(code=code)
+        except Exception:
+            pass
+
+    async def listen(self, restaurant_id: int, websocket: WebSocket) -> None:
+        """Read until the guest goes away or stays silent past ``idle_timeout``."""
+        reason = await read_until_closed(websocket, self.idle_timeout)
+        if reason == "client":
+            self.disconnect(restaurant_id, websocket)
+        else:
+            await self._close(restaurant_id, websocket, reason, 1001 if reason == "idle" else 1011)
+
+    def publish(self, restaurant_id: int, delta: dict) -> None:
+        """Queue ``delta`` (must include ``id``) for this worker's guests of ``restaurant_id``."""
+        if restaurant_id not in self.connections:
+            return
+        with self._lock:
+            pending = self._pending.setdefault(restaurant_id, {})
+            pending.setdefault(delta["id"], {}).update(delta)
+        if self._loop is not None:
+            try:
+                self._loop.call_soon_threadsafe(self._wakeup.set)
+            except RuntimeError:
+                pass
+
+    async def deliver(self, payload: dict) -> None:
+        """Outbox handler for ``menu_delta``: reach guests on every worker."""
+        if self.client is None:
+            self.publish(payload["restaurant_id"], payload["delta"])
+            return
+        await asyncio.to_thread(self.client.publish, self.channel, dumps(payload))
+
+    def _listen(self) -> None:
+        pubsub = self.client.pubsub(ignore_subscribe_messages=True)
+        try:
+            pubsub.subscribe(self.channel)
+            while not self._stopping.is_set():
+                message = pubsub.get_message(timeout=1.0)
+                if message is None:
+                    continue
+                try:
+                    payload = loads(message["data"])
+                    self.publish(payload["restaurant_id"], payload["delta"])
+                except Exception:
+                    logger.warning("dropping malformed menu delta", exc_info=True)
+        finally:
+            pubsub.close()
+
+    async def _subscribe(self) -> None:
+        while True:
+            try:
+                await asyncio.to_thread(self._listen)
+                return
+            except Exception:
+                logger.warning("menu delta subscription lost, resubscribing", exc_info=True)
+                await asyncio.sleep(1)
+
+    async def _run(self) -> None:
+        while True:
+            await self._wakeup.wait()
+            await asyncio.sleep(self.coalesce)
+            self._wakeup.clear()
+            with self._lock:
+                pending, self._pending = self._pending, {}
+            for restaurant_id, deltas in pending.items():
+                sockets = list(self.connections.get(restaurant_id, ()))
+                if not sockets:
+                    continue
+                frame = dumps({"type": "menu_delta", "items": list(deltas.values())}).decode("utf-8")
+                ws_broadcast_fanout.observe(len(sockets), channel="menu")
+                with timed(ws_broadcast_latency, channel="menu"):
+                    await self._send(restaurant_id, sockets, frame)
+
+    async def _heartbeat(self) -> None:
+        frame = dumps({"type": "ping"}).decode("utf-8")
+        while True:
+            await asyncio.sleep(self.ping_interval)
+            for restaurant_id, sockets in list(self.connections.items()):
+                await self._send(restaurant_id, list(sockets), frame)
+
+    async def _send(self, restaurant_id: int, sockets: list[WebSocket], frame: str) -> None:
+        results = await asyncio.gather(
+            *(asyncio.wait_for(socket.send_text(frame), self.send_timeout) for socket in sockets),
+            return_exceptions=True,
+        )
+        for socket, result in zip(sockets, results):
+            if isinstance(result, BaseException):
+                reason = "timeout" if isinstance(result, asyncio.TimeoutError) else "error"
+                await self._close(restaurant_id, socket, reason, 1011)
+
+
+def _build_menu_client():
+    if MENU_WS_BACKEND == "redis":
+        import redis
+
+        # No short socket timeout: the subscriber blocks in get_message.
+        return redis.Redis.from_url(REDIS_URL)
+    return None
 
 
 manager = ConnectionManager()
+menu_channel = MenuChannel(client=_build_menu_client())
+
+register_gauge(
+    "ws_connections",
+    "Open WebSocket connections.",
+    ["channel"],
+    lambda: [
+        ({"channel": "orders"}, len(manager.active_connections)),
+        ({"channel": "menu"}, len(menu_channel)),
+    ],
+)
@@ -1,5 +1,7 @@
 "use client";
 
+import { priceCents } from "../context/CartContext.jsx";
+
 export default function CartItem({ item, onQuantityChange, onNoteChange }) {
   return (
     <div className="rounded-2xl border border-slate-100 bg-slate-50 px-4 py-3">
@@ -25,7 +27,7 @@ export default function CartItem({ item, onQuantityChange, onNoteChange }) {
             +
           </button>
           <span className="text-sm font-semibold text-slate-900">
-            ${(item.price * item.quantity).toFixed(2)}
+            ${((priceCents(item) * item.quantity) / 100).toFixed(2)}
           </span>
         </div>
       </div>
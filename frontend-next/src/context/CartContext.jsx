@@ -4,6 +4,11 @@ import { createContext, useContext, useEffect, useMemo, useState } from "react";
 
 const CartContext = createContext(null);
 
+// Carts built before prices moved to cents only carry `price` in dollars.
+export function priceCents(item) {
+  return item.price_cents ?? Math.round(item.price * 100);
+}
+
 export function CartProvider({ children }) {
   const [restaurantId, setRestaurantId] = useState(null);
   const [tableId, setTableId] = useState(null);
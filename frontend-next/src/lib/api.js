@@ -75,16 +75,56 @@ export function setRestaurantName(name) {
   }
 }
 
+// Statuses worth resending a keyed request for: still in progress, or shed by the server.
+const RETRY_STATUSES = new Set([502, 503, 504]);
+
+async function shouldRetry(response) {
+  if (RETRY_STATUSES.has(response.status)) return true;
+  // Only the idempotency "still in progress" 409; an unavailable item is a 409 too.
+  if (response.status !== 409) return false;
+  try {
+    const data = await response.clone().json();
+    return data?.code === "idempotency_in_progress";
+  } catch {
+    return false;
+  }
+}
+
+function sleep(ms) {
+  return new Promise((resolve) => setTimeout(resolve, ms));
+}
+
+export function newIdempotencyKey() {
+  if (typeof crypto !== "undefined" && crypto.randomUUID) {
+    return crypto.randomUUID();
+  }
+  return `${Date.now().toString(36)}-${Math.random().toString(36).slice(2)}`;
+}
+
 async function apiFetch(path, options = {}) {
+  // Only pass `retries` for requests that are safe to resend (an Idempotency-Key or a GET).
+  const { headers = {}, retries = 0, timeoutMs = 0, ...init } = options;
   const token = getAuthToken();
-  const response = await fetch(`${API_BASE}${path}`, {
-    headers: {
-      "Content-Type": "application/json",
-      ...(token ? { Authorization: `Bearer ${token}` } : {}),
-      ...(options.headers || {})
-    },
-    ...options
-  });
+  let response;
+  for (let attempt = 0; ; attempt += 1) {
+    try {
+      response = await fetch(`${API_BASE}${path}`, {
+        ...init,
+        headers: {
+          "Content-Type": "application/json",
+          ...(token ? { Authorization: `Bearer ${token}` } : {}),
+          ...headers
+        },
+        ...(timeoutMs ? { signal: AbortSignal.timeout(timeoutMs) } : {})
+      });
+    } catch (err) {
+      if (attempt >= retries) throw err;
+      await sleep(500 * 2 ** attempt);
+      continue;
+    }
+    if (attempt >= retries || !(await shouldRetry(response))) break;
+    await sleep(500 * 2 ** attempt);
+  }
 
   if (!response.ok) {
     if (response.status === 401) {
@@ -116,13 +156,22 @@ export const menuApi = {
   getCategories: (params = "") => apiFetch(`/menu/categories${params}`),
   createCategory: (payload) => apiFetch("/menu/categories", { method: "POST", body: JSON.stringify(payload) }),
   updateCategory: (id, payload) => apiFetch(`/menu/categories/${id}`, { method: "PUT", body: JSON.stringify(payload) }),
-  deleteCategory: (id) => apiFetch(`/menu/categories/${id}`, { method: "DELETE" })
+  deleteCategory: (id) => apiFetch(`/menu/categories/${id}`, { method: "DELETE" }),
+  changes: (since = 0) => apiFetch(`/menu/changes?since=${since}`)
 };
 
 export const orderApi = {
   list: (params = "") => apiFetch(`/orders/${params}`),
+  active: () => apiFetch("/orders/active"),
   get: (id) => apiFetch(`/orders/${id}`),
-  create: (payload) => apiFetch("/orders/", { method: "POST", body: JSON.stringify(payload) }),
+  create: (payload, idempotencyKey) =>
+    apiFetch("/orders/", {
+      method: "POST",
+      body: JSON.stringify(payload),
+      headers: { "Idempotency-Key": idempotencyKey },
+      retries: 2,
+      timeoutMs: 10000
+    }),
   updateStatus: (id, payload) => apiFetch(`/orders/${id}/status`, { method: "PATCH", body: JSON.stringify(payload) }),
   history: (params = "") => apiFetch(`/orders/history${params}`)
 };
@@ -150,6 +199,9 @@ export const recommendationsApi = {
 
 export const tablesApi = {
   list: () => apiFetch("/tables/"),
+  floor: () => apiFetch("/tables/floor"),
+  tab: (id) => apiFetch(`/tables/${id}/tab`),
+  closeTab: (id) => apiFetch(`/tables/${id}/tab/close`, { method: "POST" }),
   create: (payload) => apiFetch("/tables/", { method: "POST", body: JSON.stringify(payload) }),
   delete: (id) => apiFetch(`/tables/${id}`, { method: "DELETE" }),
   qrUrl: (id) => `${API_BASE}/tables/${id}/qr`,
@@ -13,7 +13,7 @@ export default function Kitchen() {
       return;
     }
     orderApi
-      .list()
+      .active()
       .then((data) => {
         setOrders(data);
         setError("");
@@ -44,12 +44,20 @@ export default function Kitchen() {
 
     let socket = null;
     try {
-      socket = new WebSocket(getWebSocketUrl("/ws/orders"));
+      // Batched frames: one reload per burst of order events.
+      socket = new WebSocket(getWebSocketUrl("/ws/orders"), ["orders.json.batch"]);
       socket.onopen = () => {
         stopPolling();
         setError("");
       };
-      socket.onmessage = () => loadOrders();
+      socket.onmessage = (event) => {
+        const message = JSON.parse(event.data);
+        if (message.type === "ping") {
+          socket.send(JSON.stringify({ type: "pong" }));
+          return;
+        }
+        loadOrders();
+      };
       socket.onerror = () => {
         // WebSocket failed, use polling instead (this is normal on some hosts)
         startPolling();
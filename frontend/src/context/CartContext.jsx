@@ -2,6 +2,11 @@ import { createContext, useContext, useMemo, useState } from "react";
 
 const CartContext = createContext(null);
 
+// Carts built before prices moved to cents only carry `price` in dollars.
+export function priceCents(item) {
+  return item.price_cents ?? Math.round(item.price * 100);
+}
+
 export function CartProvider({ children }) {
   const params = new URLSearchParams(window.location.search);
   const initialRestaurantId = Number(params.get("restaurant")) || null;
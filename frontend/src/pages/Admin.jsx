@@ -1,4 +1,4 @@
-import { useEffect, useMemo, useState } from "react";
+import { useEffect, useMemo, useRef, useState } from "react";
 import {
   analyticsApi,
   getAuthToken,
@@ -15,6 +15,13 @@ const SECTIONS = [
   { id: "tables", label: "Tables" }
 ];
 
+function mergeById(current, changed, deletedIds, compare) {
+  const deleted = new Set(deletedIds);
+  const rows = new Map(current.filter((row) => !deleted.has(row.id)).map((row) => [row.id, row]));
+  changed.forEach((row) => rows.set(row.id, row));
+  return [...rows.values()].sort(compare);
+}
+
 function formatCurrency(value) {
   return `$${Number(value || 0).toFixed(2)}`;
 }
@@ -22,8 +29,9 @@ function formatCurrency(value) {
 export default function Admin() {
   const [summary, setSummary] = useState(null);
   const [status, setStatus] = useState({});
-  const [categories, setCategories] = useState([]);
+  const [categoryRows, setCategoryRows] = useState([]);
   const [items, setItems] = useState([]);
+  const menuVersion = useRef(0);
   const [tables, setTables] = useState([]);
   const [trending, setTrending] = useState([]);
   const [history, setHistory] = useState([]);
@@ -53,6 +61,38 @@ export default function Admin() {
   const [isAuthed, setIsAuthed] = useState(() => !!getAuthToken());
   const [section, setSection] = useState("insights");
 
+  const categories = useMemo(
+    () => categoryRows.map((category) => ({
+      ...category,
+      items: items.filter((item) => item.category_id === category.id)
+    })),
+    [categoryRows, items]
+  );
+
+  const applyMenuChanges = (changes) => {
+    menuVersion.current = changes.version;
+    setItems((current) =>
+      mergeById(changes.full ? [] : current, changes.items, changes.deleted.items, (a, b) => a.id - b.id)
+    );
+    setCategoryRows((current) =>
+      mergeById(
+        changes.full ? [] : current,
+        changes.categories,
+        changes.deleted.categories,
+        (a, b) => a.sort_order - b.sort_order || a.id - b.id
+      )
+    );
+  };
+
+  // Menu edits only fetch rows changed since the last known menu version.
+  const syncMenu = async () => {
+    try {
+      applyMenuChanges(await menuApi.changes(menuVersion.current));
+    } catch (err) {
+      setError(err.message || "Failed to refresh menu");
+    }
+  };
+
   const loadAll = () => {
     Promise.allSettled([
       analyticsApi.summary(),
@@ -60,9 +100,8 @@ export default function Admin() {
       analyticsApi.topItems(6),
       analyticsApi.byCategory(),
       analyticsApi.byHour(7),
-      menuApi.getCategories(),
-      menuApi.getItems(),
-      tablesApi.list(),
+      menuApi.changes(0),
+      tablesApi.floor(),
       recommendationsApi.trending(5),
       orderApi.history("?limit=10").catch(() => [])
     ]).then((results) => {
@@ -72,8 +111,7 @@ export default function Admin() {
         topRes,
         categorySalesRes,
         hourRes,
-        categoryRes,
-        itemRes,
+        menuRes,
         tableRes,
         trendRes,
         historyRes
@@ -84,8 +122,7 @@ export default function Admin() {
       if (topRes.status === "fulfilled") setTopItems(topRes.value || []);
       if (categorySalesRes.status === "fulfilled") setCategorySales(categorySalesRes.value || []);
       if (hourRes.status === "fulfilled") setHourly(hourRes.value || []);
-      if (categoryRes.status === "fulfilled") setCategories(categoryRes.value || []);
-      if (itemRes.status === "fulfilled") setItems(itemRes.value || []);
+      if (menuRes.status === "fulfilled") applyMenuChanges(menuRes.value);
       if (tableRes.status === "fulfilled") setTables(tableRes.value || []);
       if (trendRes.status === "fulfilled") setTrending(trendRes.value || []);
       if (historyRes.status === "fulfilled") setHistory(historyRes.value || []);
@@ -178,7 +215,7 @@ export default function Admin() {
     try {
       await menuApi.createCategory({ name: categoryName.trim() });
       setCategoryName("");
-      loadAll();
+      syncMenu();
     } catch (err) {
       setError(err.message || "Failed to create category");
     }
@@ -195,7 +232,7 @@ export default function Admin() {
       await menuApi.updateCategory(categoryId, { name: editingCategoryName.trim() });
       setEditingCategoryId(null);
       setEditingCategoryName("");
-      loadAll();
+      syncMenu();
     } catch (err) {
       setError(err.message || "Failed to update category");
     }
@@ -204,7 +241,7 @@ export default function Admin() {
   const handleDeleteCategory = async (categoryId) => {
     try {
       await menuApi.deleteCategory(categoryId);
-      loadAll();
+      syncMenu();
     } catch (err) {
       setError(err.message || "Failed to delete category");
     }
@@ -223,7 +260,7 @@ export default function Admin() {
       });
       setItemForm({ name: "", price: "", description: "", category_id: "" });
       setDietTag("");
-      loadAll();
+      syncMenu();
     } catch (err) {
       setError(err.message || "Failed to create item");
     }
@@ -232,7 +269,7 @@ export default function Admin() {
   const toggleAvailability = async (item) => {
     try {
       await menuApi.updateItem(item.id, { is_available: !item.is_available });
-      loadAll();
+      syncMenu();
     } catch (err) {
       setError(err.message || "Failed to update item");
     }
@@ -241,7 +278,7 @@ export default function Admin() {
   const deleteItem = async (id) => {
     try {
       await menuApi.deleteItem(id);
-      loadAll();
+      syncMenu();
     } catch (err) {
       setError(err.message || "Failed to delete item");
     }
@@ -258,6 +295,15 @@ export default function Admin() {
     }
   };
 
+  const settleTab = async (id) => {
+    try {
+      await tablesApi.closeTab(id);
+      loadAll();
+    } catch (err) {
+      setError(err.message || "Failed to settle tab");
+    }
+  };
+
   const deleteTable = async (id) => {
     try {
       await tablesApi.delete(id);
@@ -726,10 +772,23 @@ export default function Admin() {
                   <div className="min-w-0 flex-1">
                     <p className="font-semibold text-slate-800">{table.label}</p>
                     <p className="text-xs text-slate-500">Code: {table.code}</p>
+                    {table.tab && (
+                      <p className="text-xs font-semibold text-slate-700">
+                        Tab: {formatCurrency(table.tab.total)} ({table.tab.order_ids.length} orders)
+                      </p>
+                    )}
                     <p className="mt-1 truncate text-xs text-teal-600" title={menuUrl}>
                       {menuUrl}
                     </p>
                   </div>
+                  {table.tab && (
+                    <button
+                      className="rounded-full border border-teal-200 px-3 py-1 text-xs text-teal-700 hover:bg-teal-50"
+                      onClick={() => settleTab(table.id)}
+                    >
+                      Settle
+                    </button>
+                  )}
                   <button
                     className="rounded-full border border-rose-200 px-3 py-1 text-xs text-rose-600 hover:bg-rose-50"
                     onClick={() => deleteTable(table.id)}
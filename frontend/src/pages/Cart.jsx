@@ -1,8 +1,8 @@
-import { useMemo, useState } from "react";
+import { useEffect, useMemo, useRef, useState } from "react";
 import { useNavigate } from "react-router-dom";
 import CartItem from "../components/CartItem.jsx";
-import { useCart } from "../context/CartContext.jsx";
-import { orderApi } from "../lib/api.js";
+import { priceCents, useCart } from "../context/CartContext.jsx";
+import { newIdempotencyKey, orderApi } from "../lib/api.js";
 
 export default function Cart() {
   const navigate = useNavigate();
@@ -18,9 +18,15 @@ export default function Cart() {
   } = useCart();
   const [loading, setLoading] = useState(false);
   const [error, setError] = useState("");
+  // One key per cart: double taps and retries resend it, so the kitchen gets one order.
+  const orderKey = useRef(null);
+
+  useEffect(() => {
+    orderKey.current = null;
+  }, [items, notes, tableId, restaurantId]);
 
   const total = useMemo(
-    () => items.reduce((sum, item) => sum + item.price * item.quantity, 0),
+    () => items.reduce((sum, item) => sum + priceCents(item) * item.quantity, 0) / 100,
     [items]
   );
 
@@ -42,7 +48,10 @@ export default function Cart() {
           special_instructions: item.special_instructions || null
         }))
       };
-      const order = await orderApi.create(payload);
+      if (!orderKey.current) {
+        orderKey.current = newIdempotencyKey();
+      }
+      const order = await orderApi.create(payload, orderKey.current);
       clearCart();
       navigate(`/success?order_id=${order.id}`);
     } catch (err) {
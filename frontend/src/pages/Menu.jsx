@@ -1,7 +1,7 @@
 import { useEffect, useMemo, useState } from "react";
 import MenuItem from "../components/MenuItem.jsx";
 import Recommendations from "../components/Recommendations.jsx";
-import { menuApi, recommendationsApi, tablesApi } from "../lib/api.js";
+import { getWebSocketUrl, menuApi, recommendationsApi, tablesApi } from "../lib/api.js";
 import { useCart } from "../context/CartContext.jsx";
 
 const DIET_FILTERS = [
@@ -66,6 +66,36 @@ export default function Menu() {
   }, [queryString]);
 
 
+  useEffect(() => {
+    if (!restaurantId) return undefined;
+    let socket = null;
+    try {
+      socket = new WebSocket(getWebSocketUrl(`/ws/menu/${restaurantId}`));
+      socket.onmessage = (event) => {
+        const message = JSON.parse(event.data);
+        if (message.type === "ping") {
+          socket.send(JSON.stringify({ type: "pong" }));
+          return;
+        }
+        if (message.type !== "menu_delta") return;
+        const deltas = new Map(message.items.map((delta) => [delta.id, delta]));
+        setCategories((current) =>
+          current.map((category) => ({
+            ...category,
+            items: category.items
+              .filter((item) => !deltas.get(item.id)?.deleted)
+              .map((item) => (deltas.has(item.id) ? { ...item, ...deltas.get(item.id) } : item))
+          }))
+        );
+      };
+    } catch {
+      // Live updates are optional; the menu still works without them
+    }
+    return () => {
+      if (socket) socket.close();
+    };
+  }, [restaurantId]);
+
   useEffect(() => {
     if (restaurantId) return;
     let isMounted = true;
@@ -247,11 +277,11 @@ export default function Menu() {
                   <div className="flex items-center justify-between">
                     <h2 className="text-2xl font-semibold text-slate-800">{category.name}</h2>
                     <span className="text-xs uppercase tracking-[0.3em] text-slate-400">
-                      {category.items.length} items
+                      {category.items.filter((item) => item.is_available !== false).length} items
                     </span>
                   </div>
                   <div className="grid gap-6 md:grid-cols-2">
-                    {category.items.map((item) => (
+                    {category.items.filter((item) => item.is_available !== false).map((item) => (
                       <MenuItem
                         key={item.id}
                         item={item}